@@ -19,9 +19,6 @@ from glob import glob
 import numpy as np
 import numpy.lib.recfunctions as rfn
 
-from astropy.coordinates import SkyCoord
-from astropy import units as u
-
 from matplotlib.patches import Polygon
 from matplotlib.collections import PatchCollection
 
@@ -29,9 +26,12 @@ from desitarget import io
 from desitarget.internal import sharedmem
 from desitarget.targetmask import desi_mask, targetid_mask
 from desitarget.targets import encode_targetid, decode_targetid
-from desitarget.gaiamatch import find_gaia_files
+from desitarget.gaiamatch import find_gaia_files, read_gaia_file
+from desitarget.gaiamatch import _gaia_file_is_cached
 from desitarget.geomask import circles, cap_area, circle_boundaries
-from desitarget.geomask import ellipses, ellipse_boundary, is_in_ellipse
+from desitarget.geomask import ellipses, ellipse_boundary
+from desitarget.geomask import ellipse_boundaries, is_in_ellipse_pairs
+from desitarget.geomask import match_within_radii
 from desitarget.geomask import radec_match_to, rewind_coords, add_hp_neighbors
 from desitarget.cuts import _psflike
 from desitarget.tychomatch import get_tycho_dir, get_tycho_nside
@@ -238,12 +238,25 @@ def make_bright_star_mask_in_hp(nside, pixnum, verbose=True, gaiaepoch=2015.5,
     gaiafns = find_gaia_files(tychoobjs, neighbors=True)
     gaiaobjs = []
     cols = 'SOURCE_ID', 'RA', 'DEC', 'PHOT_G_MEAN_MAG', 'PMRA', 'PMDEC'
+    cachecols = ['REF_ID', 'GAIA_RA', 'GAIA_DEC', 'GAIA_PHOT_G_MEAN_MAG',
+                 'PMRA', 'PMDEC']
     for fn in gaiafns:
         if os.path.exists(fn):
-            gaiaobjs.append(fitsio.read(fn, ext='GAIAHPX', columns=cols))
+            # ADM use files that are already in the Gaia cache (see
+            # ADM gaiamatch.set_gaia_cache()), otherwise just read the
+            # ADM columns we need.
+            if _gaia_file_is_cached(fn):
+                objs = read_gaia_file(fn, cache=True)[cachecols]
+                objs = rfn.repack_fields(objs)
+                objs = rfn.rename_fields(objs, {
+                    "GAIA_RA": "RA", "GAIA_DEC": "DEC",
+                    "GAIA_PHOT_G_MEAN_MAG": "PHOT_G_MEAN_MAG"})
+            else:
+                objs = fitsio.read(fn, ext='GAIAHPX', columns=cols)
+                objs = rfn.rename_fields(objs, {"SOURCE_ID": "REF_ID"})
+            gaiaobjs.append(objs)
 
     gaiaobjs = np.concatenate(gaiaobjs)
-    gaiaobjs = rfn.rename_fields(gaiaobjs, {"SOURCE_ID": "REF_ID"})
     # ADM limit Gaia objects to 3 magnitudes fainter than the passed
     # ADM limit. This leaves some (!) leeway when matching to Tycho.
     gaiaobjs = gaiaobjs[gaiaobjs['PHOT_G_MEAN_MAG'] < maglim + 3]
@@ -586,20 +599,26 @@ def is_in_bright_mask(targs, sourcemask, inonly=False):
     used_in_mask = np.zeros(len(sourcemask), dtype=bool)
     used_near_mask = np.zeros(len(sourcemask), dtype=bool)
 
-    # ADM turn the mask and target coordinates into SkyCoord objects.
-    ctargs = SkyCoord(targs["RA"]*u.degree, targs["DEC"]*u.degree)
-    cmask = SkyCoord(sourcemask["RA"]*u.degree, sourcemask["DEC"]*u.degree)
-
-    # ADM this is the largest search radius we should need to consider.
-    # ADM In the future an obvious speed up is to split on radius
-    # ADM as large radii are rarer but take longer.
-    maxrad = max(sourcemask["IN_RADIUS"])*u.arcsec
+    # ADM the radius that defines whether targets are in a mask.
+    radius = sourcemask["IN_RADIUS"]
     if not inonly:
-        maxrad = max(sourcemask["NEAR_RADIUS"])*u.arcsec
+        radius = sourcemask["NEAR_RADIUS"]
+
+    # ADM need to differentiate targets that are in ellipse-on-the-sky
+    # ADM masks from targets that are in circle-on-the-sky masks.
+    rex_or_psf = _rexlike(sourcemask["TYPE"]) | _psflike(sourcemask["TYPE"])
 
-    # ADM coordinate match the masks and the targets.
-    # ADM assuming all of the masks are circles-on-the-sky.
-    idtargs, idmask, d2d, d3d = cmask.search_around_sky(ctargs, maxrad)
+    # ADM the semi-major axis of the elliptical masks is the radius, but
+    # ADM is_in_ellipse works in the small-angle approximation, so allow
+    # ADM some slack (up to the largest radius of any mask).
+    searchrad = np.where(rex_or_psf, radius,
+                         np.minimum(2*radius, np.max(radius, initial=0)))
+
+    # ADM coordinate match the masks and the targets, assuming all of
+    # ADM the masks are circles-on-the-sky at their search radius.
+    idtargs, idmask, sep = match_within_radii(
+        targs["RA"], targs["DEC"], sourcemask["RA"], sourcemask["DEC"],
+        searchrad)
 
     # ADM catch the case where nothing fell in a mask.
     if len(idmask) == 0:
@@ -607,50 +626,34 @@ def is_in_bright_mask(targs, sourcemask, inonly=False):
             return [in_mask], [used_in_mask]
         return [in_mask, near_mask], [used_in_mask, used_near_mask]
 
-    # ADM need to differentiate targets that are in ellipse-on-the-sky
-    # ADM masks from targets that are in circle-on-the-sky masks.
-    rex_or_psf = _rexlike(sourcemask[idmask]["TYPE"]) | _psflike(
-        sourcemask[idmask]["TYPE"])
-    w_ellipse = np.where(~rex_or_psf)
+    rex_or_psf = rex_or_psf[idmask]
+    w_ellipse = np.where(~rex_or_psf)[0]
 
     # ADM only continue if there are any elliptical masks.
-    if len(w_ellipse[0]) > 0:
+    if len(w_ellipse) > 0:
         idelltargs = idtargs[w_ellipse]
         idellmask = idmask[w_ellipse]
 
         log.info('Testing {} targets against {} elliptical masks...t={:.1f}s'
-                 .format(len(set(idelltargs)), len(set(idellmask)), time()-t0))
-
-        # ADM to speed the calculation, make a dictionary of which
-        # ADM targets (the values) associate with each mask (the keys).
-        targidineachmask = {}
-        # ADM first initiate a list for each relevant key (mask ID).
-        for maskid in set(idellmask):
-            targidineachmask[maskid] = []
-        # ADM then append those lists until they contain the IDs of each
-        # ADM relevant target as the values.
-        for index, targid in enumerate(idelltargs):
-            targidineachmask[idellmask[index]].append(targid)
-
-        # ADM loop through the masks and determine which relevant points
-        # ADM occupy them for both the IN_RADIUS and the NEAR_RADIUS.
-        for maskid in targidineachmask:
-            targids = targidineachmask[maskid]
-            ellras, elldecs = targs[targids]["RA"], targs[targids]["DEC"]
-            mask = sourcemask[maskid]
-            # ADM Refine being in a mask based on the elliptical masks.
-            in_ell = is_in_ellipse(
-                ellras, elldecs, mask["RA"], mask["DEC"],
-                mask["IN_RADIUS"], mask["E1"], mask["E2"])
-            in_mask[targids] |= in_ell
-            used_in_mask[maskid] |= np.any(in_ell)
-            if not inonly:
-                in_ell = is_in_ellipse(ellras, elldecs,
-                                       mask["RA"], mask["DEC"],
-                                       mask["NEAR_RADIUS"],
-                                       mask["E1"], mask["E2"])
-                near_mask[targids] |= in_ell
-                used_near_mask[maskid] |= np.any(in_ell)
+                 .format(len(np.unique(idelltargs)), len(np.unique(idellmask)),
+                         time()-t0))
+
+        # ADM determine which (target, mask) pairs are in the elliptical
+        # ADM masks for both the IN_RADIUS and the NEAR_RADIUS.
+        ras, decs = targs["RA"], targs["DEC"]
+        in_ell = is_in_ellipse_pairs(
+            ras, decs, sourcemask["RA"], sourcemask["DEC"],
+            sourcemask["IN_RADIUS"], sourcemask["E1"], sourcemask["E2"],
+            idelltargs, idellmask)
+        in_mask[idelltargs[in_ell]] = True
+        used_in_mask[idellmask[in_ell]] = True
+        if not inonly:
+            in_ell = is_in_ellipse_pairs(
+                ras, decs, sourcemask["RA"], sourcemask["DEC"],
+                sourcemask["NEAR_RADIUS"], sourcemask["E1"], sourcemask["E2"],
+                idelltargs, idellmask)
+            near_mask[idelltargs[in_ell]] = True
+            used_near_mask[idellmask[in_ell]] = True
 
         log.info('Done with elliptical masking...t={:1f}s'.format(time()-t0))
 
@@ -658,12 +661,12 @@ def is_in_bright_mask(targs, sourcemask, inonly=False):
     # ADM trumps any information about just being in an elliptical mask.
     # ADM Find separations less than the mask radius for circle masks
     # ADM matches meeting these criteria are in at least one circle mask.
-    w_in = (d2d.arcsec < sourcemask[idmask]["IN_RADIUS"]) & (rex_or_psf)
+    w_in = (sep < sourcemask["IN_RADIUS"][idmask]) & (rex_or_psf)
     in_mask[idtargs[w_in]] = True
     used_in_mask[idmask[w_in]] = True
 
     if not inonly:
-        w_near = (d2d.arcsec < sourcemask[idmask]["NEAR_RADIUS"]) & (rex_or_psf)
+        w_near = (sep < sourcemask["NEAR_RADIUS"][idmask]) & (rex_or_psf)
         near_mask[idtargs[w_near]] = True
         used_near_mask[idmask[w_near]] = True
         return [in_mask, near_mask], [used_in_mask, used_near_mask]
@@ -756,16 +759,15 @@ def generate_safe_locations(sourcemask, Nperradius=1):
                                               radius[w_circle], Nsafe[w_circle])
         ras, decs = np.concatenate((ras, circras)), np.concatenate((decs, circdecs))
 
-    # ADM generate the safe location for elliptical masks
-    # ADM (which is slower as it requires a loop).
+    # ADM generate the safe location for elliptical masks.
     if len(w_ellipse[0]) > 0:
-        for w in w_ellipse[0]:
-            ellras, elldecs = ellipse_boundary(sourcemask[w]["RA"],
-                                               sourcemask[w]["DEC"], radius[w],
-                                               sourcemask[w]["E1"],
-                                               sourcemask[w]["E2"], Nsafe[w])
-            ras = np.concatenate((ras, ellras))
-            decs = np.concatenate((decs, elldecs))
+        ellras, elldecs = ellipse_boundaries(sourcemask[w_ellipse]["RA"],
+                                             sourcemask[w_ellipse]["DEC"],
+                                             radius[w_ellipse],
+                                             sourcemask[w_ellipse]["E1"],
+                                             sourcemask[w_ellipse]["E2"],
+                                             Nsafe[w_ellipse])
+        ras, decs = np.concatenate((ras, ellras)), np.concatenate((decs, elldecs))
 
     return ras, decs
 
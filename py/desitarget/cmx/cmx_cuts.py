@@ -28,12 +28,14 @@ from pkg_resources import resource_filename
 from desitarget import io
 from desitarget.cuts import _psflike, _is_row, _get_colnames, _prepare_gaia
 from desitarget.cuts import _prepare_optical_wise, _check_BGS_targtype_sv
+from desitarget.cuts import tcnames_columns
 from desitarget.cuts import shift_photo_north
 from desitarget.internal import sharedmem
+from desitarget.myRF import preloadForests, forestCacheStats
 from desitarget.targets import finalize, resolve
 from desitarget.cmx.cmx_targetmask import cmx_mask
 from desitarget.geomask import sweep_files_touch_hp, bundle_bricks
-from desitarget.geomask import is_in_hp, is_in_gal_box
+from desitarget.geomask import is_in_hp, is_in_gal_box, radec_match_to
 from desitarget.gaiamatch import gaia_dr_from_ref_cat, is_in_Galaxy
 from desitarget.gaiamatch import find_gaia_files_hp
 
@@ -41,6 +43,7 @@ from desitarget.gaiamatch import find_gaia_files_hp
 from desitarget.cuts import isLRG as isLRG_MS
 from desitarget.cuts import isELG as isELG_MS
 from desitarget.cuts import isQSO_randomforest as isQSO_MS
+from desitarget.cuts import qso_rf_forests as qso_rf_forests_MS
 from desitarget.cuts import isBGS as isBGS_MS
 
 # ADM set up the DESI default logger
@@ -931,6 +934,15 @@ def isQSO_color_high_z(gflux=None, rflux=None, zflux=None,
     return qso_hz
 
 
+# ADM the Random Forests used by isQSO_randomforest() and
+# ADM isQSO_highz_faint(), as (file name, number of trees, myRF version)
+# ADM tuples. Loaded before forking so they're shared by all processes.
+qso_rf_forests = [
+    (resource_filename('desitarget', 'data/rf_model_dr7.npz'), 500, 2),
+    (resource_filename('desitarget', 'data/rf_model_dr7_HighZ.npz'), 500, 2)
+]
+
+
 def isQSO_randomforest(gflux=None, rflux=None, zflux=None, w1flux=None,
                        w2flux=None, objtype=None, release=None, dchisq=None,
                        maskbits=None, gnobs=None, rnobs=None, znobs=None,
@@ -999,7 +1011,7 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, w1flux=None,
 
     if np.any(preSelection):
 
-        from desitarget.myRF import myRF
+        from desitarget.myRF import getForest
 
         # Data reduction to preselected objects
         colorsReduced = colors[preSelection]
@@ -1013,15 +1025,12 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, w1flux=None,
         rf_fileName = pathToRF + '/rf_model_dr7.npz'
         rf_HighZ_fileName = pathToRF + '/rf_model_dr7_HighZ.npz'
 
-        # rf initialization - colors data duplicated within "myRF"
-        rf = myRF(colorsReduced, pathToRF, numberOfTrees=500, version=2)
-        rf_HighZ = myRF(colorsReduced, pathToRF, numberOfTrees=500, version=2)
         # rf loading
-        rf.loadForest(rf_fileName)
-        rf_HighZ.loadForest(rf_HighZ_fileName)
+        rf = getForest(rf_fileName, numberOfTrees=500, version=2)
+        rf_HighZ = getForest(rf_HighZ_fileName, numberOfTrees=500, version=2)
         # Compute rf probabilities
-        tmp_rf_proba = rf.predict_proba()
-        tmp_rf_HighZ_proba = rf_HighZ.predict_proba()
+        tmp_rf_proba = rf.predict_proba(colorsReduced)
+        tmp_rf_HighZ_proba = rf_HighZ.predict_proba(colorsReduced)
         # Compute optimized proba cut (all different for SV)
         # ADM the probabilities are different for the north and the south.
         if south:
@@ -1117,7 +1126,7 @@ def isQSO_highz_faint(gflux=None, rflux=None, zflux=None, w1flux=None,
 
     if np.any(preSelection):
 
-        from desitarget.myRF import myRF
+        from desitarget.myRF import getForest
 
         # Data reduction to preselected objects.
         colorsReduced = colors[preSelection]
@@ -1131,14 +1140,11 @@ def isQSO_highz_faint(gflux=None, rflux=None, zflux=None, w1flux=None,
         # Use RF trained over DR7.
         rf_fileName = pathToRF + '/rf_model_dr7.npz'
 
-        # rf initialization - colors data duplicated within "myRF".
-        rf = myRF(colorsReduced, pathToRF, numberOfTrees=500, version=2)
-
         # rf loading.
-        rf.loadForest(rf_fileName)
+        rf = getForest(rf_fileName, numberOfTrees=500, version=2)
 
         # Compute rf probabilities.
-        tmp_rf_proba = rf.predict_proba()
+        tmp_rf_proba = rf.predict_proba(colorsReduced)
 
         # Compute optimized proba cut (all different for SV).
         # The probabilities may be different for the north and the south.
@@ -1695,9 +1701,9 @@ def isSTD_dither_gaia(ra=None, dec=None, gmag=None, rmag=None, aen=None,
 
         gaiaobjs = np.concatenate(gaiaobjs)
         # ADM match the dither sources to the broader Gaia sources at 7".
-        csdg = SkyCoord(ra[ii_true]*u.degree, dec[ii_true]*u.degree)
-        cgaia = SkyCoord(gaiaobjs["RA"]*u.degree, gaiaobjs["DEC"]*u.degree)
-        idsdg, idgaia, d2d, _ = cgaia.search_around_sky(csdg, 7*u.arcsec)
+        idgaia, idsdg, d2d = radec_match_to(
+            [gaiaobjs["RA"], gaiaobjs["DEC"]], [ra[ii_true], dec[ii_true]],
+            sep=7., radec=True, return_sep=True, allmatches=True)
         # ADM remove source matches with d2d=0 (i.e. the source itself!).
         idgaia, idsdg = idgaia[d2d > 0], idsdg[d2d > 0]
         # ADM remove matches within 5 mags of a Gaia source.
@@ -1851,13 +1857,10 @@ def isSTD_calspec(ra=None, dec=None, cmxdir=None, matchrad=1.,
         # ADM set matching objects to True.
         calmatch = np.any(sep < matchrad*u.arcsec)
     else:
-        # ADM This triggers a (non-malicious) Cython RuntimeWarning on search_around_sky:
-        # RuntimeWarning: numpy.dtype size changed, may indicate binary incompatibility. Expected 96, got 88
-        # ADM Caused by importing a scipy compiled against an older numpy than is installed?
-        # e.g. stackoverflow.com/questions/40845304/runtimewarning-numpy-dtype-size-changed-may-indicate-binary-incompatibility
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            idobjs, idcals, _, _ = ccals.search_around_sky(cobjs, matchrad*u.arcsec)
+        # ADM the same CALSPEC catalog is matched to for every sweep
+        # ADM file, so it's worth caching its tree.
+        _, idobjs = radec_match_to([cals['RA'], cals["DEC"]], [ra, dec],
+                                   sep=matchrad, radec=True, cache=True)
         # ADM set matching objects to True.
         calmatch[idobjs] = True
 
@@ -2115,6 +2118,24 @@ def apply_cuts_gaia(numproc=4, cmxdir=None, nside=None, pixlist=None,
     return cmx_target, gaiaobjs, priority_shift
 
 
+# ADM the quantities passed to the selection functions by apply_cuts().
+# ADM Every commissioning target class is always selected. These are
+# ADM translated to input columns by desitarget.cuts.tcnames_columns().
+tcnames_inputs = {
+    "ALL": ["photsys_north", "release", "objtype", "galb", "maskbits",
+            "gflux", "rflux", "zflux", "w1flux", "w2flux", "gfiberflux",
+            "rfiberflux", "zfiberflux", "obs_gflux", "obs_rflux", "obs_zflux",
+            "gsnr", "rsnr", "zsnr", "w1snr", "w2snr", "gnobs", "rnobs", "znobs",
+            "gfracflux", "rfracflux", "zfracflux", "gfracmasked",
+            "rfracmasked", "zfracmasked", "gfracin", "rfracin", "zfracin",
+            "gfluxivar", "rfluxivar", "zfluxivar", "dchisq", "deltaChi2",
+            "refcat", "gaia", "pmra", "pmdec", "parallax", "parallaxerr",
+            "parallaxovererror", "gaiagmag", "gaiabmag", "gaiarmag", "gaiaaen",
+            "gaiadupsource", "gaiaparamssolved", "gaiabprpfactor",
+            "gaiasigma5dmax", "Grr"]
+}
+
+
 def apply_cuts(objects, cmxdir=None, noqso=False):
     """Commissioning (cmx) target selection, return target mask arrays.
 
@@ -2500,7 +2521,7 @@ def select_targets(infiles, numproc=4, cmxdir=None, noqso=False,
     # ADM know which HEALPixels touch each file.
     if pixlist is not None:
         filesperpixel, _, _ = sweep_files_touch_hp(
-            nside, pixlist, infiles)
+            nside, pixlist, infiles, numproc=numproc)
 
     # ADM if the bundlefiles option was sent, call the packing code.
     if bundlefiles is not None:
@@ -2551,14 +2572,20 @@ def select_targets(infiles, numproc=4, cmxdir=None, noqso=False,
 
         return targets
 
+    # ADM only read the columns needed for commissioning target selection.
+    columns = tcnames_columns([], survey='cmx')
+
     # -functions to run on every brick/sweep file
     def _select_targets_file(filename):
         '''Returns targets in filename that pass the cuts'''
-        objects = io.read_tractor(filename)
+        objects = io.read_tractor(filename, columns=columns)
         cmx_target, priority_shift = apply_cuts(objects,
                                                 cmxdir=cmxdir, noqso=noqso)
-        return _finalize_targets(objects, cmx_target,
-                                 priority_shift=priority_shift)
+        # ADM read every column, but only for the targets.
+        keep = np.where(cmx_target != 0)[0]
+        objects = io.read_tractor(filename, rows=keep)
+        return _finalize_targets(objects, cmx_target[keep],
+                                 priority_shift=priority_shift[keep])
 
     # Counter for number of bricks processed;
     # a numpy scalar allows updating nbrick in python 2
@@ -2578,6 +2605,12 @@ def select_targets(infiles, numproc=4, cmxdir=None, noqso=False,
         nbrick[...] += 1    # this is an in-place modification
         return result
 
+    # ADM load the QSO Random Forests before forking, so that they're
+    # ADM shared (copy-on-write) by every parallel process.
+    forestCacheStats(reset=True)
+    if not noqso:
+        preloadForests(qso_rf_forests + qso_rf_forests_MS)
+
     # -Parallel process input files
     if numproc > 1:
         pool = sharedmem.MapReduce(np=numproc)
@@ -2590,6 +2623,12 @@ def select_targets(infiles, numproc=4, cmxdir=None, noqso=False,
 
     targets = np.concatenate(targets)
 
+    rfstats = forestCacheStats()
+    if rfstats["misses"] > 0:
+        log.info('Loaded {} QSO RF forests in {:.1f}s; {} reuses saved {:.1f}s'
+                 .format(rfstats["misses"], rfstats["loadtime"],
+                         rfstats["hits"], rfstats["timesaved"]))
+
     if backup:
         # ADM also process Gaia-only targets.
         log.info('Retrieve additional Gaia-only (backup) objects...t = {:.1f} mins'
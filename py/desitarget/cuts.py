@@ -29,7 +29,9 @@ from astropy.table import Table, Row
 
 from desitarget import io
 from desitarget.internal import sharedmem
-from desitarget.gaiamatch import match_gaia_to_primary
+from desitarget.myRF import preloadForests, forestCacheStats
+from desitarget.gaiamatch import match_gaia_to_primary, gaia_cache_stats
+from desitarget.gaiamatch import clear_gaia_cache
 from desitarget.gaiamatch import pop_gaia_coords, pop_gaia_columns
 from desitarget.gaiamatch import gaia_dr_from_ref_cat, is_in_Galaxy
 from desitarget.targets import finalize, resolve
@@ -1252,6 +1254,18 @@ def isQSO_colors(gflux=None, rflux=None, zflux=None, w1flux=None, w2flux=None,
     return qso
 
 
+# ADM the Random Forests used by isQSO_randomforest(), as (file name,
+# ADM number of trees, myRF version) tuples. select_targets() loads
+# ADM these before forking so that they are shared by all processes.
+qso_rf_forests = [
+    (resource_filename('desitarget', 'data/rf_model_dr3.npz'), 200, 1),
+    (resource_filename('desitarget', 'data/rf_model_dr7.npz'), 500, 2),
+    (resource_filename('desitarget', 'data/rf_model_dr7_HighZ.npz'), 500, 2),
+    (resource_filename('desitarget', 'data/rf_model_dr8.npz'), 500, 2),
+    (resource_filename('desitarget', 'data/rf_model_dr8_HighZ.npz'), 500, 2)
+]
+
+
 def isQSO_randomforest(gflux=None, rflux=None, zflux=None, maskbits=None,
                        w1flux=None, w2flux=None, objtype=None, release=None,
                        gnobs=None, rnobs=None, znobs=None, deltaChi2=None,
@@ -1336,7 +1350,7 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, maskbits=None,
 
     if np.any(preSelection):
 
-        from desitarget.myRF import myRF
+        from desitarget.myRF import getForest
 
         # Data reduction to preselected objects
         colorsReduced = colors[preSelection]
@@ -1356,13 +1370,10 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, maskbits=None,
 
         tmpReleaseOK = releaseReduced < 5000
         if np.any(tmpReleaseOK):
-            # rf initialization - colors data duplicated within "myRF"
-            rf_DR3 = myRF(colorsReduced[tmpReleaseOK], pathToRF,
-                          numberOfTrees=200, version=1)
             # rf loading
-            rf_DR3.loadForest(rf_DR3_fileName)
+            rf_DR3 = getForest(rf_DR3_fileName, numberOfTrees=200, version=1)
             # Compute rf probabilities
-            tmp_rf_proba = rf_DR3.predict_proba()
+            tmp_rf_proba = rf_DR3.predict_proba(colorsReduced[tmpReleaseOK])
             tmp_r_Reduced = r_Reduced[tmpReleaseOK]
             # Compute optimized proba cut
             pcut = np.where(tmp_r_Reduced > 20.0,
@@ -1374,17 +1385,13 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, maskbits=None,
 
         tmpReleaseOK = (releaseReduced >= 5000) & (releaseReduced < 8000)
         if np.any(tmpReleaseOK):
-            # rf initialization - colors data duplicated within "myRF"
-            rf = myRF(colorsReduced[tmpReleaseOK], pathToRF,
-                      numberOfTrees=500, version=2)
-            rf_HighZ = myRF(colorsReduced[tmpReleaseOK], pathToRF,
-                            numberOfTrees=500, version=2)
             # rf loading
-            rf.loadForest(rf_DR7_fileName)
-            rf_HighZ.loadForest(rf_DR7_HighZ_fileName)
+            rf = getForest(rf_DR7_fileName, numberOfTrees=500, version=2)
+            rf_HighZ = getForest(rf_DR7_HighZ_fileName,
+                                 numberOfTrees=500, version=2)
             # Compute rf probabilities
-            tmp_rf_proba = rf.predict_proba()
-            tmp_rf_HighZ_proba = rf_HighZ.predict_proba()
+            tmp_rf_proba = rf.predict_proba(colorsReduced[tmpReleaseOK])
+            tmp_rf_HighZ_proba = rf_HighZ.predict_proba(colorsReduced[tmpReleaseOK])
             # Compute optimized proba cut
             tmp_r_Reduced = r_Reduced[tmpReleaseOK]
             pcut = np.where(tmp_r_Reduced > 20.8,
@@ -1403,17 +1410,13 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, maskbits=None,
 
         tmpReleaseOK = releaseReduced >= 8000
         if np.any(tmpReleaseOK):
-            # rf initialization - colors data duplicated within "myRF"
-            rf = myRF(colorsReduced[tmpReleaseOK], pathToRF,
-                      numberOfTrees=500, version=2)
-            rf_HighZ = myRF(colorsReduced[tmpReleaseOK], pathToRF,
-                            numberOfTrees=500, version=2)
             # rf loading
-            rf.loadForest(rf_DR8_fileName)
-            rf_HighZ.loadForest(rf_DR8_HighZ_fileName)
+            rf = getForest(rf_DR8_fileName, numberOfTrees=500, version=2)
+            rf_HighZ = getForest(rf_DR8_HighZ_fileName,
+                                 numberOfTrees=500, version=2)
             # Compute rf probabilities
-            tmp_rf_proba = rf.predict_proba()
-            tmp_rf_HighZ_proba = rf_HighZ.predict_proba()
+            tmp_rf_proba = rf.predict_proba(colorsReduced[tmpReleaseOK])
+            tmp_rf_HighZ_proba = rf_HighZ.predict_proba(colorsReduced[tmpReleaseOK])
             # Compute optimized proba cut
             tmp_r_Reduced = r_Reduced[tmpReleaseOK]
             pcut = 0.88 - 0.03*np.tanh(tmp_r_Reduced - 20.5)
@@ -1538,6 +1541,184 @@ def _get_colnames(objects):
     return colnames
 
 
+# ADM the Legacy Surveys (and Gaia) columns from which each of the
+# ADM quantities that are passed to set_target_bits() is derived, see
+# ADM _prepare_optical_wise() and _prepare_gaia().
+input_columns = {
+    "photsys_north": ["RELEASE"], "photsys_south": ["RELEASE"],
+    "release": ["RELEASE"], "objtype": ["TYPE"],
+    "obs_gflux": ["FLUX_G"], "obs_rflux": ["FLUX_R"], "obs_zflux": ["FLUX_Z"],
+    "deltaChi2": ["DCHISQ"], "dchisq": ["DCHISQ"],
+    "maskbits": ["MASKBITS"], "refcat": ["REF_CAT"],
+    "gaia": ["REF_ID", "REF_CAT"], "pmra": ["PMRA"], "pmdec": ["PMDEC"],
+    "parallax": ["PARALLAX"],
+    "parallaxovererror": ["PARALLAX", "PARALLAX_IVAR"],
+    "parallaxerr": ["PARALLAX_IVAR"],
+    "gaiagmag": ["GAIA_PHOT_G_MEAN_MAG"],
+    "gaiabmag": ["GAIA_PHOT_BP_MEAN_MAG"],
+    "gaiarmag": ["GAIA_PHOT_RP_MEAN_MAG"],
+    "gaiaaen": ["GAIA_ASTROMETRIC_EXCESS_NOISE"],
+    "gaiadupsource": ["GAIA_DUPLICATED_SOURCE"],
+    "gaiaparamssolved": ["GAIA_ASTROMETRIC_PARAMS_SOLVED",
+                         "PMRA", "PMRA_IVAR"],
+    "gaiabprpfactor": ["GAIA_PHOT_BP_RP_EXCESS_FACTOR"],
+    "gaiasigma5dmax": ["GAIA_ASTROMETRIC_SIGMA5D_MAX"],
+    "Grr": ["GAIA_PHOT_G_MEAN_MAG", "FLUX_R"], "galb": ["RA", "DEC"]
+}
+# ADM e.g. gflux is derived from FLUX_G and MW_TRANSMISSION_G.
+input_columns.update({b+"flux": ["FLUX_"+b.upper(), "MW_TRANSMISSION_"+b.upper()]
+                      for b in ["g", "r", "z", "w1", "w2"]})
+input_columns.update({b+"snr": ["FLUX_"+b.upper(), "FLUX_IVAR_"+b.upper()]
+                      for b in ["g", "r", "z", "w1", "w2"]})
+input_columns.update({b+"fiberflux": ["FIBERFLUX_"+b.upper(),
+                                      "MW_TRANSMISSION_"+b.upper()]
+                      for b in ["g", "r", "z"]})
+# ADM e.g. gnobs is NOBS_G and gfracin is FRACIN_G.
+input_columns.update({b+q: ["{}_{}".format(col, b.upper())]
+                      for b in ["g", "r", "z"]
+                      for q, col in [("fluxivar", "FLUX_IVAR"), ("nobs", "NOBS"),
+                                     ("fracflux", "FRACFLUX"), ("fracin", "FRACIN"),
+                                     ("fracmasked", "FRACMASKED"),
+                                     ("allmask", "ALLMASK")]})
+
+# ADM the quantities passed to the selection functions (isLRG() etc.)
+# ADM for each target class by set_target_bits(). QSOs include inputs
+# ADM for both the color cuts and the Random Forest. The zflux is always
+# ADM needed, as (with rflux) it sets the BGS_FAINT_HIP selection.
+tcnames_inputs = {
+    "LRG": ["gflux", "rflux", "zflux", "w1flux", "zfiberflux",
+            "gnobs", "rnobs", "znobs", "rsnr", "zsnr", "w1snr", "maskbits"],
+    "ELG": ["gflux", "rflux", "zflux", "gsnr", "rsnr", "zsnr",
+            "gnobs", "rnobs", "znobs", "maskbits"],
+    "QSO": ["gflux", "rflux", "zflux", "w1flux", "w2flux", "deltaChi2",
+            "gnobs", "rnobs", "znobs", "w1snr", "w2snr", "maskbits",
+            "objtype", "release"],
+    "BGS": ["gflux", "rflux", "zflux", "w1flux", "w2flux", "rfiberflux",
+            "gnobs", "rnobs", "znobs", "gfracmasked", "rfracmasked",
+            "zfracmasked", "gfracflux", "rfracflux", "zfracflux",
+            "gfracin", "rfracin", "zfracin", "gfluxivar", "rfluxivar",
+            "zfluxivar", "maskbits", "Grr", "refcat", "w1snr", "gaiagmag",
+            "objtype"],
+    "MWS": ["gaia", "gaiagmag", "gaiabmag", "gaiarmag", "gaiaaen",
+            "gaiadupsource", "gaiaparamssolved", "gaiabprpfactor",
+            "gaiasigma5dmax", "gflux", "rflux", "obs_rflux", "objtype",
+            "gnobs", "rnobs", "gfracmasked", "rfracmasked", "pmra", "pmdec",
+            "parallax", "parallaxerr", "parallaxovererror", "galb"],
+    "STD": ["gflux", "rflux", "zflux", "gfracflux", "rfracflux",
+            "zfracflux", "gfracmasked", "rfracmasked", "zfracmasked",
+            "objtype", "gnobs", "rnobs", "znobs", "gfluxivar", "rfluxivar",
+            "zfluxivar", "gaia", "gaiaaen", "gaiaparamssolved", "pmra",
+            "pmdec", "parallax", "gaiadupsource", "gaiagmag", "gaiabmag",
+            "gaiarmag", "galb", "parallaxovererror", "gaiabprpfactor",
+            "gaiasigma5dmax"],
+    "ALL": ["photsys_north", "release", "galb", "zflux"]
+}
+
+
+def inputs_to_columns(inputs):
+    """The columns needed to derive a set of target selection inputs.
+
+    Parameters
+    ----------
+    inputs : :class:`list`
+        Names of quantities passed to the target selection functions,
+        e.g. ["gflux", "rsnr"]. See :data:`input_columns` for options.
+
+    Returns
+    -------
+    :class:`list`
+        The (sorted) Legacy Surveys (and Gaia) columns needed to derive
+        `inputs`, e.g. ["FLUX_G", "FLUX_IVAR_R", "FLUX_R", ...].
+    """
+    badinputs = set(inputs) - set(input_columns)
+    if len(badinputs) > 0:
+        msg = "unknown target selection inputs: {}".format(badinputs)
+        log.critical(msg)
+        raise ValueError(msg)
+
+    return sorted(set(np.concatenate([input_columns[i] for i in inputs])))
+
+
+def tcnames_columns(tcnames, survey='main'):
+    """The columns needed to select a set of target classes.
+
+    Parameters
+    ----------
+    tcnames : :class:`list`
+        A list of target classes, e.g. ['QSO','LRG'], as for
+        :func:`select_targets`.
+    survey : :class:`str`, defaults to ``'main'``
+        Specifies which target selection cuts to use. Options are
+        ``'main'`` and ``'svX``' (where X is 1, 2, 3 etc.).
+
+    Returns
+    -------
+    :class:`list`
+        The (sorted) Legacy Surveys (and Gaia) columns needed to select
+        the target classes in `tcnames`, e.g. to pass to the `columns`
+        argument of :func:`desitarget.io.read_tractor`.
+
+    Notes
+    -----
+    - The inputs for each target class are declared by the dictionary
+      `tcnames_inputs` in the cuts module for each survey.
+    """
+    if survey == 'main':
+        import desitarget.cuts as targcuts
+    else:
+        targcuts = import_module("desitarget.{}.{}_cuts".format(survey, survey))
+
+    inputs = list(targcuts.tcnames_inputs["ALL"])
+    for tcname in tcnames:
+        inputs += targcuts.tcnames_inputs[tcname]
+
+    return inputs_to_columns(inputs)
+
+
+def _column_getter(objects, colnames=None):
+    """Retrieve columns from objects, allowing for columns that weren't read.
+
+    Parameters
+    ----------
+    objects : :class:`~numpy.ndarray` or `~astropy.table.Table`
+        Legacy Surveys objects, as passed to :func:`apply_cuts`.
+    colnames : :class:`list`, optional
+        The column names of `objects`, if already known.
+
+    Returns
+    -------
+    :class:`function`
+        A function that returns a column of `objects` given its name.
+
+    Notes
+    -----
+    - Columns that aren't in `objects`, e.g. because they weren't read
+      as they aren't needed for the target classes being selected (see
+      :func:`tcnames_columns`), are returned as arrays of ones (or empty
+      strings) with the dtype of the Legacy Surveys data model. Ones are
+      used to avoid spurious warnings (e.g. for divisions).
+    """
+    if colnames is None:
+        colnames = _get_colnames(objects)
+    datamodel = {}
+
+    def get(col):
+        if col in colnames:
+            return objects[col]
+        if len(datamodel) == 0:
+            from desitarget.gaiamatch import gaiadatamodel
+            dt = io.basetsdatamodel.dtype.descr + io.dr9addedcols.dtype.descr
+            dt += gaiadatamodel.dtype.descr + [('PHOTSYS', 'U1')]
+            datamodel.update({d[0]: np.dtype(d[1:]) if len(d) > 2
+                              else np.dtype(d[1]) for d in dt})
+        shape = () if _is_row(objects) else len(objects)
+        if datamodel[col].kind in 'SU':
+            return np.zeros(shape, dtype=datamodel[col])
+        return np.ones(shape, dtype=datamodel[col])
+
+    return get
+
+
 def _prepare_optical_wise(objects, mask=True):
     """Process the Legacy Surveys inputs for target selection.
 
@@ -1546,10 +1727,17 @@ def _prepare_optical_wise(objects, mask=True):
     mask : :class:`boolean`, optional, defaults to ``True``
         Send ``False`` to turn off any masking cuts based on the `MASKBITS` column. The
         default behavior is to always mask using `MASKBITS`.
+
+    Notes
+    -----
+    - Columns that weren't read (see :func:`tcnames_columns`) are
+      substituted by :func:`_column_getter`.
     """
+    get = _column_getter(objects)
+
     # ADM flag whether we're using northen (BASS/MZLS) or
     # ADM southern (DECaLS) photometry
-    photsys_north = _isonnorthphotsys(objects["PHOTSYS"])
+    photsys_north = _isonnorthphotsys(get("PHOTSYS"))
     photsys_south = ~photsys_north
     # ADM catch case where single object or row is passed.
     if isinstance(photsys_north, bool):
@@ -1570,10 +1758,10 @@ def _prepare_optical_wise(objects, mask=True):
 
     # ADM the observed r-band flux (used for F standards and MWS, below)
     # ADM make copies of values that we may reassign due to NaNs
-    obs_rflux = objects['FLUX_R']
+    obs_rflux = get('FLUX_R')
 
     # - undo Milky Way extinction
-    flux = unextinct_fluxes(objects)
+    flux = unextinct_fluxes(objects, get=get)
 
     gflux = flux['GFLUX']
     rflux = flux['RFLUX']
@@ -1583,49 +1771,49 @@ def _prepare_optical_wise(objects, mask=True):
     gfiberflux = flux['GFIBERFLUX']
     rfiberflux = flux['RFIBERFLUX']
     zfiberflux = flux['ZFIBERFLUX']
-    objtype = objects['TYPE']
-    release = objects['RELEASE']
+    objtype = get('TYPE')
+    release = get('RELEASE')
 
-    gfluxivar = objects['FLUX_IVAR_G']
-    rfluxivar = objects['FLUX_IVAR_R']
-    zfluxivar = objects['FLUX_IVAR_Z']
+    gfluxivar = get('FLUX_IVAR_G')
+    rfluxivar = get('FLUX_IVAR_R')
+    zfluxivar = get('FLUX_IVAR_Z')
 
-    gnobs = objects['NOBS_G']
-    rnobs = objects['NOBS_R']
-    znobs = objects['NOBS_Z']
+    gnobs = get('NOBS_G')
+    rnobs = get('NOBS_R')
+    znobs = get('NOBS_Z')
 
-    gfracflux = objects['FRACFLUX_G']
-    rfracflux = objects['FRACFLUX_R']
-    zfracflux = objects['FRACFLUX_Z']
+    gfracflux = get('FRACFLUX_G')
+    rfracflux = get('FRACFLUX_R')
+    zfracflux = get('FRACFLUX_Z')
 
-    gfracmasked = objects['FRACMASKED_G']
-    rfracmasked = objects['FRACMASKED_R']
-    zfracmasked = objects['FRACMASKED_Z']
+    gfracmasked = get('FRACMASKED_G')
+    rfracmasked = get('FRACMASKED_R')
+    zfracmasked = get('FRACMASKED_Z')
 
-    gfracin = objects['FRACIN_G']
-    rfracin = objects['FRACIN_R']
-    zfracin = objects['FRACIN_Z']
+    gfracin = get('FRACIN_G')
+    rfracin = get('FRACIN_R')
+    zfracin = get('FRACIN_Z')
 
-    gallmask = objects['ALLMASK_G']
-    rallmask = objects['ALLMASK_R']
-    zallmask = objects['ALLMASK_Z']
+    gallmask = get('ALLMASK_G')
+    rallmask = get('ALLMASK_R')
+    zallmask = get('ALLMASK_Z')
 
-    gsnr = objects['FLUX_G'] * np.sqrt(objects['FLUX_IVAR_G'])
-    rsnr = objects['FLUX_R'] * np.sqrt(objects['FLUX_IVAR_R'])
-    zsnr = objects['FLUX_Z'] * np.sqrt(objects['FLUX_IVAR_Z'])
-    w1snr = objects['FLUX_W1'] * np.sqrt(objects['FLUX_IVAR_W1'])
-    w2snr = objects['FLUX_W2'] * np.sqrt(objects['FLUX_IVAR_W2'])
+    gsnr = get('FLUX_G') * np.sqrt(get('FLUX_IVAR_G'))
+    rsnr = get('FLUX_R') * np.sqrt(get('FLUX_IVAR_R'))
+    zsnr = get('FLUX_Z') * np.sqrt(get('FLUX_IVAR_Z'))
+    w1snr = get('FLUX_W1') * np.sqrt(get('FLUX_IVAR_W1'))
+    w2snr = get('FLUX_W2') * np.sqrt(get('FLUX_IVAR_W2'))
 
-    refcat = objects['REF_CAT']
+    refcat = get('REF_CAT')
 
-    maskbits = objects['MASKBITS']
+    maskbits = get('MASKBITS')
     # ADM if we asked to turn off masking behavior, turn it off.
     if not mask:
-        maskbits = objects['MASKBITS'].copy()
+        maskbits = get('MASKBITS').copy()
         maskbits[...] = 0
 
     # Delta chi2 between PSF and SIMP morphologies; note the sign....
-    dchisq = objects['DCHISQ']
+    dchisq = get('DCHISQ')
     deltaChi2 = dchisq[..., 0] - dchisq[..., 1]
 
     # ADM remove handful of NaN values from DCHISQ values and make them unselectable.
@@ -1648,23 +1836,29 @@ def _prepare_optical_wise(objects, mask=True):
 
 
 def _prepare_gaia(objects, colnames=None):
-    """Process the various Gaia inputs for target selection."""
+    """Process the various Gaia inputs for target selection.
 
+    Notes
+    -----
+    - Columns that weren't read (see :func:`tcnames_columns`) are
+      substituted by :func:`_column_getter`.
+    """
     if colnames is None:
         colnames = _get_colnames(objects)
+    get = _column_getter(objects, colnames=colnames)
 
     # ADM Add the Gaia columns...
     # ADM if we don't have REF_CAT in the sweeps use the
     # ADM minimum value of REF_ID to identify Gaia sources. This will
     # ADM introduce a small number (< 0.001%) of Tycho-only sources.
-    gaia = objects['REF_ID'] > 0
+    gaia = get('REF_ID') > 0
     if "REF_CAT" in colnames:
-        gaia = (objects['REF_CAT'] == b'G2') | (objects['REF_CAT'] == 'G2')
-    pmra = objects['PMRA']
-    pmdec = objects['PMDEC']
-    pmraivar = objects['PMRA_IVAR']
-    parallax = objects['PARALLAX']
-    parallaxivar = objects['PARALLAX_IVAR']
+        gaia = (get('REF_CAT') == b'G2') | (get('REF_CAT') == 'G2')
+    pmra = get('PMRA')
+    pmdec = get('PMDEC')
+    pmraivar = get('PMRA_IVAR')
+    parallax = get('PARALLAX')
+    parallaxivar = get('PARALLAX_IVAR')
     # ADM derive the parallax/parallax_error, but set to 0 where the error is bad
     parallaxovererror = np.where(parallaxivar > 0., parallax*np.sqrt(parallaxivar), 0.)
 
@@ -1673,34 +1867,34 @@ def _prepare_gaia(objects, colnames=None):
     notzero = parallaxivar > 0
     if np.sum(notzero) > 0:
         parallaxerr[notzero] = 1 / np.sqrt(parallaxivar[notzero])
-    gaiagmag = objects['GAIA_PHOT_G_MEAN_MAG']
-    gaiabmag = objects['GAIA_PHOT_BP_MEAN_MAG']
-    gaiarmag = objects['GAIA_PHOT_RP_MEAN_MAG']
-    gaiaaen = objects['GAIA_ASTROMETRIC_EXCESS_NOISE']
+    gaiagmag = get('GAIA_PHOT_G_MEAN_MAG')
+    gaiabmag = get('GAIA_PHOT_BP_MEAN_MAG')
+    gaiarmag = get('GAIA_PHOT_RP_MEAN_MAG')
+    gaiaaen = get('GAIA_ASTROMETRIC_EXCESS_NOISE')
     # ADM a mild hack, as GAIA_DUPLICATED_SOURCE was a 0/1 integer at some point.
-    gaiadupsource = objects['GAIA_DUPLICATED_SOURCE']
+    gaiadupsource = get('GAIA_DUPLICATED_SOURCE')
     if issubclass(gaiadupsource.dtype.type, np.integer):
         if len(set(np.atleast_1d(gaiadupsource)) - set([0, 1])) == 0:
-            gaiadupsource = objects['GAIA_DUPLICATED_SOURCE'].astype(bool)
+            gaiadupsource = get('GAIA_DUPLICATED_SOURCE').astype(bool)
 
     # For BGS target selection.
     # ADM first guard against FLUX_R < 0 (I've checked this generates
     # ADM the same set of targets as Grr = NaN).
     Grr = gaiagmag - 22.5 + 2.5*np.log10(1e-16)
-    ii = objects['FLUX_R'] > 0
+    ii = get('FLUX_R') > 0
     # ADM catch the case where Grr is a scalar.
     if isinstance(Grr, np.float):
         if ii:
-            Grr = gaiagmag - 22.5 + 2.5*np.log10(objects['FLUX_R'])
+            Grr = gaiagmag - 22.5 + 2.5*np.log10(get('FLUX_R'))
     else:
-        Grr[ii] = gaiagmag[ii] - 22.5 + 2.5*np.log10(objects['FLUX_R'][ii])
+        Grr[ii] = gaiagmag[ii] - 22.5 + 2.5*np.log10(get('FLUX_R')[ii])
 
     # ADM If proper motion is not NaN, 31 parameters were solved for
     # ADM in Gaia astrometry. Or, gaiaparamssolved should be 3 for NaNs).
     # ADM In the sweeps, NaN has not been preserved...but PMRA_IVAR == 0
     # ADM in the sweeps is equivalent to PMRA of NaN in Gaia.
     if 'GAIA_ASTROMETRIC_PARAMS_SOLVED' in colnames:
-        gaiaparamssolved = objects['GAIA_ASTROMETRIC_PARAMS_SOLVED']
+        gaiaparamssolved = get('GAIA_ASTROMETRIC_PARAMS_SOLVED')
     else:
         gaiaparamssolved = np.zeros_like(gaia) + 31
         w = np.where(np.isnan(pmra) | (pmraivar == 0))[0]
@@ -1716,25 +1910,27 @@ def _prepare_gaia(objects, colnames=None):
     gaiabprpfactor = None
     gaiasigma5dmax = None
     if 'GAIA_PHOT_BP_RP_EXCESS_FACTOR' in colnames:
-        gaiabprpfactor = objects['GAIA_PHOT_BP_RP_EXCESS_FACTOR']
+        gaiabprpfactor = get('GAIA_PHOT_BP_RP_EXCESS_FACTOR')
     if 'GAIA_ASTROMETRIC_SIGMA5D_MAX' in colnames:
-        gaiasigma5dmax = objects['GAIA_ASTROMETRIC_SIGMA5D_MAX']
+        gaiasigma5dmax = get('GAIA_ASTROMETRIC_SIGMA5D_MAX')
 
     # ADM Milky Way Selection requires Galactic b
-    _, galb = _gal_coords(objects["RA"], objects["DEC"])
+    _, galb = _gal_coords(get("RA"), get("DEC"))
 
     return (gaia, pmra, pmdec, parallax, parallaxovererror, parallaxerr, gaiagmag,
             gaiabmag, gaiarmag, gaiaaen, gaiadupsource, Grr, gaiaparamssolved,
             gaiabprpfactor, gaiasigma5dmax, galb)
 
 
-def unextinct_fluxes(objects):
+def unextinct_fluxes(objects, get=None):
     """Calculate unextincted DECam and WISE fluxes.
 
     Args:
         objects: array or Table with columns FLUX_G, FLUX_R, FLUX_Z,
             MW_TRANSMISSION_G, MW_TRANSMISSION_R, MW_TRANSMISSION_Z,
             FLUX_W1, FLUX_W2, MW_TRANSMISSION_W1, MW_TRANSMISSION_W2
+        get: optional function to retrieve columns from `objects`, as
+            returned by :func:`_column_getter`
 
     Returns:
         array or Table with columns GFLUX, RFLUX, ZFLUX, W1FLUX, W2FLUX
@@ -1744,19 +1940,21 @@ def unextinct_fluxes(objects):
     dtype = [('GFLUX', 'f4'), ('RFLUX', 'f4'), ('ZFLUX', 'f4'),
              ('W1FLUX', 'f4'), ('W2FLUX', 'f4'),
              ('GFIBERFLUX', 'f4'), ('RFIBERFLUX', 'f4'), ('ZFIBERFLUX', 'f4')]
+    if get is None:
+        get = objects.__getitem__
     if _is_row(objects):
         result = np.zeros(1, dtype=dtype)[0]
     else:
         result = np.zeros(len(objects), dtype=dtype)
 
-    result['GFLUX'] = objects['FLUX_G'] / objects['MW_TRANSMISSION_G']
-    result['RFLUX'] = objects['FLUX_R'] / objects['MW_TRANSMISSION_R']
-    result['ZFLUX'] = objects['FLUX_Z'] / objects['MW_TRANSMISSION_Z']
-    result['W1FLUX'] = objects['FLUX_W1'] / objects['MW_TRANSMISSION_W1']
-    result['W2FLUX'] = objects['FLUX_W2'] / objects['MW_TRANSMISSION_W2']
-    result['GFIBERFLUX'] = objects['FIBERFLUX_G'] / objects['MW_TRANSMISSION_G']
-    result['RFIBERFLUX'] = objects['FIBERFLUX_R'] / objects['MW_TRANSMISSION_R']
-    result['ZFIBERFLUX'] = objects['FIBERFLUX_Z'] / objects['MW_TRANSMISSION_Z']
+    result['GFLUX'] = get('FLUX_G') / get('MW_TRANSMISSION_G')
+    result['RFLUX'] = get('FLUX_R') / get('MW_TRANSMISSION_R')
+    result['ZFLUX'] = get('FLUX_Z') / get('MW_TRANSMISSION_Z')
+    result['W1FLUX'] = get('FLUX_W1') / get('MW_TRANSMISSION_W1')
+    result['W2FLUX'] = get('FLUX_W2') / get('MW_TRANSMISSION_W2')
+    result['GFIBERFLUX'] = get('FIBERFLUX_G') / get('MW_TRANSMISSION_G')
+    result['RFIBERFLUX'] = get('FIBERFLUX_R') / get('MW_TRANSMISSION_R')
+    result['ZFIBERFLUX'] = get('FIBERFLUX_Z') / get('MW_TRANSMISSION_Z')
 
     if isinstance(objects, Table):
         return Table(result)
@@ -1764,6 +1962,36 @@ def unextinct_fluxes(objects):
         return result
 
 
+def _flux_uniform(*fluxes):
+    """Uniform deviates in [0, 1) that are a hash of each object's fluxes.
+
+    Parameters
+    ----------
+    *fluxes : :class:`~numpy.ndarray` or `float`
+        Fluxes (e.g. `rflux`, `zflux`) for each object.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        A deviate for each object, that only depends on its own fluxes.
+
+    Notes
+    -----
+        - Fluxes are hashed (with the SplitMix64 finalizer) as 64-bit
+          floats, so float32 and float64 fluxes give the same deviates.
+    """
+    h = np.zeros(np.size(fluxes[0]), dtype='u8')
+    for flux in fluxes:
+        h ^= np.atleast_1d(np.asarray(flux, dtype='<f8')).view('<u8')
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xbf58476d1ce4e5b9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94d049bb133111eb)
+        h ^= h >> np.uint64(31)
+
+    return (h >> np.uint64(11)) * 2.**-53
+
+
 def set_target_bits(photsys_north, photsys_south, obs_rflux,
                     gflux, rflux, zflux, w1flux, w2flux,
                     gfiberflux, rfiberflux, zfiberflux,
@@ -1976,22 +2204,19 @@ def set_target_bits(photsys_north, photsys_south, obs_rflux,
     bgs_wise = (bgs_wise_north & photsys_north) | (bgs_wise_south & photsys_south)
 
     # ADM 10% of the BGS_FAINT sources need the BGS_FAINT_HIP bit set.
-    # ADM form a seed using RA/Dec in case we parallelized by HEALPixel.
-    # SJB seeds must be within 0 - 2**32-1
-    # SJB np1.18 scalar vs. vector support, but note that HIP won't be
-    #     set identically for vector vs. calling scalar N times.
-    uniqseed = int(np.mean(zflux)*1e5) % (2**32 - 1)
-    np.random.seed(uniqseed)
+    # ADM draw from each object's fluxes, so that the same objects are
+    # ADM chosen however the objects are split (by file, by chunks of
+    # ADM rows, by HEALPixel or one row at a time). This changed which
+    # ADM targets are BGS_FAINT_HIP in 0.43.1 (recorded in the header
+    # ADM of targets files by io.write_targets()).
     hip = None
     if np.isscalar(bgs_faint):
         if bgs_faint:
-            nbgsf = 1
-            hip = np.random.uniform(0, 1) < 0.1
+            hip = bool(_flux_uniform(rflux, zflux)[0] < 0.1)
     else:
         w = np.where(bgs_faint)[0]
-        nbgsf = len(w)
-        if nbgsf > 0:
-            hip = np.random.choice(w, nbgsf//10, replace=False)
+        if len(w) > 0:
+            hip = w[_flux_uniform(rflux[w], zflux[w]) < 0.1]
 
     # ADM initially set everything to arrays of False for the MWS selection
     # ADM the zeroth element stores the northern targets bits (south=False).
@@ -2357,6 +2582,51 @@ def apply_cuts(objects, qso_selection='randomforest', gaiamatch=False,
     return desi_target, bgs_target, mws_target
 
 
+def apply_cuts_chunks(filename, chunksize=2**18, columns=None, **kwargs):
+    """Perform target selection on a file, a chunk of rows at a time.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a tractor or sweep file.
+    chunksize : :class:`int`, optional, defaults to 2**18
+        Number of rows to read and process at a time.
+    columns : :class:`list`, optional
+        Only read these columns to select targets (e.g. those returned by
+        :func:`tcnames_columns`). Every column is then read, but only for
+        the targets. Defaults to reading every column.
+    **kwargs : optional
+        Passed to :func:`apply_cuts`.
+
+    Yields
+    ------
+    :class:`tuple`
+        (objects, desi_target, bgs_target, mws_target) for the objects
+        in each chunk that are targets (i.e. that have desi_target != 0).
+
+    Notes
+    -----
+        - The memory used is bounded by `chunksize` rather than by the
+          size of the file. The concatenation of every chunk is identical
+          to applying :func:`apply_cuts` to the whole file and limiting
+          to desi_target != 0, as the cuts only depend on each object.
+        - At least one (possibly empty) chunk is always yielded.
+    """
+    nrows = io.read_tractor_nrows(filename)
+    for start in range(0, max(nrows, 1), chunksize):
+        rows = np.arange(start, min(start+chunksize, nrows))
+        objects = io.read_tractor(filename, columns=columns, rows=rows)
+        desi_target, bgs_target, mws_target = apply_cuts(objects, **kwargs)
+        keep = np.where(desi_target != 0)[0]
+        # ADM read every column, but only for the targets.
+        if columns is None:
+            objects = objects[keep]
+        else:
+            objects = io.read_tractor(filename, rows=rows[keep])
+
+        yield objects, desi_target[keep], bgs_target[keep], mws_target[keep]
+
+
 qso_selection_options = ['colorcuts', 'randomforest']
 
 
@@ -2364,7 +2634,8 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
                    gaiamatch=False, nside=None, pixlist=None, bundlefiles=None,
                    extra=None, radecbox=None, radecrad=None, mask=True,
                    tcnames=["ELG", "QSO", "LRG", "MWS", "BGS", "STD"],
-                   survey='main', resolvetargs=True, backup=True):
+                   survey='main', resolvetargs=True, backup=True,
+                   chunksize=None, timingfile=None):
     """Process input files in parallel to select targets.
 
     Parameters
@@ -2416,6 +2687,16 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
         and southern targets in southern regions.
     backup : :class:`boolean`, optional, defaults to ``True``
         If ``True``, also run the Gaia-only BACKUP_BRIGHT/FAINT targets.
+    chunksize : :class:`int`, optional, defaults to `None`
+        If passed, read and process each input file `chunksize` rows at
+        a time (see :func:`apply_cuts_chunks`), so that the memory used
+        by each process is bounded by `chunksize` rather than by the size
+        of the largest file. The default is to process whole files.
+    timingfile : :class:`str`, optional, defaults to `None`
+        If passed, the time taken to process each input file is recorded
+        in this yaml file, and the timings recorded on earlier runs are
+        used to decide the order in which to process files. See
+        :func:`desitarget.io.sweep_file_costs`.
 
     Returns
     -------
@@ -2429,6 +2710,12 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
         - if numproc==1, use serial code instead of parallel.
         - only one of pixlist, radecbox, radecrad should be passed. They are all
           intended to denote regions on the sky, using different formalisms.
+        - in parallel, files are processed in order of decreasing estimated
+          cost, each by the next free process. So, no process is left working
+          on a large file after the others have finished.
+        - in parallel, targets are gathered in shared memory and returned in
+          the order of `infiles` (via the `positions` argument of
+          :meth:`~desitarget.internal.sharedmem.MapReduce.gather`).
     """
     from desiutil.log import get_logger
     log = get_logger()
@@ -2471,7 +2758,7 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
     # ADM which HEALPixels touch each file.
     if pixlist is not None:
         filesperpixel, _, _ = sweep_files_touch_hp(
-            nside, pixlist, infiles)
+            nside, pixlist, infiles, numproc=numproc)
 
     # ADM if the bundlefiles option was sent, call the packing code.
     if bundlefiles is not None:
@@ -2523,15 +2810,40 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
 
         return targets
 
+    # ADM only read the columns needed to select the requested target
+    # ADM classes. Matching to Gaia adds columns, so needs every column.
+    columns = None
+    if not gaiamatch:
+        columns = tcnames_columns(tcnames, survey=survey)
+
     # - functions to run on every brick/sweep file
     def _select_targets_file(filename):
         '''Returns targets in filename that pass the cuts'''
-        objects = io.read_tractor(filename)
+        # ADM in streaming mode, only the targets in each chunk are kept.
+        if chunksize is not None:
+            chunks = list(apply_cuts_chunks(
+                filename, chunksize=chunksize, columns=columns,
+                qso_selection=qso_selection, gaiamatch=gaiamatch,
+                tcnames=tcnames, survey=survey, resolvetargs=resolvetargs,
+                mask=mask))
+            objects, desi_target, bgs_target, mws_target = [
+                np.concatenate(x) for x in zip(*chunks)]
+            return _finalize_targets(
+                objects, desi_target, bgs_target, mws_target)
+
+        objects = io.read_tractor(filename, columns=columns)
         desi_target, bgs_target, mws_target = apply_cuts(
             objects, qso_selection=qso_selection, gaiamatch=gaiamatch,
             tcnames=tcnames, survey=survey, resolvetargs=resolvetargs,
             mask=mask
         )
+        # ADM read every column, but only for the targets.
+        if columns is not None:
+            keep = np.where(desi_target != 0)[0]
+            objects = io.read_tractor(filename, rows=keep)
+            desi_target = desi_target[keep]
+            bgs_target = bgs_target[keep]
+            mws_target = mws_target[keep]
 
         return _finalize_targets(objects, desi_target, bgs_target, mws_target)
 
@@ -2542,9 +2854,20 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
 
     t0 = time()
 
-    def _update_status(result):
+    # ADM the time taken to process each file.
+    timings = {}
+
+    def _select_targets_file_timed(filename):
+        '''Returns targets in filename, the filename and the time taken'''
+        tfile = time()
+        targets = _select_targets_file(filename)
+        return targets, filename, time() - tfile
+
+    def _update_status(result, filename, seconds):
         ''' wrapper function for the critical reduction operation,
             that occurs on the main parallel process '''
+        timings[filename] = seconds
+        log.debug('Processed {} in {:.1f}s'.format(filename, seconds))
         if nbrick % 20 == 0 and nbrick > 0:
             elapsed = time() - t0
             rate = elapsed / nbrick
@@ -2554,17 +2877,66 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
         nbrick[...] += 1    # this is an in-place modification
         return result
 
+    # ADM load the QSO Random Forests before forking, so that they're
+    # ADM shared (copy-on-write) by every parallel process.
+    forestCacheStats(reset=True)
+    # ADM match_gaia_to_primary reads Gaia files via the cache of decoded
+    # ADM Gaia files in gaiamatch. The cache is empty unless a size is
+    # ADM set with gaiamatch.set_gaia_cache(), and is cleared once the
+    # ADM Gaia files have been read. Parallel processes don't add to it
+    # ADM (so they don't each use maxbytes), unless they share files
+    # ADM through a shmdir, which uses memory until cleaned.
+    gaia_cache_stats(reset=True)
+    if "QSO" in tcnames and qso_selection == "randomforest":
+        if survey == 'main':
+            import desitarget.cuts as targcuts
+        else:
+            targcuts = import_module("desitarget.{}.{}_cuts".format(survey, survey))
+        preloadForests(targcuts.qso_rf_forests)
+
     # - Parallel process input files
     if numproc > 1:
+        # ADM send the most expensive files first. MapReduce passes
+        # ADM each file to the next process that becomes free.
+        costs = io.sweep_file_costs(infiles, timingfile=timingfile)
+        order = np.argsort(-costs, kind='stable')
+        # ADM each process writes its targets directly to shared memory.
+        # ADM targets are (mostly) a subset of the rows and columns of
+        # ADM each file, so the files' sizes are enough shared memory.
+        capacity = sum(os.path.getsize(fn) for fn in infiles)
         pool = sharedmem.MapReduce(np=numproc)
         with pool:
-            targets = pool.map(_select_targets_file, infiles, reduce=_update_status)
+            # ADM return the targets in the order of the input files.
+            targets, _ = pool.gather(_select_targets_file_timed,
+                                     [infiles[i] for i in order], capacity,
+                                     reduce=_update_status, positions=order)
     else:
         targets = list()
         for x in infiles:
-            targets.append(_update_status(_select_targets_file(x)))
-
-    targets = np.concatenate(targets)
+            targets.append(_update_status(*_select_targets_file_timed(x)))
+        targets = np.concatenate(targets)
+
+    slowest = max(timings, key=timings.get)
+    log.info('Processed {} files in {:.1f} mins ({:.1f} process-mins); '
+             'slowest was {} ({:.1f}s)'.format(
+                 len(timings), (time()-t0)/60, sum(timings.values())/60,
+                 slowest, timings[slowest]))
+    if timingfile is not None:
+        io.write_file_timings(timingfile, timings)
+        log.info('Recorded time taken per file in {}'.format(timingfile))
+
+    rfstats = forestCacheStats()
+    if rfstats["misses"] > 0:
+        log.info('Loaded {} QSO RF forests in {:.1f}s; {} reuses saved {:.1f}s'
+                 .format(rfstats["misses"], rfstats["loadtime"],
+                         rfstats["hits"], rfstats["timesaved"]))
+    gaiastats = gaia_cache_stats()
+    if gaiastats["misses"] > 0:
+        log.info('Read {} Gaia files ({:.2f} GB); {} reuses from cache '
+                 '({} from shared memory)'.format(
+                     gaiastats["misses"], gaiastats["bytesread"]/1024**3,
+                     gaiastats["hits"] + gaiastats["shmhits"],
+                     gaiastats["shmhits"]))
 
     if backup:
         # ADM also process Gaia-only targets.
@@ -2616,6 +2988,9 @@ def select_targets(infiles, numproc=4, qso_selection='randomforest',
             else:
                 targets = gaiatargets
 
+    # ADM release the memory used by any cached Gaia files.
+    clear_gaia_cache()
+
     # ADM it's possible that somebody could pass HEALPixels that
     # ADM contain no targets, in which case exit (somewhat) gracefully.
     if len(targets) == 0:
@@ -9,6 +9,7 @@ Useful Gaia matching and manipulation routines.
 """
 import os
 import sys
+import hashlib
 import numpy as np
 import numpy.lib.recfunctions as rfn
 import fitsio
@@ -16,6 +17,8 @@ import requests
 import pickle
 from glob import glob
 from time import time
+from collections import OrderedDict
+from multiprocessing import Array
 import healpy as hp
 from os.path import basename
 from desitarget import io
@@ -23,6 +26,7 @@ from desitarget.io import check_fitsio_version
 from desitarget.internal import sharedmem
 from desitarget.geomask import hp_in_box, add_hp_neighbors
 from desitarget.geomask import hp_beyond_gal_b, nside2nside
+from desitarget.geomask import match_within_radii, _cache_tmp_filename
 from desimodel.footprint import radec2pix
 from astropy.coordinates import SkyCoord
 from astropy import units as u
@@ -558,31 +562,137 @@ def pop_gaia_columns(inarr, popcols):
     return rfn.drop_fields(inarr, popcols)
 
 
-def read_gaia_file(filename, header=False, addobjid=False):
-    """Read in a Gaia healpix file in the appropriate format for desitarget.
+# ADM process-wide least-recently-used cache of decoded Gaia HEALPixel
+# ADM files, keyed by the full path to the file and its modification
+# ADM time. Files cached before a fork are shared (copy-on-write) with
+# ADM the forked processes, e.g. the workers of sharedmem.MapReduce.
+# ADM Forked processes don't add files that they read from disk to the
+# ADM cache, as N processes could then hold N times maxbytes of data.
+_gaiaCache = OrderedDict()
+# ADM the maximum total size of the arrays in the cache, in bytes (0,
+# ADM i.e. no cache, unless set_gaia_cache() is called), an optional
+# ADM directory (e.g. in /dev/shm) in which to share decoded
+# ADM files between processes (see set_gaia_cache()) and the process
+# ADM that owns the cache (i.e. that isn't a forked process).
+_gaiaCacheConfig = {"maxbytes": 0, "shmdir": None,
+                    "pid": os.getpid()}
+# ADM counters for the cache: number of hits, number of hits in the
+# ADM shared-memory directory, number of misses (files read from disk)
+# ADM and the total bytes of Gaia data decoded from disk. Stored in
+# ADM shared memory so every forked process updates the same counters.
+_gaiaCacheStats = Array('d', 4)
+
+
+def set_gaia_cache(maxbytes=None, shmdir=None):
+    """Configure the process-wide cache of decoded Gaia files.
 
     Parameters
     ----------
-    filename : :class:`str`
-        File name of a single Gaia "healpix-" file.
-    header : :class:`bool`, optional, defaults to ``False``
-        If ``True`` then return (data, header) instead of just data.
-    addobjid : :class:`bool`, optional, defaults to ``False``
-        Include, in the output, two additional columns. A column
-        "GAIA_OBJID" that is the integer number of each row read from
-        file and a column "GAIA_BRICKID" that is the integer number of
-        the file itself.
+    maxbytes : :class:`int`, optional, defaults to ``None``
+        The maximum total size of the Gaia data held in the cache, in
+        bytes, e.g. 2*1024**3 for 2 GB. Pass 0 to disable the cache. If
+        ``None`` then don't change the current value (initially 0, i.e.
+        files aren't kept in memory unless this function is called).
+    shmdir : :class:`str`, optional, defaults to ``None``
+        A directory, ideally on a memory-backed file system such as
+        ``/dev/shm``, in which decoded Gaia files are written so they can
+        be memory-mapped by any other process. Pass ``False`` to stop
+        using a directory. If ``None`` then don't change the current
+        value (initially no directory).
 
     Returns
     -------
-    :class:`~numpy.ndarray`
-        Gaia data translated to targeting format (upper-case etc.) with the
-        columns corresponding to `desitarget.gaiamatch.gaiadatamodel`
+    Nothing, but the cache used by :func:`read_gaia_file` is configured
+    and least-recently-used files are evicted if the cache is too big.
 
     Notes
     -----
-        - A better location for this might be in `desitarget.io`?
+        - Only the process that set up the cache adds files read from
+          disk to it. Forked processes (e.g. parallel workers) can use
+          files cached before the fork, and can cache files that are
+          memory-mapped from `shmdir`, but don't otherwise grow the
+          cache. So, the cache needs up to `maxbytes` of memory in total,
+          not per process. Files in `shmdir` use memory (not counted in
+          `maxbytes`) until they are deleted.
     """
+    _gaiaCacheConfig["pid"] = os.getpid()
+    if maxbytes is not None:
+        _gaiaCacheConfig["maxbytes"] = int(maxbytes)
+    if shmdir is not None:
+        _gaiaCacheConfig["shmdir"] = shmdir or None
+    _evict_gaia_cache()
+
+
+def _evict_gaia_cache():
+    """Remove least-recently-used files until the cache is small enough"""
+    nbytes = np.sum([data.nbytes for data, _ in _gaiaCache.values()])
+    while nbytes > _gaiaCacheConfig["maxbytes"]:
+        _, (data, _) = _gaiaCache.popitem(last=False)
+        nbytes -= data.nbytes
+
+
+def clear_gaia_cache():
+    """Empty the process-wide cache of decoded Gaia files.
+
+    Returns
+    -------
+    Nothing, but files are removed from the cache in this process (but
+    not from any shared-memory directory set by :func:`set_gaia_cache`).
+    """
+    _gaiaCache.clear()
+
+
+def gaia_cache_stats(reset=False):
+    """Report the usage of the process-wide cache of decoded Gaia files.
+
+    Parameters
+    ----------
+    reset : :class:`bool`, optional, defaults to ``False``
+        If ``True``, also reset the counters to zero (e.g. at the start
+        of a new run).
+
+    Returns
+    -------
+    :class:`dict`
+        Dictionary with entries `hits` (files retrieved from the cache),
+        `shmhits` (files memory-mapped from the shared-memory directory),
+        `misses` (files read from disk), and `bytesread` (the total size
+        of the Gaia data read from disk, in bytes), summed over any
+        forked processes. Also `nbytes`, the total size of the Gaia data
+        in the cache in this process, in bytes.
+    """
+    with _gaiaCacheStats.get_lock():
+        stats = {key: int(val) for key, val in zip(
+            ["hits", "shmhits", "misses", "bytesread"], _gaiaCacheStats[:])}
+        if reset:
+            _gaiaCacheStats[:] = [0, 0, 0, 0]
+    stats["nbytes"] = int(np.sum([data.nbytes for data, _ in _gaiaCache.values()]))
+
+    return stats
+
+
+def _gaia_cache_key(filename):
+    """The cache key and shared-memory file name for a Gaia file"""
+    st = os.stat(filename)
+    key = (os.path.realpath(filename), st.st_mtime_ns)
+    shmfn = None
+    shmdir = _gaiaCacheConfig["shmdir"]
+    if shmdir is not None:
+        shmfn = os.path.join(shmdir, "gaia-{}-{}.npy".format(
+            hashlib.sha1(key[0].encode()).hexdigest()[:16], key[1]))
+
+    return key, shmfn
+
+
+def _gaia_file_is_cached(filename):
+    """``True`` if a Gaia file is in the cache or shared-memory directory"""
+    key, shmfn = _gaia_cache_key(filename)
+
+    return key in _gaiaCache or (shmfn is not None and os.path.exists(shmfn))
+
+
+def _read_gaia_file_uncached(filename):
+    """Read a Gaia healpix file, see :func:`read_gaia_file`"""
     # ADM check for an epic fail on the the version of fitsio.
     check_fitsio_version()
 
@@ -604,6 +714,104 @@ def read_gaia_file(filename, header=False, addobjid=False):
         w = np.where(outdata[col] != 0)[0]
         outdata[col][w] = 1./(outdata[col][w]**2.)
 
+    fx.close()
+
+    return outdata, hdr
+
+
+def _read_gaia_file_cached(filename):
+    """Read a Gaia healpix file via the process-wide cache.
+
+    Returns (data, header), where data is read-only and header is
+    ``None`` if the file was memory-mapped from the shared directory.
+    """
+    key, shmfn = _gaia_cache_key(filename)
+    if key in _gaiaCache:
+        _gaiaCache.move_to_end(key)
+        with _gaiaCacheStats.get_lock():
+            _gaiaCacheStats[0] += 1
+        return _gaiaCache[key]
+
+    # ADM look for the file in the shared-memory directory...
+    hdr = None
+    if shmfn is not None and os.path.exists(shmfn):
+        data = np.load(shmfn, mmap_mode='r')
+        data = data.view(type=np.ndarray)
+        fromshm = True
+        with _gaiaCacheStats.get_lock():
+            _gaiaCacheStats[1] += 1
+    # ADM ...otherwise read it from disk.
+    else:
+        data, hdr = _read_gaia_file_uncached(filename)
+        fromshm = False
+        with _gaiaCacheStats.get_lock():
+            _gaiaCacheStats[2] += 1
+            _gaiaCacheStats[3] += data.nbytes
+        # ADM write atomically, as other processes could be reading.
+        if shmfn is not None:
+            tmpfn = _cache_tmp_filename(shmfn)
+            try:
+                os.makedirs(os.path.dirname(shmfn), exist_ok=True)
+                np.save(tmpfn, data)
+                os.rename(tmpfn, shmfn)
+                # ADM a forked process can cache the shared copy.
+                if os.getpid() != _gaiaCacheConfig["pid"]:
+                    data = np.load(shmfn, mmap_mode='r').view(type=np.ndarray)
+                    fromshm = True
+            except OSError as e:
+                log.warning("Couldn't write {} ({})".format(shmfn, e))
+        data.flags.writeable = False
+
+    # ADM forked processes only cache (shared) memory-mapped files.
+    owner = os.getpid() == _gaiaCacheConfig["pid"]
+    if (owner or fromshm) and data.nbytes <= _gaiaCacheConfig["maxbytes"]:
+        _gaiaCache[key] = (data, hdr)
+        _evict_gaia_cache()
+
+    return data, hdr
+
+
+def read_gaia_file(filename, header=False, addobjid=False, cache=False):
+    """Read in a Gaia healpix file in the appropriate format for desitarget.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        File name of a single Gaia "healpix-" file.
+    header : :class:`bool`, optional, defaults to ``False``
+        If ``True`` then return (data, header) instead of just data.
+    addobjid : :class:`bool`, optional, defaults to ``False``
+        Include, in the output, two additional columns. A column
+        "GAIA_OBJID" that is the integer number of each row read from
+        file and a column "GAIA_BRICKID" that is the integer number of
+        the file itself.
+    cache : :class:`bool`, optional, defaults to ``False``
+        If ``True`` then retrieve the file from (or add the file to)
+        the process-wide cache of decoded Gaia files. The returned
+        data is then READ-ONLY (unless `addobjid` is ``True``).
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Gaia data translated to targeting format (upper-case etc.) with the
+        columns corresponding to `desitarget.gaiamatch.gaiadatamodel`
+
+    Notes
+    -----
+        - A better location for this might be in `desitarget.io`?
+        - See :func:`set_gaia_cache` and :func:`gaia_cache_stats` to
+          configure and monitor the cache.
+    """
+    if cache:
+        outdata, hdr = _read_gaia_file_cached(filename)
+        # ADM a view with its own dtype, so renaming columns in the
+        # ADM output (or in copies of it) can't change the cache.
+        outdata = outdata.view(np.dtype(outdata.dtype.descr))
+        if header and hdr is None:
+            hdr = fitsio.read_header(filename, 1)
+    else:
+        outdata, hdr = _read_gaia_file_uncached(filename)
+
     # ADM if requested, add an object identifier for each file row.
     if addobjid:
         newdt = outdata.dtype.descr
@@ -622,10 +830,8 @@ def read_gaia_file(filename, header=False, addobjid=False):
 
     # ADM return data from the Gaia file, with the header if requested.
     if header:
-        fx.close()
         return outdata, hdr
     else:
-        fx.close()
         return outdata
 
 
@@ -892,21 +1098,16 @@ def match_gaia_to_primary(objs, matchrad=1., retaingaia=False,
         - If `retaingaia` is True then objects after the first len(objs) objects are
           Gaia objects that do not have a sweeps match but that are in the area
           bounded by `gaiabounds`
+        - If more than one Gaia object is within `matchrad` of an object,
+          then the closest Gaia object is the match.
+        - The Gaia files are matched at once, using a single KD-tree for
+          the Gaia objects (see :func:`~desitarget.geomask.match_within_radii`).
     """
-    # ADM I'm getting this old Cython RuntimeWarning on search_around_sky ****:
-    # RuntimeWarning: numpy.dtype size changed, may indicate binary incompatibility. Expected 96, got 88
-    # ADM but it doesn't seem malicious, so I'm filtering. I think its caused
-    # ADM by importing a scipy compiled against an older numpy than is installed
-    # ADM e.g. https://stackoverflow.com/questions/40845304/runtimewarning-numpy-dtype-size-changed-may-indicate-binary-incompatibility
-    import warnings
-
     # ADM if retaingaia is True, retain all Gaia objects in a sweeps-like box.
     if retaingaia:
         ramin, ramax, decmin, decmax = gaiabounds
 
-    # ADM convert the coordinates of the input objects to a SkyCoord object.
-    cobjs = SkyCoord(objs["RA"]*u.degree, objs["DEC"]*u.degree)
-    nobjs = cobjs.size
+    nobjs = len(np.atleast_1d(objs))
 
     # ADM deal with the special case that only a single object was passed.
     if nobjs == 1:
@@ -915,10 +1116,6 @@ def match_gaia_to_primary(objs, matchrad=1., retaingaia=False,
     # ADM set up a zerod array of Gaia information for the passed objects.
     gaiainfo = np.zeros(nobjs, dtype=gaiadatamodel.dtype)
 
-    # ADM a supplemental (zero-length) array to hold Gaia objects that don't
-    # ADM match a sweeps object, in case retaingaia was set.
-    suppgaiainfo = np.zeros(0, dtype=gaiadatamodel.dtype)
-
     # ADM objects without matches should have REF_ID of -1.
     gaiainfo['REF_ID'] = -1
 
@@ -928,36 +1125,43 @@ def match_gaia_to_primary(objs, matchrad=1., retaingaia=False,
     else:
         gaiafiles = find_gaia_files(objs)
 
-    # ADM loop through the Gaia files and match to the passed objects.
-    for file in gaiafiles:
-        gaia = read_gaia_file(file)
-        cgaia = SkyCoord(gaia["GAIA_RA"]*u.degree, gaia["GAIA_DEC"]*u.degree)
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            # ADM ****here's where the warning occurs...
-            idobjs, idgaia, _, _ = cgaia.search_around_sky(cobjs, matchrad*u.arcsec)
-        # ADM assign the Gaia info to the array that corresponds to the passed objects.
-        gaiainfo[idobjs] = gaia[idgaia]
-
-        # ADM if retaingaia was set, also build an array of Gaia objects that
-        # ADM don't have sweeps matches, but are within the RA/Dec bounds.
-        if retaingaia:
-            # ADM find the Gaia IDs that didn't match the passed objects.
-            nomatch = set(np.arange(len(gaia)))-set(idgaia)
-            noidgaia = np.array(list(nomatch))
-            # ADM which Gaia objects with these IDs are within the bounds.
-            if len(noidgaia) > 0:
-                suppg = gaia[noidgaia]
-                winbounds = np.where(
-                    (suppg["GAIA_RA"] >= ramin) & (suppg["GAIA_RA"] < ramax)
-                    & (suppg["GAIA_DEC"] >= decmin) & (suppg["GAIA_DEC"] < decmax)
-                )[0]
-                # ADM Append those Gaia objects to the suppgaiainfo array.
-                if len(winbounds) > 0:
-                    suppgaiainfo = np.hstack([suppgaiainfo, suppg[winbounds]])
-
+    # ADM read the Gaia files, and record the file and row of each
+    # ADM Gaia object in the concatenated Gaia coordinates.
+    gaias = [read_gaia_file(fn, cache=True) for fn in gaiafiles]
+    ngaia = np.array([len(gaia) for gaia in gaias], dtype='int64')
+    starts = np.cumsum(ngaia) - ngaia
+    gaiaras = np.concatenate([gaia["GAIA_RA"] for gaia in gaias] + [[]])
+    gaiadecs = np.concatenate([gaia["GAIA_DEC"] for gaia in gaias] + [[]])
+    fileidx = np.repeat(np.arange(len(gaias)), ngaia)
+
+    # ADM match all of the objects to all of the Gaia objects at once.
+    idobjs, idgaia, sep = match_within_radii(
+        objs["RA"], objs["DEC"], gaiaras, gaiadecs, matchrad)
+    matched = np.zeros(len(gaiaras), dtype=bool)
+    matched[idgaia] = True
+
+    # ADM retain the closest Gaia match for each object (match_within_radii
+    # ADM sorts on idobjs, so sort on separation within each object).
+    srt = np.lexsort((sep, idobjs))
+    idobjs, idgaia = idobjs[srt], idgaia[srt]
+    closest = np.ones(len(idobjs), dtype=bool)
+    closest[1:] = idobjs[1:] != idobjs[:-1]
+    idobjs, idgaia = idobjs[closest], idgaia[closest]
+
+    # ADM assign the Gaia info to the array that corresponds to the
+    # ADM passed objects, file-by-file.
+    for i, gaia in enumerate(gaias):
+        ii = fileidx[idgaia] == i
+        gaiainfo[idobjs[ii]] = gaia[idgaia[ii] - starts[i]]
+
+    # ADM if retaingaia was set, also add Gaia objects that don't have
+    # ADM sweeps matches, but are within the RA/Dec bounds.
     if retaingaia:
-        gaiainfo = np.hstack([gaiainfo, suppgaiainfo])
+        retain = ~matched & (gaiaras >= ramin) & (gaiaras < ramax) & \
+            (gaiadecs >= decmin) & (gaiadecs < decmax)
+        suppgaiainfo = [gaia[retain[start:start+len(gaia)]]
+                        for gaia, start in zip(gaias, starts)]
+        gaiainfo = np.concatenate([gaiainfo] + suppgaiainfo)
 
     return gaiainfo
 
@@ -1007,7 +1211,7 @@ def match_gaia_to_primary_single(objs, matchrad=1.):
 
     # ADM loop through the Gaia files and match to the passed object.
     for file in gaiafiles:
-        gaia = read_gaia_file(file)
+        gaia = read_gaia_file(file, cache=True)
         cgaia = SkyCoord(gaia["GAIA_RA"]*u.degree, gaia["GAIA_DEC"]*u.degree)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
@@ -12,8 +12,11 @@ from __future__ import (absolute_import, division)
 #
 import numpy as np
 import os
+import socket
+import hashlib
 import fitsio
 from time import time
+from collections import OrderedDict
 
 from astropy.coordinates import SkyCoord
 from astropy import units as u
@@ -31,6 +34,12 @@ import healpy as hp
 from desiutil.log import get_logger
 log = get_logger()
 
+# ADM KD-trees built over catalogs that were matched TO (see
+# ADM radec_match_to), keyed by a checksum of the catalog coordinates.
+# ADM Only the most-recently used _radecTreeCacheSize trees are kept.
+_radecTreeCache = OrderedDict()
+_radecTreeCacheSize = 4
+
 
 def ellipse_matrix(r, e1, e2):
     """Calculate transformation matrix from half-light-radius to ellipse
@@ -246,6 +255,204 @@ def is_in_ellipse_matrix(ras, decs, RAcen, DECcen, G):
     return np.hypot(dx, dy) < 1
 
 
+def is_in_ellipse_matrix_pairs(ras, decs, RAcens, DECcens, G, idras, idcens,
+                               chunksize=2**20):
+    """Whether points lie in elliptical masks for (point, mask) pairs
+
+    Parameters
+    ----------
+    ras : :class:`~numpy.ndarray`
+        Array of Right Ascensions of points (DEGREES)
+    decs : :class:`~numpy.ndarray`
+        Array of Declinations of points (DEGREES)
+    RAcens : :class:`~numpy.ndarray`
+        Right Ascension of the centers of the ellipses (DEGREES)
+    DECcens : :class:`~numpy.ndarray`
+        Declination of the centers of the ellipses (DEGREES)
+    G : :class:`~numpy.ndarray`
+        The 2x2 matrices to transform points measured in coordinates of
+        the effective-half-light-radius to RA/Dec offset coordinates for
+        each ellipse, as generated by, e.g.,
+        :mod:`desitarget.geomask.ellipse_matrix`, with shape (2,2,len(RAcens))
+    idras : :class:`~numpy.ndarray`
+        Indexes of points in `ras`/`decs` to test.
+    idcens : :class:`~numpy.ndarray`
+        Indexes of the ellipses to test each point in `idras` against.
+    chunksize : :class:`int`, optional, defaults to 2**20
+        The number of pairs to test at once (which limits memory use).
+
+    Returns
+    -------
+    :class:`boolean`
+        An array that is the same length as `idras` that is ``True`` for
+        pairs where the point is in the ellipse.
+
+    Notes
+    -----
+        - Equivalent to calling :func:`is_in_ellipse_matrix` for each
+          pair, but with no loop over ellipses.
+    """
+    idras, idcens = np.atleast_1d(idras, idcens)
+    isin = np.zeros(len(idras), dtype=bool)
+    if len(idras) == 0:
+        return isin
+
+    # ADM Invert all of the transformation matrices at once.
+    Ginv = np.linalg.inv(np.moveaxis(G, -1, 0))
+
+    for start in range(0, len(idras), chunksize):
+        jj = idras[start:start+chunksize]
+        ii = idcens[start:start+chunksize]
+        # ADM remember to correct for the spherical projection in Dec
+        # ADM note that this is only true for the small angle approx.
+        dra = (ras[jj] - RAcens[ii])*np.cos(np.radians(decs[jj]))
+        ddec = decs[jj] - DECcens[ii]
+        # ADM points in the ellipse are within the effective circle of
+        # ADM radius 1 generated in half-light-radius coordinates.
+        Gi = Ginv[ii]
+        dx = Gi[:, 0, 0]*dra + Gi[:, 0, 1]*ddec
+        dy = Gi[:, 1, 0]*dra + Gi[:, 1, 1]*ddec
+        isin[start:start+chunksize] = np.hypot(dx, dy) < 1
+
+    return isin
+
+
+def is_in_ellipse_pairs(ras, decs, RAcens, DECcens, r, e1, e2, idras, idcens,
+                        chunksize=2**20):
+    """Whether points lie in elliptical masks for (point, mask) pairs
+
+    Parameters
+    ----------
+    ras : :class:`~numpy.ndarray`
+        Array of Right Ascensions of points (DEGREES)
+    decs : :class:`~numpy.ndarray`
+        Array of Declinations of points (DEGREES)
+    RAcens : :class:`~numpy.ndarray`
+        Right Ascension of the centers of the ellipses (DEGREES)
+    DECcens : :class:`~numpy.ndarray`
+        Declination of the centers of the ellipses (DEGREES)
+    r : :class:`~numpy.ndarray`
+        Half-light radius of the ellipses (ARCSECONDS)
+    e1 : :class:`~numpy.ndarray`
+        First ellipticity component of the ellipses
+    e2 : :class:`~numpy.ndarray`
+        Second ellipticity component of the ellipses
+    idras : :class:`~numpy.ndarray`
+        Indexes of points in `ras`/`decs` to test.
+    idcens : :class:`~numpy.ndarray`
+        Indexes of the ellipses to test each point in `idras` against.
+    chunksize : :class:`int`, optional, defaults to 2**20
+        The number of pairs to test at once (which limits memory use).
+
+    Returns
+    -------
+    :class:`boolean`
+        An array that is the same length as `idras` that is ``True`` for
+        pairs where the point is in the ellipse.
+
+    Notes
+    -----
+        - Equivalent to calling :func:`is_in_ellipse` for each pair, but
+          with no loop over ellipses.
+        - Only the ellipses in `idcens` need have a non-zero `r`.
+    """
+    idras, idcens = np.atleast_1d(idras, idcens)
+    if len(idcens) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # ADM only the ellipses that are needed, as unused ellipses could
+    # ADM have a zero radius (and so a singular transformation matrix).
+    ucens, idcens = np.unique(idcens, return_inverse=True)
+    G = ellipse_matrix(np.atleast_1d(r)[ucens], np.atleast_1d(e1)[ucens],
+                       np.atleast_1d(e2)[ucens])
+
+    return is_in_ellipse_matrix_pairs(
+        ras, decs, np.atleast_1d(RAcens)[ucens], np.atleast_1d(DECcens)[ucens],
+        G, idras, idcens, chunksize=chunksize)
+
+
+def match_within_radii(ras, decs, RAcens, DECcens, r, bucketfactor=2.):
+    """All pairs of points and circles on the sky, for points in circles.
+
+    Parameters
+    ----------
+    ras : :class:`~numpy.ndarray`
+        Array of Right Ascensions of points (DEGREES).
+    decs : :class:`~numpy.ndarray`
+        Array of Declinations of points (DEGREES).
+    RAcens : :class:`~numpy.ndarray`
+        Right Ascension of the centers of the circles (DEGREES).
+    DECcens : :class:`~numpy.ndarray`
+        Declination of the centers of the circles (DEGREES).
+    r : :class:`~numpy.ndarray` or :class:`float`
+        Radius of each of the circles (ARCSECONDS).
+    bucketfactor : :class:`float`, optional, defaults to 2
+        Circles are searched in buckets of radii, with the largest
+        radius in a bucket at most `bucketfactor` times the smallest.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Indexes of points in `ras`, `decs`.
+    :class:`~numpy.ndarray`
+        Indexes of circles that contain each point in the first output.
+    :class:`~numpy.ndarray`
+        The separation between each point and circle center (ARCSECONDS).
+
+    Notes
+    -----
+        - Points are in circles if their separation is less than `r`.
+        - Points and circles are converted to 3-D unit vectors and matched
+          with :class:`scipy.spatial.cKDTree`. The tree of points is only
+          built once. The circles in each bucket of radii are matched at
+          the largest radius in the bucket, so a few large circles don't
+          slow the search for the (many) small circles.
+        - The output is sorted by the first (then second) output.
+    """
+    from scipy.spatial import cKDTree
+
+    ras, decs, RAcens, DECcens = np.atleast_1d(ras, decs, RAcens, DECcens)
+    r = np.zeros(len(RAcens)) + r
+
+    # ADM circles with no radius can't contain anything.
+    ii = np.where(r > 0)[0]
+    if len(ras) == 0 or len(ii) == 0:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'), \
+            np.zeros(0, dtype='f8')
+
+    # ADM 3-D unit vectors for the points and the circle centers.
+    treetargs = cKDTree(hp.ang2vec(ras, decs, lonlat=True),
+                        balanced_tree=False, compact_nodes=False)
+    vecs = hp.ang2vec(RAcens[ii], DECcens[ii], lonlat=True)
+
+    # ADM bucket the circles by radius.
+    buckets = np.floor(np.log(r[ii]) / np.log(bucketfactor)).astype('int64')
+    idtargs, idcens, seps = [], [], []
+    for bucket in np.unique(buckets):
+        inbucket = np.where(buckets == bucket)[0]
+        # ADM the chord length corresponding to the largest radius.
+        maxrad = np.radians(np.min([r[ii][inbucket].max()/3600., 180.]))
+        chord = 2*np.sin(maxrad/2.)
+        treecens = cKDTree(vecs[inbucket],
+                           balanced_tree=False, compact_nodes=False)
+        pairs = treecens.sparse_distance_matrix(
+            treetargs, chord, output_type='ndarray')
+        # ADM convert chord lengths to separations in arcseconds.
+        sep = 3600*np.degrees(2*np.arcsin(np.clip(pairs["v"]/2., 0, 1)))
+        idcen = ii[inbucket][pairs["i"]]
+        incirc = sep < r[idcen]
+        idtargs.append(pairs["j"][incirc])
+        idcens.append(idcen[incirc])
+        seps.append(sep[incirc])
+
+    idtargs = np.concatenate(idtargs).astype('int64')
+    idcens = np.concatenate(idcens).astype('int64')
+    seps = np.concatenate(seps)
+    srt = np.lexsort((idcens, idtargs))
+
+    return idtargs[srt], idcens[srt], seps[srt]
+
+
 def is_in_circle(ras, decs, RAcens, DECcens, r):
     """Whether a set of points is in a set of circular masks on the sky.
 
@@ -273,27 +480,11 @@ def is_in_circle(ras, decs, RAcens, DECcens, r):
     # ADM all matches start as False (nothing is yet in a circular mask).
     in_mask = np.zeros(len(ras), dtype=bool)
 
-    # ADM coordinates of masks and targets into SkyCoord objects.
-    ctargs = SkyCoord(ras*u.degree, decs*u.degree)
-    cstars = SkyCoord(RAcens*u.degree, DECcens*u.degree)
-
-    # ADM this is the largest search radius we should need to consider
-    # ADM in the future an obvious speed up is to split on radius
-    # ADM as large radii are rarer but take longer.
-    maxrad = max(r)*u.arcsec
-
-    # ADM coordinate match the star masks and the targets.
-    idtargs, idstars, d2d, d3d = cstars.search_around_sky(ctargs, maxrad)
-
-    # ADM catch the case where nothing fell in a mask.
-    if len(idstars) == 0:
-        return in_mask
-
-    # ADM for a match, find separations less than the mask radius.
-    w_in = np.where(d2d.arcsec < r[idstars])
+    # ADM find the points that are closer than the radius of a mask.
+    idtargs, idstars, sep = match_within_radii(ras, decs, RAcens, DECcens, r)
 
     # ADM matches at less than the radius are in a mask (at least one).
-    in_mask[idtargs[w_in]] = True
+    in_mask[idtargs] = True
 
     return in_mask
 
@@ -556,6 +747,60 @@ def sphere_circle_ra_off(theta, centdec, declocs):
     return np.degrees(offrar)
 
 
+def ellipse_boundaries(RAcens, DECcens, r, e1, e2, nloc):
+    """Return RAs/Decs of a set of elliptical boundaries on the sky
+
+    Parameters
+    ----------
+    RAcens : :class:`~numpy.ndarray`
+        Right Ascension of the centers of the ellipses (DEGREES)
+    DECcens : :class:`~numpy.ndarray`
+        Declination of the centers of the ellipses (DEGREES)
+    r : :class:`~numpy.ndarray`
+        Half-light radius of the ellipses (ARCSECONDS)
+    e1 : :class:`~numpy.ndarray`
+        First ellipticity component of the ellipses
+    e2 : :class:`~numpy.ndarray`
+        Second ellipticity component of the ellipses
+    nloc : :class:`~numpy.ndarray`
+        the number of locations to generate, equally spaced around the
+        periphery of *each* ellipse
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Right Ascensions along the boundaries of the ellipses, in order
+    :class:`~numpy.ndarray`
+        Declinations along the boundaries of the ellipses, in order
+
+    Notes
+    -----
+        - Equivalent to concatenating the output of
+          :func:`ellipse_boundary` for each ellipse, but with no loop.
+    """
+    RAcens, DECcens, nloc = np.atleast_1d(RAcens, DECcens, nloc)
+    nloc = nloc.astype('int64')
+    # ADM the ellipse each location belongs to and its index around the
+    # ADM ellipse, to make equally spaced angles as for np.linspace.
+    ii = np.repeat(np.arange(len(nloc)), nloc)
+    idx = np.arange(len(ii)) - np.repeat(np.cumsum(nloc) - nloc, nloc)
+    div = np.maximum(nloc - 1, 1)[ii]
+    angle = idx*(2.*np.pi/div)
+    angle[(idx == nloc[ii] - 1) & (nloc[ii] > 1)] = 2.*np.pi
+
+    # ADM transform circles in effective-half-light-radius to ellipses.
+    T = ellipse_matrix(r, e1, e2)[..., ii]
+    sinang, cosang = np.sin(angle), np.cos(angle)
+    dra = T[0, 0]*sinang + T[0, 1]*cosang
+    ddec = T[1, 0]*sinang + T[1, 1]*cosang
+
+    # ADM return the RA, Dec of the boundaries, as for ellipse_boundary.
+    decs = DECcens[ii] + ddec
+    ras = RAcens[ii] + (dra/np.cos(np.radians(decs)))
+
+    return ras, decs
+
+
 def circle_boundaries(RAcens, DECcens, r, nloc):
     """Return RAs/Decs of a set of circular boundaries on the sky
 
@@ -866,7 +1111,56 @@ def add_hp_neighbors(nside, pixnum):
     return pixnum
 
 
-def brick_names_touch_hp(nside, numproc=1, fact=2**20):
+def _bricks_touch_hp(bricktable, nside, numproc=1, fact=2**20):
+    """The HEALPixels that touch each brick in a table of bricks.
+
+    Parameters
+    ----------
+    bricktable : :class:`~astropy.table.Table`
+        A table of bricks, as from :class:`desiutil.brick.Bricks`.
+    nside : :class:`int`
+        (NESTED) HEALPixel nside.
+    numproc : :class:`int`, optional, defaults to 1
+        The number of parallel processes to use.
+    fact : :class:`int`, optional defaults to 2**20
+        see documentation for `healpy.query_polygon()`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Indexes of rows in `bricktable`.
+    :class:`~numpy.ndarray`
+        The HEALPixels touched by each brick in the first output. Each
+        brick appears once for each HEALPixel that it touches.
+    """
+    def _pixels_per_brick(indexes):
+        """for a set of indexes that correspond to bricktable rows,
+        determine which pixels touch each brick"""
+        pixels = [hp_in_box(nside, [bt["RA1"], bt["RA2"], bt["DEC1"],
+                                    bt["DEC2"]], fact=fact)
+                  for bt in bricktable[indexes]]
+        brickidx = np.repeat(indexes, [len(pix) for pix in pixels])
+        pixels = np.concatenate(pixels + [np.zeros(0, dtype='int64')])
+
+        return brickidx, pixels.astype('int64')
+
+    # ADM split the length of the bricktable into arrays of indexes.
+    indexes = np.array_split(np.arange(len(bricktable)), numproc)
+
+    if numproc > 1:
+        pool = sharedmem.MapReduce(np=numproc)
+        with pool:
+            results = pool.map(_pixels_per_brick, indexes,
+                               reduce=lambda bidx, pix: (bidx, pix))
+        brickidx = np.concatenate([bidx for bidx, _ in results])
+        pixels = np.concatenate([pix for _, pix in results])
+    else:
+        brickidx, pixels = _pixels_per_brick(indexes[0])
+
+    return brickidx, pixels
+
+
+def brick_names_touch_hp(nside, numproc=1, fact=2**20, bricksize=0.25):
     """Determine which of a set of brick names touch a set of HEALPixels.
 
     Parameters
@@ -877,6 +1171,8 @@ def brick_names_touch_hp(nside, numproc=1, fact=2**20):
         The number of parallel processes to use.
     fact : :class:`int`, optional defaults to 2**20
         see documentation for `healpy.query_polygon()`.
+    bricksize : :class:`float`, optional, defaults to 0.25
+        The size of the bricks (as for :class:`desiutil.brick.Bricks`).
 
     Returns
     -------
@@ -895,42 +1191,165 @@ def brick_names_touch_hp(nside, numproc=1, fact=2**20):
     """
     t0 = time()
     # ADM grab the standard table of bricks.
-    bricktable = brick.Bricks(bricksize=0.25).to_table()
+    bricktable = brick.Bricks(bricksize=bricksize).to_table()
+    bricknames = np.array(bricktable["BRICKNAME"]).astype('S')
+    brickidx, pixels = _bricks_touch_hp(bricktable, nside,
+                                        numproc=numproc, fact=fact)
+    ii = np.lexsort((brickidx, pixels))
+    brickidx, pixels = brickidx[ii], pixels[ii]
+
+    # ADM change the pixels-in-brick look-up table to a
+    # ADM bricks-in-pixel look-up table.
+    sortednames = bricknames[brickidx].astype(str).tolist()
+    pix, starts = np.unique(pixels, return_index=True)
+    ends = np.append(starts[1:], len(pixels))
+    bricksperpixel = [[] for pixel in range(hp.nside2npix(nside))]
+    for pixel, start, end in zip(pix.tolist(), starts.tolist(), ends.tolist()):
+        bricksperpixel[pixel] = sortednames[start:end]
 
-    def _make_lookupdict(indexes):
-        """for a set of indexes that correspond to bricktable rows, make
-        a look-up dictionary of which pixels touch each brick"""
+    log.info("Done...t = {:.1f}s".format(time()-t0))
 
-        lookupdict = {bt["BRICKNAME"]: hp_in_box(
-            nside, [bt["RA1"], bt["RA2"], bt["DEC1"], bt["DEC2"]], fact=fact
-        ) for bt in bricktable[indexes]}
+    return bricksperpixel
 
-        return lookupdict
 
-    # ADM split the length of the bricktable into arrays of indexes.
-    indexes = np.array_split(np.arange(len(bricktable)), numproc)
+def _cache_dir():
+    """The directory `$DESITARGET_CACHE`, or `~/.cache/desitarget`"""
+    cachedir = os.environ.get("DESITARGET_CACHE")
+    if cachedir is None:
+        cachedir = os.path.join(os.path.expanduser("~"), ".cache",
+                                "desitarget")
 
-    if numproc > 1:
-        pool = sharedmem.MapReduce(np=numproc)
-        with pool:
-            lookupdict = pool.map(_make_lookupdict, indexes)
-        lookupdict = {key: val for lud in lookupdict for key, val in lud.items()}
-    else:
-        lookupdict = _make_lookupdict(indexes[0])
+    return cachedir
 
-    # ADM change the pixels-in-brick look-up table to a
-    # ADM bricks-in-pixel look-up table.
-    bricksperpixel = [[] for pix in range(hp.nside2npix(nside))]
-    for brickname in lookupdict:
-        for pixel in lookupdict[brickname]:
-            bricksperpixel[pixel].append(brickname)
 
-    log.info("Done...t = {:.1f}s".format(time()-t0))
+def _cache_tmp_filename(filename):
+    """A per-process temporary name alongside a cache file.
 
-    return bricksperpixel
+    Parameters
+    ----------
+    filename : :class:`str`
+        Full path to the cache file that will be written.
+
+    Returns
+    -------
+    :class:`str`
+        `filename` with the host name and process ID inserted before the
+        extension, so that processes on different nodes writing the same
+        cache file never share a temporary file before the final rename.
+    """
+    base, ext = os.path.splitext(filename)
+
+    return "{}.{}.{}.tmp{}".format(base, socket.gethostname(), os.getpid(), ext)
+
+
+def sweep_footprint_cache_filename(nside):
+    """The name of the cache of HEALPixels that touch each sweep file.
+
+    Parameters
+    ----------
+    nside : :class:`int`
+        (NESTED) HEALPixel nside.
 
+    Returns
+    -------
+    :class:`str`
+        The cache file for `nside`, in the directory `$DESITARGET_CACHE`
+        (if set) or otherwise in `~/.cache/desitarget`.
+    """
+    return os.path.join(_cache_dir(), "sweep-footprint-nside{}.fits".format(
+        nside))
+
+
+def sweep_files_footprint(nside, infiles, numproc=1, cache=True):
+    """The HEALPixels that touch each of a set of sweep files, as cached.
+
+    Parameters
+    ----------
+    nside : :class:`int`
+        (NESTED) HEALPixel nside.
+    infiles : :class:`list`
+        A list of input (sweep) filenames.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of processes to use for sweep files that aren't yet
+        in the cache.
+    cache : :class:`bool`, optional, defaults to ``True``
+        If ``True`` then read (and update) the cache file at
+        :func:`sweep_footprint_cache_filename`.
+
+    Returns
+    -------
+    :class:`list`
+        A list of arrays of the HEALPixels that touch each of `infiles`,
+        as for :func:`desitarget.io.decode_sweep_name`.
 
-def sweep_files_touch_hp(nside, pixlist, infiles):
+    Notes
+    -----
+        - The HEALPixels that touch a sweep file only depend on the RA
+          and Dec edges in its name, so the cache is keyed by (base)
+          filename and nside, and is shared across Data Releases.
+        - If the cache can't be read or written, a warning is logged
+          and the footprints are calculated as normal.
+    """
+    from desitarget.io import decode_sweep_name
+    names = [os.path.basename(fn) for fn in infiles]
+    cachefn = sweep_footprint_cache_filename(nside)
+
+    # ADM read the cache, if it exists, into a name->pixels look-up.
+    footprint = {}
+    if cache and os.path.exists(cachefn):
+        try:
+            # ADM the cache is written sorted by SWEEPNAME.
+            cached = fitsio.read(cachefn, "SWEEPHPX")
+            cachenames = cached["SWEEPNAME"]
+            starts = np.flatnonzero(cachenames[1:] != cachenames[:-1]) + 1
+            unames = cachenames[np.append(0, starts)].astype(str)
+            footprint = dict(zip(unames, np.split(cached["HPXPIXEL"],
+                                                  starts)))
+        except (OSError, ValueError) as e:
+            log.warning("Couldn't read {} ({})".format(cachefn, e))
+
+    # ADM calculate the footprints of any files that weren't cached.
+    missing = sorted(set(names) - set(footprint))
+    if len(missing) > 0:
+        def _footprint(name):
+            """HEALPixels that touch the sweep file with name `name`"""
+            return name, np.array(decode_sweep_name(name, nside=nside))
+
+        if numproc > 1:
+            pool = sharedmem.MapReduce(np=numproc)
+            with pool:
+                results = pool.map(_footprint, missing,
+                                   reduce=lambda name, pix: (name, pix))
+        else:
+            results = [_footprint(name) for name in missing]
+        footprint.update(dict(results))
+
+        # ADM write the updated cache (atomically, as several processes
+        # ADM may be updating the cache at once).
+        if cache:
+            allnames = sorted(footprint)
+            done = np.zeros(sum([len(footprint[name]) for name in allnames]),
+                            dtype=[('SWEEPNAME', 'S{}'.format(
+                                max([len(name) for name in allnames]))),
+                                   ('HPXPIXEL', '>i8')])
+            done["SWEEPNAME"] = np.repeat(
+                allnames, [len(footprint[name]) for name in allnames])
+            done["HPXPIXEL"] = np.concatenate(
+                [footprint[name] for name in allnames])
+            tmpfn = _cache_tmp_filename(cachefn)
+            try:
+                os.makedirs(os.path.dirname(cachefn), exist_ok=True)
+                fitsio.write(tmpfn, done, extname="SWEEPHPX",
+                             header={"HPXNSIDE": nside, "HPXNEST": True},
+                             clobber=True)
+                os.rename(tmpfn, cachefn)
+            except OSError as e:
+                log.warning("Couldn't write {} ({})".format(cachefn, e))
+
+    return [footprint[name] for name in names]
+
+
+def sweep_files_touch_hp(nside, pixlist, infiles, numproc=1, cache=True):
     """Determine which of a set of sweep files touch a set of HEALPixels.
 
     Parameters
@@ -941,6 +1360,10 @@ def sweep_files_touch_hp(nside, pixlist, infiles):
         A set of HEALPixels at `nside`.
     infiles : :class:`list` or `str`
         A list of input (sweep filenames) OR a single filename.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        Passed to :func:`sweep_files_footprint`.
+    cache : :class:`bool`, optional, defaults to ``True``
+        Passed to :func:`sweep_files_footprint`.
 
     Returns
     -------
@@ -968,8 +1391,8 @@ def sweep_files_touch_hp(nside, pixlist, infiles):
     check_nside(nside)
 
     # ADM a list of HEALPixels that touch each file.
-    from desitarget.io import decode_sweep_name
-    pixelsperfile = [decode_sweep_name(fn, nside=nside) for fn in infiles]
+    pixelsperfile = sweep_files_footprint(nside, infiles, numproc=numproc,
+                                          cache=cache)
 
     # ADM a flattened array of all HEALPixels touched by the input
     # ADM files. Each HEALPixel will appear multiple times if it's
@@ -977,14 +1400,20 @@ def sweep_files_touch_hp(nside, pixlist, infiles):
     pixnum = np.hstack(pixelsperfile)
 
     # ADM restrict input pixels to only those that touch an input file.
-    ii = [pix in pixnum for pix in pixlist]
+    ii = np.isin(pixlist, pixnum)
     pixlist = pixlist[ii]
 
-    # ADM create a list of files that touch each HEALPixel.
+    # ADM create a list of files that touch each HEALPixel (a stable
+    # ADM sort on pixel retains the order of the files in each list).
+    fileidx = np.repeat(np.arange(len(infiles)),
+                        [len(pixels) for pixels in pixelsperfile])
+    ii = np.argsort(pixnum, kind="stable")
+    pixels, starts = np.unique(pixnum[ii], return_index=True)
+    ends = np.append(starts[1:], len(ii))
+    sortedfiles = [infiles[i] for i in fileidx[ii]]
     filesperpixel = [[] for pix in range(hp.nside2npix(nside))]
-    for ifile, pixels in enumerate(pixelsperfile):
-        for pix in pixels:
-            filesperpixel[pix].append(infiles[ifile])
+    for pix, start, end in zip(pixels.tolist(), starts.tolist(), ends.tolist()):
+        filesperpixel[pix] = sortedfiles[start:end]
 
     return filesperpixel, pixlist, pixnum
 
@@ -1430,7 +1859,277 @@ def is_in_gal_box(objs, lbbox, radec=False):
     return ii
 
 
-def radec_match_to(matchto, objs, sep=1., radec=False, return_sep=False):
+def match_to(A, B, sorter=None):
+    """Indexes where each entry in `B` matches `A` (e.g. on TARGETID).
+
+    Parameters
+    ----------
+    A : :class:`~numpy.ndarray` or `list`
+        Values to match TO (e.g. the TARGETIDs of a set of targets).
+    B : :class:`~numpy.ndarray` or `list`
+        Values to look up in `A` (e.g. the TARGETIDs of a zcat).
+    sorter : :class:`~numpy.ndarray`, optional
+        The output of ``np.argsort(A, kind="stable")``, which can be
+        passed to save time when matching many arrays to the same `A`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray` (of integers)
+        For each entry in `B`, the index of the matching entry in `A`
+        or -1 if there's no match (use ``>= 0`` to find matches).
+
+    Notes
+    -----
+        - Equivalent to looking up each of `B` in a dictionary of
+          {value: index} for `A`, but uses a sort and a binary search.
+        - Values don't have to be unique. If a value appears more than
+          once in `A`, the LAST index is returned (as for a dictionary).
+          Every duplicated value in `B` maps to the same index.
+    """
+    A, B = np.asarray(A), np.asarray(B)
+    if sorter is None:
+        sorter = np.argsort(A, kind="stable")
+    sA = A[sorter]
+
+    # ADM the entry before the right-hand insertion point is the last
+    # ADM occurrence of a value (as the sort is stable). Searching for
+    # ADM sorted values is much faster, as memory is accessed in order.
+    border = np.argsort(B)
+    ii = np.empty(len(B), dtype=np.int64)
+    ii[border] = np.searchsorted(sA, B[border], side="right") - 1
+    matched = ii >= 0
+    matched[matched] = sA[ii[matched]] == B[matched]
+
+    idx = np.full(len(B), -1, dtype=np.int64)
+    idx[matched] = sorter[ii[matched]]
+
+    return idx
+
+
+def match(A, B):
+    """Indexes of every pair of matching entries in `A` and `B`.
+
+    Parameters
+    ----------
+    A : :class:`~numpy.ndarray` or `list`
+        Values to match (e.g. the TARGETIDs of a set of targets).
+    B : :class:`~numpy.ndarray` or `list`
+        Values to match (e.g. the TARGETIDs of a zcat).
+
+    Returns
+    -------
+    :class:`~numpy.ndarray` (of integers)
+        Indexes in `A` of each pair for which ``A[iA] == B[iB]``.
+    :class:`~numpy.ndarray` (of integers)
+        Indexes in `B` of each pair for which ``A[iA] == B[iB]``.
+
+    Notes
+    -----
+        - Values don't have to be unique. Every pair of matches is
+          returned (i.e. this is an inner join). Pairs are ordered by
+          the index in `B`, then by the index in `A`.
+        - Entries with no match can be found using, e.g.,
+          ``np.setdiff1d(np.arange(len(B)), iB)``.
+    """
+    A, B = np.asarray(A), np.asarray(B)
+    sorter = np.argsort(A, kind="stable")
+    sA = A[sorter]
+
+    # ADM the range of matches in the sorted A for each entry in B.
+    # ADM searching for sorted values is much faster.
+    border = np.argsort(B)
+    lo, cnt = np.empty(len(B), dtype=np.int64), np.empty(len(B), dtype=np.int64)
+    lo[border] = np.searchsorted(sA, B[border], side="left")
+    cnt[border] = np.searchsorted(sA, B[border], side="right") - lo[border]
+
+    iB = np.repeat(np.arange(len(B)), cnt)
+    # ADM the offset of each pair within its range of matches.
+    offset = np.arange(len(iB)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+    iA = sorter[np.repeat(lo, cnt) + offset]
+
+    return iA, iB
+
+
+def _radec2xyz(ras, decs):
+    """3-D unit vectors, as an (N, 3) array, for RAs/Decs in degrees"""
+    ras, decs = np.radians(ras), np.radians(decs)
+    cosdecs = np.cos(decs)
+
+    return np.stack([np.cos(ras)*cosdecs, np.sin(ras)*cosdecs, np.sin(decs)],
+                    axis=-1)
+
+
+def _radec_sep(ra1, dec1, ra2, dec2):
+    """Separations in ARCSECONDS between RAs/Decs in degrees"""
+    # ADM this is the Vincenty formula, with the same order of operations
+    # ADM as astropy (which differences the RAs before converting them).
+    dra = np.radians(ra2 - ra1)
+    dec1, dec2 = np.radians(dec1), np.radians(dec2)
+    sdra, cdra = np.sin(dra), np.cos(dra)
+    sdec1, sdec2 = np.sin(dec1), np.sin(dec2)
+    cdec1, cdec2 = np.cos(dec1), np.cos(dec2)
+    num1 = cdec2 * sdra
+    num2 = cdec1 * sdec2 - sdec1 * cdec2 * cdra
+    denominator = sdec1 * sdec2 + cdec1 * cdec2 * cdra
+
+    return np.degrees(np.arctan2(np.hypot(num1, num2), denominator))*3600.
+
+
+def _radec_tree(ras, decs, cache=False):
+    """A KD-tree of the 3-D unit vectors for RAs/Decs in degrees.
+
+    Parameters
+    ----------
+    ras, decs : :class:`~numpy.ndarray`
+        Right Ascensions and Declinations (DEGREES, as 64-bit floats).
+    cache : :class:`bool`, optional, defaults to ``False``
+        If ``True``, look up (or store) the tree in a process-wide cache
+        that is keyed by a checksum of `ras` and `decs`.
+
+    Returns
+    -------
+    :class:`scipy.spatial.cKDTree`
+        A tree built with the same options as astropy, so that ties are
+        broken in the same way as for astropy's catalog matching.
+    """
+    from scipy.spatial import cKDTree
+
+    if cache:
+        sha = hashlib.sha1(np.ascontiguousarray(ras).view('u1'))
+        sha.update(np.ascontiguousarray(decs).view('u1'))
+        key = (len(ras), sha.hexdigest())
+        if key in _radecTreeCache:
+            _radecTreeCache.move_to_end(key)
+            return _radecTreeCache[key]
+
+    tree = cKDTree(_radec2xyz(ras, decs),
+                   balanced_tree=False, compact_nodes=False)
+
+    if cache:
+        _radecTreeCache[key] = tree
+        while len(_radecTreeCache) > _radecTreeCacheSize:
+            _radecTreeCache.popitem(last=False)
+
+    return tree
+
+
+def _radec_match(ram, decm, ra, dec, sep, allmatches=False, cache=False):
+    """Match (64-bit) coordinates in memory, see :func:`radec_match_to`"""
+    if len(ram) == 0 or len(ra) == 0:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'), \
+            np.zeros(0, dtype='f8')
+
+    treem = _radec_tree(ram, decm, cache=cache)
+    # ADM the chord length corresponding to the matching radius, padded
+    # ADM a little, as we calculate the precise separations later.
+    chord = 1.000001*2*np.sin(np.radians(np.min([sep/3600., 180.]))/2.)
+    if allmatches:
+        treeo = _radec_tree(ra, dec, cache=False)
+        pairs = treem.sparse_distance_matrix(treeo, chord,
+                                             output_type='ndarray')
+        idmatchto, idobjs = pairs["i"].astype('int64'), pairs["j"].astype('int64')
+    else:
+        # ADM querying in HEALPixel order is several times faster, as
+        # ADM successive queries then visit the same parts of the tree.
+        order = np.argsort(hp.ang2pix(256, ra, dec, nest=True, lonlat=True))
+        # ADM the tree returns an index of len(ram) if there's no match.
+        _, idm = treem.query(_radec2xyz(ra[order], dec[order]),
+                             distance_upper_bound=chord)
+        idmatchto = np.empty_like(idm)
+        idmatchto[order] = idm
+        idobjs = np.where(idmatchto < len(ram))[0]
+        idmatchto = idmatchto[idobjs].astype('int64')
+
+    seps = _radec_sep(ram[idmatchto], decm[idmatchto], ra[idobjs], dec[idobjs])
+    ii = seps < sep
+    idmatchto, idobjs, seps = idmatchto[ii], idobjs[ii], seps[ii]
+    if allmatches:
+        srt = np.lexsort((idmatchto, idobjs))
+        idmatchto, idobjs, seps = idmatchto[srt], idobjs[srt], seps[srt]
+
+    return idmatchto, idobjs, seps
+
+
+def _radec_match_hp(ram, decm, ra, dec, sep, nside, allmatches=False,
+                    numproc=1):
+    """Match coordinates in (NESTED) HEALPixel chunks at `nside`"""
+    # ADM every match must be in the same or a neighboring pixel.
+    maxsep = 3600*np.degrees(hp.nside2resol(nside))/2.
+    if sep >= maxsep:
+        msg = "sep ({}) must be < {:.1f} arcsec (half the pixel size) "  \
+            "for nside={}".format(sep, maxsep, nside)
+        log.critical(msg)
+        raise ValueError(msg)
+
+    # ADM the halo around each pixel is built from pixels at the finest
+    # ADM nside (up to 32 times finer) for which matches must still be
+    # ADM in the same or a neighboring pixel.
+    nfine = 1
+    while nfine < 32 and sep < 3600*np.degrees(
+            hp.nside2resol(nside*nfine*2))/2.:
+        nfine *= 2
+    nsub = nfine**2
+
+    # ADM sort the catalog by fine HEALPixel (which, in the NESTED
+    # ADM scheme, also sorts it by HEALPixel at nside), and the objects
+    # ADM by HEALPixel at nside.
+    pixm = hp.ang2pix(nside*nfine, ram, decm, nest=True, lonlat=True)
+    srtm = np.argsort(pixm, kind='stable')
+    pixm = pixm[srtm]
+    pixo = hp.ang2pix(nside, ra, dec, nest=True, lonlat=True)
+    srto = np.argsort(pixo, kind='stable')
+    pixels, nobjs = np.unique(pixo, return_counts=True)
+    ends = np.cumsum(nobjs)
+
+    def _match_pixels(indexes):
+        """Match the objects in pixels[indexes] to the catalog"""
+        idmatchto, idobjs = [np.zeros(0, dtype='int64')], [np.zeros(0, dtype='int64')]
+        seps = [np.zeros(0, dtype='f8')]
+        for i in indexes:
+            # ADM the fine pixels that border this pixel (-1 means
+            # ADM there's no neighbor).
+            subpix = np.arange(pixels[i]*nsub, (pixels[i]+1)*nsub)
+            halo = hp.get_all_neighbours(nside*nfine, subpix, nest=True)
+            halo = np.unique(halo[(halo >= 0) & (halo//nsub != pixels[i])])
+            # ADM the catalog in this pixel, and in the halo.
+            lo = np.append(pixels[i]*nsub, halo)
+            hi = np.append((pixels[i]+1)*nsub, halo+1)
+            lo = np.searchsorted(pixm, lo, side='left')
+            hi = np.searchsorted(pixm, hi, side='left')
+            # ADM sort the catalog indexes so ties are broken by index.
+            inm = np.sort(np.concatenate(
+                [srtm[l:h] for l, h in zip(lo, hi)] + [np.zeros(0, dtype='int64')]))
+            ino = srto[ends[i]-nobjs[i]:ends[i]]
+            im, io, sp = _radec_match(ram[inm], decm[inm], ra[ino], dec[ino],
+                                      sep, allmatches=allmatches, cache=False)
+            idmatchto.append(inm[im])
+            idobjs.append(ino[io])
+            seps.append(sp)
+
+        return np.concatenate(idmatchto), np.concatenate(idobjs), \
+            np.concatenate(seps)
+
+    # ADM split the pixels into arrays of indexes.
+    indexes = np.array_split(np.arange(len(pixels)), numproc)
+
+    if numproc > 1:
+        pool = sharedmem.MapReduce(np=numproc)
+        with pool:
+            results = pool.map(_match_pixels, indexes,
+                               reduce=lambda im, io, sp: (im, io, sp))
+        idmatchto = np.concatenate([im for im, _, _ in results])
+        idobjs = np.concatenate([io for _, io, _ in results])
+        seps = np.concatenate([sp for _, _, sp in results])
+    else:
+        idmatchto, idobjs, seps = _match_pixels(indexes[0])
+
+    srt = np.lexsort((idmatchto, idobjs))
+
+    return idmatchto[srt], idobjs[srt], seps[srt]
+
+
+def radec_match_to(matchto, objs, sep=1., radec=False, return_sep=False,
+                   allmatches=False, nside=None, cache=False, numproc=1):
     """Match objects to a catalog list on RA/Dec.
 
     Parameters
@@ -1447,6 +2146,22 @@ def radec_match_to(matchto, objs, sep=1., radec=False, return_sep=False):
     return_sep : :class:`bool`, optional, defaults to ``False``
         If ``True`` then return the separation between each object, not
         just the indexes of the match.
+    allmatches : :class:`bool`, optional, defaults to ``False``
+        If ``True`` then return ALL matches within `sep`, not just the
+        closest match to each object in `objs`.
+    nside : :class:`int`, optional, defaults to ``None``
+        If passed, process the coordinates in chunks of (NESTED)
+        HEALPixels at `nside`, to limit memory usage for huge catalogs.
+        `sep` must be less than half of the pixel size at `nside`.
+    cache : :class:`bool`, optional, defaults to ``False``
+        If ``True``, cache the tree built for `matchto`, so that repeat
+        calls that match to the same catalog are faster. Only worth it
+        for catalogs that really are matched to repeatedly, as the
+        catalog is checksummed on every call and cached trees are kept
+        for the life of the process. Not used if `nside` is passed.
+    numproc : :class:`int`, optional, defaults to 1
+        The number of processes over which to parallelize the chunks.
+        Only used if `nside` is passed.
 
     Returns
     -------
@@ -1476,7 +2191,17 @@ def radec_match_to(matchto, objs, sep=1., radec=False, return_sep=False):
           >>> radec_match_to([ras, decs], [mainra, maindec], radec=True)
           >>> Out: (array([0]), array([0]))
 
-        - Only returns the CLOSEST match within `sep` arcseconds.
+        - Only returns the CLOSEST match within `sep` arcseconds, unless
+          `allmatches` is ``True``.
+        - The outputs are sorted by the index in `objs` (then by the
+          index in `matchto`).
+        - Coordinates are matched as 3-D unit vectors using a
+          :class:`scipy.spatial.cKDTree` built over `matchto`, with
+          separations calculated as for astropy. The results are the
+          same as for astropy's ``match_to_catalog_sky`` (or, if
+          `allmatches` is ``True``, ``search_around_sky``), except that
+          ties for the closest match may be broken differently if
+          `nside` is passed.
     """
     if radec:
         ram, decm = matchto
@@ -1484,19 +2209,21 @@ def radec_match_to(matchto, objs, sep=1., radec=False, return_sep=False):
     else:
         ram, decm = matchto["RA"], matchto["DEC"]
         ra, dec = objs["RA"], objs["DEC"]
+    ram, decm, ra, dec = [np.atleast_1d(np.asarray(i, dtype='f8'))
+                          for i in (ram, decm, ra, dec)]
 
-    cmatchto = SkyCoord(ram*u.degree, decm*u.degree)
-    cobjs = SkyCoord(ra*u.degree, dec*u.degree)
-
-    idmatchto, d2d, _ = cobjs.match_to_catalog_sky(cmatchto)
-    idobjs = np.arange(len(cobjs))
-
-    ii = d2d < sep*u.arcsec
+    if nside is None:
+        idmatchto, idobjs, seps = _radec_match(
+            ram, decm, ra, dec, sep, allmatches=allmatches, cache=cache)
+    else:
+        idmatchto, idobjs, seps = _radec_match_hp(
+            ram, decm, ra, dec, sep, nside, allmatches=allmatches,
+            numproc=numproc)
 
     if return_sep:
-        return idmatchto[ii], idobjs[ii], d2d[ii].arcsec
+        return idmatchto, idobjs, seps
 
-    return idmatchto[ii], idobjs[ii]
+    return idmatchto, idobjs
 
 
 def rewind_coords(ranow, decnow, pmra, pmdec,
@@ -200,7 +200,7 @@ def gaia_in_file(infile, maglim=18, mindec=-30., mingalb=10.,
          :func:`~desitarget.gaiamatch.gaia_fits_to_healpix()`
     """
     # ADM read in the Gaia file and limit to the passed magnitude.
-    objs = read_gaia_file(infile, addobjid=addobjid)
+    objs = read_gaia_file(infile, addobjid=addobjid, cache=True)
     ii = objs['GAIA_PHOT_G_MEAN_MAG'] < maglim
     objs = objs[ii]
 
@@ -348,17 +348,21 @@ def all_gaia_in_tiles(maglim=18, numproc=4, allsky=False,
 
     # - Parallel process Gaia files.
     if numproc > 1 and nfiles > 0:
+        # ADM each process writes its objects directly to shared memory.
+        # ADM the objects are a subset of the rows of the Gaia files.
+        capacity = sum(os.path.getsize(fn) for fn in infiles)
         pool = sharedmem.MapReduce(np=numproc)
         with pool:
-            gfas = pool.map(_get_gaia_gfas, infiles, reduce=_update_status)
+            gfas, _ = pool.gather(_get_gaia_gfas, infiles, capacity,
+                                  reduce=_update_status)
     else:
         gfas = list()
         for file in infiles:
             gfas.append(_update_status(_get_gaia_gfas(file)))
+        if len(gfas) > 0:
+            gfas = np.concatenate(gfas)
 
-    if len(gfas) > 0:
-        gfas = np.concatenate(gfas)
-    else:
+    if len(gfas) == 0:
         # ADM if nothing was found, return an empty np array.
         gfas = dummygfas
 
@@ -536,7 +540,7 @@ def select_gfas(infiles, maglim=18, numproc=4, nside=None,
     # ADM know which HEALPixels touch each file.
     if pixlist is not None:
         filesperpixel, _, _ = sweep_files_touch_hp(
-            nside, pixlist, infiles)
+            nside, pixlist, infiles, numproc=numproc)
 
     # ADM if the bundlefiles option was sent, call the packing code.
     if bundlefiles is not None:
@@ -582,14 +586,18 @@ def select_gfas(infiles, maglim=18, numproc=4, nside=None,
     # - Parallel process input files.
     if len(infiles) > 0:
         if numproc4 > 1:
+            # ADM each process writes its GFAs directly to shared memory.
+            # ADM the GFAs are a subset of the rows of the input files.
+            capacity = sum(os.path.getsize(fn) for fn in infiles)
             pool = sharedmem.MapReduce(np=numproc4)
             with pool:
-                gfas = pool.map(_get_gfas, infiles, reduce=_update_status)
+                gfas, _ = pool.gather(_get_gfas, infiles, capacity,
+                                      reduce=_update_status)
         else:
             gfas = list()
             for file in infiles:
                 gfas.append(_update_status(_get_gfas(file)))
-        gfas = np.concatenate(gfas)
+            gfas = np.concatenate(gfas)
         # ADM resolve any duplicates between imaging data releases.
         gfas = resolve(gfas)
 
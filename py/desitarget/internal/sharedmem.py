@@ -169,11 +169,11 @@ def total_memory():
         The memory is obtained from MemTotal entry in /proc/meminfo.
 
     """
-    with file('/proc/meminfo', 'r') as f:
+    with open('/proc/meminfo', 'r') as f:
         for line in f:
             words = line.split()
-        if words[0].upper() == 'MEMTOTAL:':
-            return int(words[1]) * 1024
+            if words[0].upper() == 'MEMTOTAL:':
+                return int(words[1]) * 1024
     raise IOError('MemTotal unknown')
 
 def cpu_count():
@@ -698,6 +698,151 @@ class MapReduce(object):
             feeder.join()
             raise
 
+    def gather(self, func, sequence, capacity, reduce=None, star=False,
+               positions=None):
+        """ Map with the results gathered directly in shared memory.
+
+            Apply func to each item on the sequence, in parallel. Each
+            worker copies the array returned by func into a shared memory
+            arena, at an offset that it reserves, so the results aren't
+            pickled back to the coordinator. The coordinator then receives
+            one contiguous array, in the order of the items.
+
+            Parameters
+            ----------
+            func : callable
+                The function to call. It must return a 1-d numpy array
+                (or None, for no result), with the same dtype for every
+                item. If func returns a tuple, the first element is the
+                array and the others are passed on to reduce.
+
+            sequence : list or array_like
+                The sequence of arguments to be applied to func.
+
+            capacity : int
+                Size of the arena in bytes, which should be estimated from
+                the inputs. Only memory that is written to is used, and it
+                is capped at half of :py:meth:`total_memory`. Results that
+                don't fit are pickled to the coordinator.
+
+            reduce : callable, optional
+                Called on the coordinator with the array for each item (a
+                view of the arena) and any other elements returned by func.
+                The return value of reduce is ignored.
+
+            star : boolean
+                if True, the items in sequence are treated as positional
+                arguments of func.
+
+            positions : array_like, optional
+                The position in results of each item of sequence, e.g. to
+                undo a permutation of the sequence. Defaults to the order
+                of sequence.
+
+            Returns
+            -------
+            results : array_like
+                The arrays returned by func for each item, contiguous in
+                the order of `positions`.
+
+            segments : array_like
+                The (start, count) of the rows in results for each item,
+                in the order of the arguments of sequence.
+
+            Raises
+            ------
+            WorkerException
+                If any of the worker process encounters
+                an exception. Inspect :py:attr:`WorkerException.reason` for the underlying exception.
+
+            Notes
+            -----
+            The results are only returned without a copy (as a view of the
+            arena) if the workers happened to finish the items in the order
+            of `positions` and every result fit in the arena. Otherwise, the
+            results are copied into order, so the peak memory is the arena
+            plus one copy of the results (as for a concatenate). Either way,
+            the results are never pickled unless they overflow the arena.
+
+        """
+        capacity = int(min(capacity, total_memory() // 2))
+        arena = empty(max(capacity, 1), dtype='u1')
+        used = full(1, 0, dtype='i8')
+
+        def work(i):
+            r = func(*i) if star else func(i)
+            extra = ()
+            if isinstance(r, tuple):
+                r, extra = r[0], r[1:]
+            if r is None:
+                return (None, 0, 0, None) + extra
+            r = numpy.ascontiguousarray(r)
+            # reserve room for the result in the arena.
+            with self.critical:
+                offset = int(used[0])
+                fits = offset + r.nbytes <= capacity
+                if fits:
+                    used[0] = offset + r.nbytes
+            if not fits:
+                return (r.dtype, len(r), 0, r) + extra
+            arena[offset:offset+r.nbytes] = r.view('u1').ravel()
+            return (r.dtype, len(r), offset, None) + extra
+
+        def gatherreduce(dtype, count, offset, overflow, *extra):
+            if reduce:
+                if overflow is not None:
+                    r = overflow
+                elif dtype is not None:
+                    r = arena[offset:offset+count*dtype.itemsize].view(dtype)
+                else:
+                    r = None
+                reduce(r, *extra)
+            return dtype, count, offset, overflow
+
+        capsules = self.map(work, sequence, reduce=gatherreduce, star=False)
+
+        dtypes = set(c[0] for c in capsules if c[0] is not None)
+        if len(dtypes) > 1:
+            raise ValueError('gather requires results with one dtype, not {}'
+                             .format(dtypes))
+        if len(dtypes) == 0:
+            return numpy.empty(0, dtype='u1'), numpy.zeros((len(capsules), 2), dtype='i8')
+        dtype = dtypes.pop()
+
+        if positions is None:
+            positions = numpy.arange(len(capsules))
+
+        segments = numpy.zeros((len(capsules), 2), dtype='i8')
+        start = 0
+        for i in numpy.argsort(positions, kind='stable'):
+            segments[i] = start, capsules[i][1]
+            start += capsules[i][1]
+
+        overflows = [i for i, c in enumerate(capsules) if c[3] is not None]
+        if len(overflows) > 0:
+            warnings.warn('{} results did not fit in the {} byte arena'
+                          .format(len(overflows), capacity))
+
+        # the workers finished in any order, so usually the results have
+        # to be copied into the order of the items (see Notes). concatenate
+        # would change the byte order to native.
+        offsets = numpy.array([c[2] for c in capsules], dtype='i8')
+        ii = segments[:, 1] > 0
+        if len(overflows) == 0 and numpy.all(
+                offsets[ii] == segments[ii, 0] * dtype.itemsize):
+            return arena[:int(used[0])].view(numpy.ndarray).view(dtype), segments
+
+        results = numpy.empty(start, dtype=dtype)
+        for i, (dt, count, offset, overflow) in enumerate(capsules):
+            if count == 0:
+                continue
+            r = overflow
+            if r is None:
+                r = arena[offset:offset+count*dtype.itemsize].view(dtype)
+            results[segments[i, 0]:segments[i, 0]+count] = r
+
+        return results, segments
+
 
 def empty_like(array, dtype=None):
     """ Create a shared memory array from the shape of array.
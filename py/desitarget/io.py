@@ -12,9 +12,10 @@ from __future__ import (absolute_import, division)
 import numpy as np
 # import pandas as pd
 import fitsio
-from astropy.table import Table
+from astropy.table import Table, MaskedColumn
 import os
 import re
+import warnings
 from . import __version__ as desitarget_version
 import numpy.lib.recfunctions as rfn
 import healpy as hp
@@ -28,6 +29,7 @@ from desitarget.geomask import hp_in_box, box_area, is_in_box
 from desitarget.geomask import hp_in_cap, cap_area, is_in_cap, add_hp_neighbors
 from desitarget.geomask import is_in_hp, nside2nside, pixarea2nside
 from desitarget.targets import main_cmx_or_sv, decode_targetid
+from desitarget.internal import sharedmem
 
 # ADM set up the DESI default logger
 from desiutil.log import get_logger
@@ -150,44 +152,34 @@ def add_photsys(indata):
     return outdata
 
 
-def read_tractor(filename, header=False, columns=None):
-    """Read a tractor catalogue or sweeps file.
+def tractor_datamodel(colnames):
+    """The desitarget data model for a Tractor catalogue or sweeps file.
 
     Parameters
     ----------
-    filename : :class:`str`
-        File name of one Tractor or sweeps file.
-    header : :class:`bool`, optional
-        If ``True``, return (data, header) instead of just data.
-    columns: :class:`list`, optional
-        Specify the desired Tractor catalog columns to read; defaults to
-        desitarget.io.tsdatamodel.dtype.names + most of the columns in
-        desitarget.gaiamatch.gaiadatamodel.dtype.names, where
-        tsdatamodel is, e.g., basetsdatamodel + dr9addedcols.
+    colnames : :class:`list` or `tuple`
+        The (upper-case) names of the columns in a Tractor or sweeps
+        file, e.g. from the file header, rather than from the data.
 
     Returns
     -------
-    :class:`~numpy.ndarray`
-        Array with the tractor schema, uppercase field names.
-    """
-    check_fitsio_version()
-
-    # ADM read in the file information. Due to fitsio header bugs
-    # ADM near v1.0.0, make absolutely sure the user wants the header.
-    if header:
-        indata, hdr = fitsio.read(filename, upper=True, header=True,
-                                  columns=columns)
-    else:
-        indata = fitsio.read(filename, upper=True, columns=columns)
+    :class:`list`
+        The data model as a list of dtype descriptors, e.g. [('RA',
+        '>f8'), ('DEC', '>f8')...]. The list includes PHOTSYS if RELEASE
+        is in the data model (see :func:`add_photsys`).
 
+    Notes
+    -----
+        - The data model is basetsdatamodel + dr9addedcols (or
+          dr8addedcols for DR8 and earlier) + most of the columns in
+          :data:`desitarget.gaiamatch.gaiadatamodel`.
+    """
     # ADM form the final data model in a manner that maintains
     # ADM backwards-compatability with DR8.
-    if "FRACDEV" in indata.dtype.names:
-        tsdatamodel = np.array(
-            [], dtype=basetsdatamodel.dtype.descr + dr8addedcols.dtype.descr)
+    if "FRACDEV" in colnames:
+        dt = basetsdatamodel.dtype.descr + dr8addedcols.dtype.descr
     else:
-        tsdatamodel = np.array(
-            [], dtype=basetsdatamodel.dtype.descr + dr9addedcols.dtype.descr)
+        dt = basetsdatamodel.dtype.descr + dr9addedcols.dtype.descr
 
     # ADM the full data model including Gaia columns.
     from desitarget.gaiamatch import gaiadatamodel
@@ -198,41 +190,292 @@ def read_tractor(filename, header=False, columns=None):
     for gaiacol in ['GAIA_PHOT_BP_RP_EXCESS_FACTOR',
                     'GAIA_ASTROMETRIC_SIGMA5D_MAX',
                     'GAIA_ASTROMETRIC_PARAMS_SOLVED', 'REF_CAT']:
-        if gaiacol not in indata.dtype.names:
+        if gaiacol not in colnames:
             gaiadatamodel = pop_gaia_columns(gaiadatamodel, [gaiacol])
-    dt = tsdatamodel.dtype.descr + gaiadatamodel.dtype.descr
-    dtnames = tsdatamodel.dtype.names + gaiadatamodel.dtype.names
-    # ADM limit to just passed columns.
-    if columns is not None:
-        dt = [d for d, name in zip(dt, dtnames) if name in columns]
+    dt += gaiadatamodel.dtype.descr
+
+    # ADM the fitsio check is a hack for the v0.9 to v1.0 transition
+    # ADM (v1.0 now converts all byte strings to unicode strings).
+    from distutils.version import LooseVersion
+    if LooseVersion(fitsio.__version__) >= LooseVersion('1'):
+        dt += [('PHOTSYS', '<U1')]
+    else:
+        dt += [('PHOTSYS', '|S1')]
+
+    return dt
+
+
+# ADM the (ASCII) characters stripped by str.rstrip().
+_whitespace = np.frombuffer(b' \t\n\r\x0b\x0c', dtype='u1')
+
+# ADM the data model for the latest-state index of an MTL ledger.
+mtlindexdatamodel = np.array([], dtype=[
+    ('TARGETID', '>i8'), ('OFFSET', '>i8')])
+
+# ADM the first word of a binary MTL ledger and the block size to which
+# ADM the (ASCII) header of a binary MTL ledger is padded.
+mtlbinmagic = "%DESIMTL-1.0"
+_mtlbinblock = 4096
+
+# ADM the data model for the HEALPixel index of a target file, and the
+# ADM (nested) nside at which target files are sorted and indexed.
+hpxindexdatamodel = np.array([], dtype=[
+    ('HPXPIXEL', '>i8'), ('ROWSTART', '>i8'), ('NROWS', '>i8')])
+_hpxidxnside = 256
+
+# ADM the (much faster) LibYAML-based loader, if it's available, for
+# ADM parsing the headers of MTL ledgers.
+_yamlloader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _rstrip_bytes(data, col):
+    """Strip trailing whitespace from a fixed-width byte-string column.
+
+    Parameters
+    ----------
+    data : :class:`~numpy.ndarray`
+        A contiguous structured array. Modified in place.
+    col : :class:`str`
+        The name of a column of kind "S" in `data`.
+
+    Notes
+    -----
+        - Equivalent to `data[col] = np.char.rstrip(data[col])`, but only
+          touches the trailing characters of each string, and only if
+          they're whitespace. Trailing NULs are padding for numpy strings.
+    """
+    # ADM a writeable (rows, characters) view of the column.
+    offset, width = data.dtype.fields[col][1], data.dtype[col].itemsize
+    chars = data.view('u1').reshape(len(data), data.itemsize)[:, offset:offset+width]
+    # ADM work backwards until no string has trailing whitespace.
+    trailing = np.ones(len(data), dtype='?')
+    for i in range(width-1, -1, -1):
+        c = chars[:, i]
+        trailing &= (c == 0) | np.isin(c, _whitespace)
+        if not np.any(trailing):
+            break
+        c[trailing] = 0
+
+
+def read_tractor_nrows(filename):
+    """Number of rows in a Tractor catalogue or sweeps file.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        File name of one Tractor or sweeps file.
+
+    Returns
+    -------
+    :class:`int`
+        The number of rows in the first extension of `filename`.
+    """
+    return fitsio.read_header(filename, 1)["NAXIS2"]
+
+
+def read_file_timings(timingfile):
+    """Read the time taken to process each of a set of files.
+
+    Parameters
+    ----------
+    timingfile : :class:`str`
+        Name of a yaml file written by :func:`write_file_timings`.
+
+    Returns
+    -------
+    :class:`dict`
+        Dictionary of time taken in seconds, keyed by file name. Empty
+        if `timingfile` doesn't exist (yet).
+    """
+    if not os.path.exists(timingfile):
+        return {}
+    with open(timingfile) as f:
+        timings = yaml.safe_load(f)
+
+    return {} if timings is None else timings
+
+
+def write_file_timings(timingfile, timings):
+    """Record the time taken to process each of a set of files.
+
+    Parameters
+    ----------
+    timingfile : :class:`str`
+        Name of a yaml file. Any timings already in the file are kept,
+        unless they're for a file that's in `timings`.
+    timings : :class:`dict`
+        Dictionary of time taken in seconds, keyed by file name.
+
+    Returns
+    -------
+    Nothing, but `timingfile` is written.
+    """
+    alltimings = read_file_timings(timingfile)
+    alltimings.update({fn: float(sec) for fn, sec in timings.items()})
+    # ADM write to a temporary file and rename to make the write atomic.
+    tmpfile = timingfile + '.tmp'
+    with open(tmpfile, 'w') as f:
+        yaml.safe_dump(alltimings, f, default_flow_style=False)
+    os.rename(tmpfile, timingfile)
+
+
+def sweep_file_costs(infiles, timingfile=None):
+    """Estimate the relative cost of processing each of a list of files.
+
+    Parameters
+    ----------
+    infiles : :class:`list` or `str`
+        A list of input filenames (tractor or sweep files).
+    timingfile : :class:`str`, optional
+        Name of a yaml file written by :func:`write_file_timings` on an
+        earlier run. If passed, recorded timings are used for any files
+        that were processed on that run.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The estimated cost of processing each file in `infiles`.
+
+    Notes
+    -----
+        - The cost of a file is its number of rows (from the header).
+          Files with recorded timings cost the recorded time, and the
+          cost of other files is then scaled by the median time per row
+          of the recorded files.
+    """
+    infiles = np.atleast_1d(infiles)
+    nrows = np.array([read_tractor_nrows(fn) for fn in infiles], dtype='f8')
+
+    timings = {}
+    if timingfile is not None:
+        timings = read_file_timings(timingfile)
+    recorded = np.array([fn in timings for fn in infiles], dtype=bool)
+    if not np.any(recorded):
+        return nrows
+
+    seconds = np.array([timings[fn] for fn in infiles[recorded]])
+    rate = np.median(seconds / np.maximum(nrows[recorded], 1))
+    costs = nrows * rate
+    costs[recorded] = seconds
+
+    return costs
+
+
+def read_tractor(filename, header=False, columns=None, rows=None,
+                 chunksize=2**17):
+    """Read a tractor catalogue or sweeps file.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        File name of one Tractor or sweeps file.
+    header : :class:`bool`, optional
+        If ``True``, return (data, header) instead of just data.
+    columns: :class:`list`, optional
+        Specify the desired Tractor catalog columns to read; defaults to
+        desitarget.io.tsdatamodel.dtype.names + most of the columns in
+        desitarget.gaiamatch.gaiadatamodel.dtype.names, where
+        tsdatamodel is, e.g., basetsdatamodel + dr9addedcols.
+    rows : :class:`list` or `~numpy.ndarray`, optional
+        Only read these (0-indexed) rows of the file. Defaults to
+        reading every row.
+    chunksize : :class:`int`, optional, defaults to 2**17
+        Number of rows to read from the file at a time.
 
-    # ADM set-up the output array.
-    nrows = len(indata)
-    data = np.zeros(nrows, dtype=dt)
-    # ADM if REF_ID was requested, set it to -1 in case there is no Gaia data.
-    if "REF_ID" in data.dtype.names:
-        data['REF_ID'] = -1
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Array with the tractor schema, uppercase field names.
 
-    # ADM populate the common input/output columns.
-    for col in set(indata.dtype.names).intersection(set(data.dtype.names)):
-        data[col] = indata[col]
+    Notes
+    -----
+        - Only the requested columns are read from the file, in chunks
+          of rows, directly into an array with the final data model.
+          So, the peak memory is the size of the output plus a chunk.
+        - The data model is fixed from the file header, rather than
+          from the data, see :func:`tractor_datamodel`.
+        - Requested `columns` that are in the data model but are not in
+          the file are treated as when all columns are read (i.e. they
+          are populated with zeros or omitted for optional Gaia columns).
+    """
+    check_fitsio_version()
+
+    with fitsio.FITS(filename) as fx:
+        hdu = fx[1]
+        # ADM map upper-case column names to those in the file.
+        filecols = {col.upper(): col for col in hdu.get_colnames()}
+        if columns is not None:
+            from desitarget.gaiamatch import gaiadatamodel
+            known = set(filecols).union(
+                basetsdatamodel.dtype.names, dr8addedcols.dtype.names,
+                dr9addedcols.dtype.names, gaiadatamodel.dtype.names,
+                ["PHOTSYS"])
+            missing = [col for col in columns if col not in known]
+            if len(missing) > 0:
+                msg = "columns {} are not in {}".format(missing, filename)
+                log.critical(msg)
+                raise ValueError(msg)
 
-    # ADM MASKBITS used to be BRIGHTSTARINBLOB which was set to True/False
-    # ADM and which represented the SECOND bit of MASKBITS.
-    if "BRIGHTSTARINBLOB" in indata.dtype.names:
-        if "MASKBITS" in data.dtype.names:
-            data["MASKBITS"] = indata["BRIGHTSTARINBLOB"] << 1
+        # ADM the final data model, limited to any passed columns.
+        dt = tractor_datamodel(filecols)
+        if columns is not None:
+            dt = [d for d in dt if d[0] in columns or d[0] == "PHOTSYS"]
+        dtnames = [d[0] for d in dt]
+        # ADM PHOTSYS is only added to the data model if RELEASE is.
+        if "RELEASE" not in dtnames:
+            dt = [d for d in dt if d[0] != "PHOTSYS"]
+
+        # ADM the columns to read (PHOTSYS is always derived from
+        # ADM RELEASE). MASKBITS used to be BRIGHTSTARINBLOB, which was
+        # ADM set to True/False and represented the SECOND bit of MASKBITS.
+        readcols = [col for col in dtnames
+                    if col in filecols and col != "PHOTSYS"]
+        bsib = "MASKBITS" in dtnames and "MASKBITS" not in filecols \
+            and "BRIGHTSTARINBLOB" in filecols
+        if bsib:
+            readcols.append("BRIGHTSTARINBLOB")
+
+        # ADM set-up the output array. Only columns that can't be
+        # ADM read from the file need to be initialized.
+        if rows is None:
+            rows = np.arange(hdu.get_nrows())
+        nrows = len(rows)
+        data = np.empty(nrows, dtype=dt)
+        for col in set(data.dtype.names) - set(readcols):
+            data[col] = 0
+        # ADM if REF_ID was requested, set it to -1 in case there is no Gaia data.
+        if "REF_ID" in data.dtype.names and "REF_ID" not in filecols:
+            data["REF_ID"] = -1
+
+        # ADM populate the output array in chunks of rows.
+        for start in range(0, nrows, chunksize):
+            indata = hdu.read(columns=[filecols[col] for col in readcols],
+                              rows=rows[start:start+chunksize], upper=True)
+            chunk = data[start:start+chunksize]
+            # ADM copying all of the columns at once, row-by-row, is
+            # ADM much faster than copying them column-by-column.
+            cols = [col for col in indata.dtype.names
+                    if col != "BRIGHTSTARINBLOB"]
+            chunk[cols] = indata[cols]
+            if bsib:
+                chunk["MASKBITS"] = indata["BRIGHTSTARINBLOB"] << 1
+
+        if header:
+            hdr = hdu.read_header()
 
     # ADM To circumvent whitespace bugs on I/O from fitsio.
     # ADM need to strip any white space from string columns.
-    for colname in data.dtype.names:
-        kind = data[colname].dtype.kind
-        if kind == 'U' or kind == 'S':
-            data[colname] = np.char.rstrip(data[colname])
+    for col in data.dtype.names:
+        kind = data.dtype[col].kind
+        if kind == 'S':
+            _rstrip_bytes(data, col)
+        elif kind == 'U':
+            data[col] = np.char.rstrip(data[col])
 
-    # ADM add the PHOTSYS column to unambiguously check whether we're using imaging
-    # ADM from the "North" or "South".
-    data = add_photsys(data)
+    # ADM add the PHOTSYS column to unambiguously check whether we're
+    # ADM using imaging from the "North" or "South".
+    if "PHOTSYS" in data.dtype.names:
+        data["PHOTSYS"] = release_to_photsys(data["RELEASE"])
 
     if header:
         return data, hdr
@@ -383,7 +626,8 @@ def _bright_or_dark(filename, hdr, data, obscon, mockdata=None):
         return filename, hdr, data
 
 
-def write_with_units(filename, data, extname=None, header=None, ecsv=False):
+def write_with_units(filename, data, extname=None, header=None, ecsv=False,
+                     hpxidx=False):
     """Write a FITS file with units from the desitarget data model.
 
     Parameters
@@ -397,6 +641,10 @@ def write_with_units(filename, data, extname=None, header=None, ecsv=False):
         a FITShdr object or a dictionary.
     ecsv : :class:`bool`, optional, defaults to ``False``
         If ``True`` then write as a .ecsv file instead of FITS.
+    hpxidx : :class:`bool`, optional, defaults to ``False``
+        If ``True`` then sort the rows of `data` by HEALPixel and add an
+        "HPXIDX" extension that indexes the rows in each HEALPixel (see
+        :func:`make_hpx_index`). Only used for FITS files.
 
     Returns
     -------
@@ -437,13 +685,100 @@ def write_with_units(filename, data, extname=None, header=None, ecsv=False):
         data.meta['EXTNAME'] = extname
         data.write(filename+'.tmp', format='ascii.ecsv', overwrite=True)
     else:
+        if hpxidx:
+            data, index = make_hpx_index(data)
         fitsio.write(filename+'.tmp', data, units=units, extname=extname,
                      header=header, clobber=True)
+        if hpxidx:
+            idxhdr = {"HPXNSIDE": _hpxidxnside, "HPXNEST": True}
+            fitsio.write(filename+'.tmp', index, extname='HPXIDX',
+                         header=idxhdr)
     os.rename(filename+'.tmp', filename)
 
     return
 
 
+def make_hpx_index(data, nside=_hpxidxnside):
+    """Sort rows by HEALPixel and index the rows in each HEALPixel.
+
+    Parameters
+    ----------
+    data : :class:`~numpy.ndarray`
+        A numpy structured array that includes the columns `RA`, `DEC`.
+    nside : :class:`int`, optional, defaults to 256
+        The (NESTED) HEALPixel nside by which to sort and index `data`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        `data` sorted by HEALPixel (the order within each HEALPixel is
+        retained).
+    :class:`~numpy.ndarray`
+        An index with columns ``HPXPIXEL``, ``ROWSTART`` and ``NROWS``
+        with one entry, sorted by ``HPXPIXEL``, for each HEALPixel that
+        contains rows of the sorted `data`.
+
+    Notes
+    -----
+        - As HEALPixels are NESTED, the rows in any HEALPixel at any
+          nside <= `nside` are contiguous in the sorted `data`.
+    """
+    theta, phi = np.radians(90-data["DEC"]), np.radians(data["RA"])
+    pixnum = hp.ang2pix(nside, theta, phi, nest=True)
+    ii = np.argsort(pixnum, kind="stable")
+
+    pixels, starts, counts = np.unique(pixnum[ii], return_index=True,
+                                       return_counts=True)
+    index = np.zeros(len(pixels), dtype=hpxindexdatamodel.dtype)
+    index["HPXPIXEL"] = pixels
+    index["ROWSTART"] = starts
+    index["NROWS"] = counts
+
+    return data[ii], index
+
+
+def hpx_index_rows(index, idxnside, nside, pixlist):
+    """The rows listed in a HEALPixel index that are in a set of pixels.
+
+    Parameters
+    ----------
+    index : :class:`~numpy.ndarray`
+        A HEALPixel index, as made by :func:`make_hpx_index`.
+    idxnside : :class:`int`
+        The (NESTED) HEALPixel nside of `index`.
+    nside : :class:`int`
+        The (NESTED) HEALPixel nside of `pixlist`.
+    pixlist : :class:`list` or `int` or `~numpy.ndarray`
+        HEALPixels at the passed `nside`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The (sorted) rows that are in `pixlist`. If `nside` is larger
+        than `idxnside` this includes rows in the parent pixels (at
+        `idxnside`) of `pixlist`.
+    """
+    pixlist = np.atleast_1d(pixlist).astype('int64')
+    # ADM the range of index pixels covered by each of pixlist.
+    if nside <= idxnside:
+        fac = (idxnside // nside)**2
+        lo, hi = pixlist*fac, (pixlist+1)*fac
+    else:
+        lo = pixlist // (nside // idxnside)**2
+        hi = lo + 1
+    ilo = np.searchsorted(index["HPXPIXEL"], lo)
+    ihi = np.searchsorted(index["HPXPIXEL"], hi)
+    ii = np.unique(np.concatenate(
+        [np.arange(l, h) for l, h in zip(ilo, ihi)] + [np.zeros(0, 'int')]))
+
+    # ADM expand each matching entry into its range of rows.
+    starts, counts = index["ROWSTART"][ii], index["NROWS"][ii]
+    offsets = np.cumsum(counts) - counts
+    rows = np.arange(np.sum(counts)) + np.repeat(starts - offsets, counts)
+
+    return rows
+
+
 def write_targets(targdir, data, indir=None, indir2=None, nchunks=None,
                   qso_selection=None, nside=None, survey="main", nsidefile=None,
                   hpxlist=None, scndout=None, resolve=True, maskbits=True,
@@ -504,6 +839,12 @@ def write_targets(targdir, data, indir=None, indir2=None, nchunks=None,
         The number of targets that were written to file.
     :class:`str`
         The name of the file to which targets were written.
+
+    Notes
+    -----
+        - Unless `nchunks` or `mockdata` is passed, targets are sorted
+          by HEALPixel and indexed (see :func:`make_hpx_index`), so that
+          :func:`read_targets_in_hp` can read just the needed rows.
     """
     # ADM create header.
     hdr = fitsio.FITSHDR()
@@ -578,6 +919,12 @@ def write_targets(targdir, data, indir=None, indir2=None, nchunks=None,
     else:
         depend.setdep(hdr, 'qso-selection', qso_selection)
 
+    # ADM record how BGS_FAINT_HIP targets were chosen, as this changed
+    # ADM from a seeded draw over each file to a per-object hash of the
+    # ADM fluxes (see desitarget.cuts._flux_uniform).
+    if survey == "main":
+        depend.setdep(hdr, 'bgs-faint-hip', 'flux-hash')
+
     # ADM add HEALPix column, if requested by input.
     if nside is not None:
         theta, phi = np.radians(90-data["DEC"]), np.radians(data["RA"])
@@ -626,9 +973,11 @@ def write_targets(targdir, data, indir=None, indir2=None, nchunks=None,
     # ADM create necessary directories, if they don't exist.
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    # ADM write in a series of chunks to save memory.
+    # ADM write in a series of chunks to save memory. Unless the rows
+    # ADM need to match a mock truth file, sort and index by HEALPixel.
     if nchunks is None:
-        write_with_units(filename, data, extname='TARGETS', header=hdr)
+        write_with_units(filename, data, extname='TARGETS', header=hdr,
+                         hpxidx=mockdata is None)
     else:
         write_in_chunks(filename, data, nchunks, extname='TARGETS', header=hdr)
 
@@ -672,7 +1021,8 @@ def write_targets(targdir, data, indir=None, indir2=None, nchunks=None,
 
 
 def write_mtl(mtldir, data, indir=None, survey="main", obscon=None,
-              nsidefile=None, hpxlist=None, extra=None, ecsv=True):
+              nsidefile=None, hpxlist=None, extra=None, ecsv=True,
+              binary=False):
     """Write Merged Target List ledgers or files.
 
     Parameters
@@ -701,6 +1051,9 @@ def write_mtl(mtldir, data, indir=None, survey="main", obscon=None,
         values to the output header.
     ecsv : :class:`bool`, defaults to ``True``
         If ``True`` write a .ecsv file, if ``False`` with a .fits file.
+    binary : :class:`bool`, defaults to ``False``
+        If ``True`` write a binary (.bin) ledger, regardless of `ecsv`.
+        See :func:`write_mtl_binary`.
 
     Returns
     -------
@@ -748,6 +1101,8 @@ def write_mtl(mtldir, data, indir=None, survey="main", obscon=None,
 
     # ADM set output format to ecsv if passed, or fits otherwise.
     form = 'ecsv'*ecsv + 'fits'*(not(ecsv))
+    if binary:
+        form = 'bin'
     fn = find_target_files(mtldir, dr=drint, flavor="mtl", survey=survey,
                            obscon=obscon, hp=hpx, ender=form)
     # ADM create necessary directories, if they don't exist.
@@ -761,11 +1116,151 @@ def write_mtl(mtldir, data, indir=None, survey="main", obscon=None,
     # ADM sort the output file on TARGETID.
     data = data[np.argsort(data["TARGETID"])]
 
-    write_with_units(fn, data, extname='MTL', header=hdrdict, ecsv=ecsv)
+    if binary:
+        write_mtl_binary(fn, data, header=hdrdict)
+    else:
+        write_with_units(fn, data, extname='MTL', header=hdrdict, ecsv=ecsv)
 
     return ntargs, fn
 
 
+def _mtl_header_dict(header):
+    """Convert a header to a dictionary of YAML-friendly values.
+
+    Parameters
+    ----------
+    header : :class:`dict` or `FITSHDR`
+        A header, e.g. as read from a FITS or ECSV MTL ledger.
+
+    Returns
+    -------
+    :class:`dict`
+        The keys and values in `header`, with the FITS structural
+        keywords removed and numpy types converted to Python types.
+    """
+    if header is None:
+        return {}
+    if isinstance(header, fitsio.FITSHDR):
+        header = fitsio.FITSHDR(header.records())
+        header.clean(is_table=True)
+        header = {key: header[key] for key in header.keys()}
+
+    def _pythonize(val):
+        if isinstance(val, (np.generic, np.ndarray)):
+            return val.tolist()
+        if isinstance(val, (list, tuple)):
+            return [_pythonize(v) for v in val]
+        return val
+
+    return {key: _pythonize(val) for key, val in dict(header).items()}
+
+
+def write_mtl_binary(filename, data, header=None):
+    """Write a binary, append-only, Merged Target List ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        The output file (conventionally ending in ".bin").
+    data : :class:`~numpy.ndarray`
+        The numpy structured array of data to write.
+    header : :class:`dict` or `FITSHDR`, optional
+        Header keywords and values to write to the file.
+
+    Returns
+    -------
+    Nothing, but writes the `data` to `filename`.
+
+    Notes
+    -----
+        - A binary ledger is an ASCII header followed by the fixed-width
+          records of `data`. The first line of the header is the string
+          `mtlbinmagic` and the header size in bytes. The remainder is a
+          YAML dictionary with keys "DTYPE" (a list of [name, format]
+          for each column, in numpy's notation) and "META" (the header
+          keywords). The header is padded to a multiple of 4096 bytes.
+        - The number of rows is (file size - header size) / record size,
+          so rows can be appended without updating the header. See
+          :func:`append_mtl_binary`. Use :func:`read_mtl_binary` to read.
+        - Always OVERWRITES existing files. Writes atomically.
+    """
+    # ADM store any unicode columns as (fixed-width) ASCII.
+    dt = [(col, data[col].dtype.str.replace('<U', 'S').replace('>U', 'S'))
+          for col in data.dtype.names]
+    if np.dtype(dt) != data.dtype:
+        outdata = np.empty(len(data), dtype=dt)
+        for col in data.dtype.names:
+            outdata[col] = data[col]
+        data = outdata
+
+    hdr = {"DTYPE": [list(d) for d in data.dtype.descr],
+           "META": _mtl_header_dict(header)}
+    text = yaml.safe_dump(hdr, default_flow_style=None, sort_keys=False)
+
+    # ADM the first line records the (padded) size of the header.
+    firstlen = len(mtlbinmagic) + 12
+    hdrsize = firstlen + len(text) + 1
+    hdrsize = _mtlbinblock * ((hdrsize + _mtlbinblock - 1) // _mtlbinblock)
+    first = "{} {:10d}\n".format(mtlbinmagic, hdrsize)
+    hdrstr = (first + text).ljust(hdrsize - 1) + "\n"
+
+    with open(filename+'.tmp', 'wb') as f:
+        f.write(hdrstr.encode('ascii'))
+        f.write(data.tobytes())
+    os.rename(filename+'.tmp', filename)
+
+    return
+
+
+def append_mtl_binary(filename, data):
+    """Append rows to a binary Merged Target List ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        A binary ledger, as made by :func:`write_mtl_binary`.
+    data : :class:`~numpy.ndarray`
+        The rows to append. Must have the same columns as the ledger
+        but can have different formats (e.g. unicode strings).
+
+    Returns
+    -------
+    :class:`int`
+        The row number in `filename` of the first row of `data`.
+
+    Notes
+    -----
+        - Only the new rows are written, regardless of ledger size.
+        - A trailing partial row (e.g. from a process that died while
+          appending) is truncated, with a warning, before appending.
+    """
+    _, dt, hdrsize = _read_mtl_binary_layout(filename)
+
+    # ADM check the columns are as expected.
+    if set(data.dtype.names) != set(dt.names):
+        msg = "columns in data ({}) don't match ledger {} ({})".format(
+            data.dtype.names, filename, dt.names)
+        log.critical(msg)
+        raise ValueError(msg)
+
+    # ADM convert to the format of the records in the ledger.
+    recs = np.empty(len(data), dtype=dt)
+    for col in dt.names:
+        recs[col] = data[col]
+
+    with open(filename, 'r+b') as f:
+        nbytes = f.seek(0, os.SEEK_END) - hdrsize
+        partial = nbytes % dt.itemsize
+        if partial != 0:
+            log.warning("Truncating partial row ({} bytes) in {}".format(
+                partial, filename))
+            f.truncate(hdrsize + nbytes - partial)
+            f.seek(0, os.SEEK_END)
+        f.write(recs.tobytes())
+
+    return nbytes // dt.itemsize
+
+
 def write_in_chunks(filename, data, nchunks, extname=None, header=None):
     """Write a FITS file in chunks to save memory.
 
@@ -1091,7 +1586,8 @@ def write_skies(targdir, data, indir=None, indir2=None, supp=False,
     # ADM create necessary directories, if they don't exist.
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    write_with_units(filename, data, extname='SKY_TARGETS', header=hdr)
+    write_with_units(filename, data, extname='SKY_TARGETS', header=hdr,
+                     hpxidx=True)
 
     return len(data), filename
 
@@ -1192,7 +1688,8 @@ def write_gfas(targdir, data, indir=None, indir2=None, nside=None,
     # ADM create necessary directories, if they don't exist.
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    write_with_units(filename, data, extname='GFA_TARGETS', header=hdr)
+    write_with_units(filename, data, extname='GFA_TARGETS', header=hdr,
+                     hpxidx=True)
 
     return len(data), filename
 
@@ -1326,7 +1823,8 @@ def write_randoms(targdir, data, indir=None, hdr=None, nside=None, supp=False,
     # ADM create necessary directories, if they don't exist.
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-    write_with_units(filename, data, extname='RANDOMS', header=hdr)
+    write_with_units(filename, data, extname='RANDOMS', header=hdr,
+                     hpxidx=True)
 
     return nrands, filename
 
@@ -2169,7 +2667,7 @@ def find_target_files(targdir, dr='X', flavor="targets", survey="main",
     return fn
 
 
-def read_mtl_ledger(filename, unique=True):
+def read_mtl_ledger(filename, unique=True, header=False):
     """Wrapper to read individual MTL ledger files.
 
     Parameters
@@ -2177,61 +2675,456 @@ def read_mtl_ledger(filename, unique=True):
     filename : :class:`str`
         Name of a ledger file containing a Merged Target List. If the
         filename contains ".ecsv" then it will be read as an ECSV file.
-        If it contains ".fits" then it will be read as a FITS file.
+        If it contains ".fits" then it will be read as a FITS file. If
+        it contains ".bin" it will be read as a binary ledger (see
+        :func:`write_mtl_binary`).
     unique : :class:`bool`, optional, defaults to ``True``
         If ``True`` then only read targets with unique `TARGETID`, where
         the last occurrence of the target in the ledger is the one that
         is retained. If ``False`` then read the entire ledger.
+    header : :class:`bool`, optional, defaults to ``False``
+        If ``True`` then also return the header of the ledger.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        A structured numpy array of the MTL. For a binary ledger with
+        `unique` ``False`` this is a read-only memory map of the file.
+    :class:`dict` or `FITSHDR`
+        The header of the ledger. Only returned if `header` is ``True``.
+
+    Notes
+    -----
+        - If `unique` is ``True`` and `filename` has an up-to-date
+          latest-state index (see :func:`write_mtl_index`) then only the
+          latest entry for each target is read from the ledger.
+    """
+    # ADM if there's an up-to-date index, only read the latest entries.
+    index = None
+    if unique:
+        index = read_mtl_index(filename)
+
+    if index is None or len(index) == 0:
+        mtl, hdr = _read_mtl_ledger_rows(filename)
+        if unique:
+            # ADM the reverse is because np.unique retains the FIRST
+            # ADM unique entry and we want the LAST unique entry.
+            mtl = np.flip(mtl)
+            _, ii = np.unique(mtl["TARGETID"], return_index=True)
+            mtl = mtl[ii]
+    else:
+        mtl, hdr = _read_mtl_ledger_rows(filename, offsets=index["OFFSET"])
+
+    if header:
+        return mtl, hdr
+    return mtl
+
+
+def _read_mtl_ledger_rows(filename, offsets=None):
+    """Read the rows of an MTL ledger (see :func:`read_mtl_ledger`).
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a ledger file containing a Merged Target List.
+    offsets : :class:`~numpy.ndarray`, optional
+        Only read the rows at these offsets (row numbers for FITS and
+        binary ledgers, byte offsets for ECSV ledgers, as for
+        :func:`make_mtl_index`), in this order. Defaults to all rows.
 
     Returns
     -------
     :class:`~numpy.ndarray`
         A structured numpy array of the MTL.
+    :class:`dict` or `FITSHDR`
+        The header of the ledger.
     """
+    # ADM read the rows in file order, then return them in the
+    # ADM order that was requested.
+    if offsets is not None:
+        ii = np.argsort(offsets)
+        offsets = offsets[ii]
+
     if ".ecsv" in filename:
-        # ADM infer the column names and types (for the dtype).
-        # ADM (this snippet is much quicker than a Table read).
+        # ADM infer the column names and types (for the dtype) from the
+        # ADM YAML header (this is much quicker than a Table read).
         from desitarget.mtl import mtldatamodel as mtldm
+        ecsvhdr = _read_ecsv_header(filename)
         names, forms = [], []
-        with open(filename) as f:
-            for line in f:
-                if "name" in line:
-                    l = line.split()
-                    name, form = l[3][:-1], l[5][:-1]
-                    names.append(name)
-                    if 'string' in form:
-                        forms.append(mtldm[name].dtype.str)
-                    else:
-                        forms.append(form)
-                elif '#' not in line:
-                    break
+        for col in ecsvhdr["datatype"]:
+            names.append(col["name"])
+            if 'string' in col["datatype"]:
+                forms.append(mtldm[col["name"]].dtype.str)
+            else:
+                forms.append(col["datatype"])
         dt = list(zip(names, forms))
-        # ADM pandas seems the quickest way to read .csv-like files.
-        # ADM it's ~1.5x faster than the basic Table read, but isn't
-        # ADM generally supported in the desihub codebase.
-#        prelim = pd.read_csv(filename, dtype=dt, comment="#", delimiter=" ")
-        # ADM faster for astropy 4; although pandas is still faster.
-#        prelim = Table.read(filename, comment="#", delimiter=" ", format='pandas.csv', dtype=dt)
-        prelim = Table.read(filename, comment='#', format='ascii.basic',
-                            guess=False)
-        mtl = np.zeros(len(prelim), dtype=dt)
-        for col in prelim.columns:
-            mtl[col] = prelim[col]
+        hdr = ecsvhdr["meta"]
+        if offsets is None:
+            with open(filename) as f:
+                # ADM skip the YAML header and the line of column names.
+                for line in f:
+                    if line[0] != '#':
+                        break
+                mtl = _read_ecsv_rows(f, dt)
+        else:
+            # ADM seek to each requested line in the ledger.
+            lines = []
+            with open(filename, 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    lines.append(f.readline().decode())
+            mtl = _read_ecsv_rows(lines, dt)
     elif ".fits" in filename:
-        mtl = fitsio.read(filename, extension="MTL")
+        mtl, hdr = fitsio.read(filename, extension="MTL", rows=offsets,
+                               header=True)
+    elif ".bin" in filename:
+        mtl, hdr = read_mtl_binary(filename, header=True)
+        if offsets is not None:
+            mtl = mtl[offsets]
     else:
-        msg = "File not parsed ({}). Should be .fits or .ecsv".format(filename)
+        msg = "File not parsed ({}). Should be .fits, .ecsv or .bin".format(
+            filename)
         log.error(msg)
         raise IOError(msg)
 
-    if unique:
-        # ADM the reverse is because np.unique retains the FIRST unique
-        # ADM entry and we want the LAST unique entry.
-        mtl = np.flip(mtl)
-        _, ii = np.unique(mtl["TARGETID"], return_index=True)
-        return mtl[ii]
+    if offsets is not None:
+        done = np.empty_like(mtl)
+        done[ii] = mtl
+        mtl = done
+
+    return mtl, hdr
+
+
+def mtl_index_filename(filename):
+    """The name of the latest-state index file for an MTL ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a ledger file containing a Merged Target List.
+
+    Returns
+    -------
+    :class:`str`
+        The name of the index file (`filename` appended by ".idx").
+    """
+    return filename + ".idx"
+
+
+def make_mtl_index(filename, targetid=None):
+    """Make a latest-state index for an MTL ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a ledger file containing a Merged Target List.
+    targetid : :class:`~numpy.ndarray`, optional
+        The TARGETID of every row in `filename`, in order. If not passed
+        then the full ledger is read to retrieve TARGETIDs.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        An array with columns ``TARGETID`` and ``OFFSET``, sorted by
+        ``TARGETID``, where ``OFFSET`` points to the latest entry for
+        each TARGETID in `filename`. ``OFFSET`` is the row number for
+        FITS and binary ledgers and the byte offset of the row for ECSV
+        ledgers.
+    """
+    if targetid is None:
+        mtl, _ = _read_mtl_ledger_rows(filename)
+        targetid = mtl["TARGETID"]
+
+    if ".ecsv" in filename:
+        # ADM find the start of each row after the ECSV header and the
+        # ADM line of column names (this doesn't need to parse the rows).
+        with open(filename, 'rb') as f:
+            line = f.readline()
+            while line[:1] == b'#':
+                line = f.readline()
+            start = f.tell()
+            rows = np.frombuffer(f.read(), dtype='u1')
+        newlines = np.flatnonzero(rows == ord('\n'))
+        offsets = start + np.concatenate([[0], newlines[:-1] + 1])
+    else:
+        offsets = np.arange(len(targetid))
+
+    if len(offsets) != len(targetid):
+        msg = "{} rows in {} but {} TARGETIDs were passed".format(
+            len(offsets), filename, len(targetid))
+        log.critical(msg)
+        raise ValueError(msg)
+
+    index = np.zeros(len(targetid), dtype=mtlindexdatamodel.dtype)
+    index["TARGETID"] = targetid
+    index["OFFSET"] = offsets
+
+    return _latest_in_index(index)
+
+
+def _latest_in_index(index):
+    """Retain the last entry for each TARGETID in an index, sorted by TARGETID.
+    """
+    ii = np.argsort(index["TARGETID"], kind="stable")
+    index = index[ii]
+    last = np.ones(len(index), dtype='?')
+    last[:-1] = index["TARGETID"][1:] != index["TARGETID"][:-1]
+
+    return index[last]
+
+
+def _mtl_ledger_state(filename):
+    """The size, length and modification time of an MTL ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a ledger file containing a Merged Target List.
+
+    Returns
+    -------
+    :class:`dict`
+        The index header keywords that must match for an index to be
+        up-to-date: ``LEDGERSZ`` (the size of `filename` in bytes),
+        ``LEDGERNR`` (the number of rows for FITS and binary ledgers, and
+        the number of bytes for ECSV ledgers) and ``LEDGERMT`` (the
+        modification time of `filename` in nanoseconds).
+    """
+    stat = os.stat(filename)
+    if ".fits" in filename:
+        with fitsio.FITS(filename) as fx:
+            nrows = fx["MTL"].get_nrows()
+    elif ".bin" in filename:
+        _, dt, hdrsize = _read_mtl_binary_layout(filename)
+        nrows = (stat.st_size - hdrsize) // dt.itemsize
+    else:
+        nrows = stat.st_size
+
+    return {"LEDGERSZ": stat.st_size, "LEDGERNR": nrows,
+            "LEDGERMT": stat.st_mtime_ns}
+
+
+def write_mtl_index(filename, index=None, targetid=None, offsets=None):
+    """Write, or incrementally update, the latest-state index for a ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a ledger file containing a Merged Target List.
+    index : :class:`~numpy.ndarray`, optional
+        An index as made by :func:`make_mtl_index`. If not passed then
+        the index is made from scratch from the rows in `filename`.
+    targetid : :class:`~numpy.ndarray`, optional
+        TARGETIDs of rows that were added to `filename` after `index`
+        was made. Only used if `index` is passed.
+    offsets : :class:`~numpy.ndarray`, optional
+        Offsets (see :func:`make_mtl_index`) of the rows in `targetid`.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The index that was written to :func:`mtl_index_filename`.
+
+    Notes
+    -----
+        - The index header records the size, number of rows and
+          modification time of `filename` (see :func:`_mtl_ledger_state`),
+          so if the ledger is subsequently changed without updating the
+          index then :func:`read_mtl_index` will ignore the (stale) index.
+          The size alone isn't enough, as FITS files are padded to blocks
+          of 2880 bytes.
+        - Writes atomically. The cost of an update scales with the number
+          of unique targets, not with the length of the ledger.
+    """
+    if index is None:
+        index = make_mtl_index(filename)
+    elif targetid is not None:
+        new = np.zeros(len(targetid), dtype=mtlindexdatamodel.dtype)
+        new["TARGETID"] = targetid
+        new["OFFSET"] = offsets
+        index = _latest_in_index(np.concatenate([index, new]))
+
+    hdr = _mtl_ledger_state(filename)
+    idxfn = mtl_index_filename(filename)
+    fitsio.write(idxfn+'.tmp', index, extname='MTLIDX', header=hdr,
+                 clobber=True)
+    os.rename(idxfn+'.tmp', idxfn)
+
+    return index
+
+
+def read_mtl_index(filename):
+    """Read the latest-state index for an MTL ledger, if it's up-to-date.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Name of a ledger file containing a Merged Target List.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray` or `None`
+        The index (see :func:`make_mtl_index`) or ``None`` if `filename`
+        doesn't have an index or if `filename` has changed since the
+        index was written.
+    """
+    idxfn = mtl_index_filename(filename)
+    if not os.path.exists(idxfn):
+        return None
+
+    index, hdr = fitsio.read(idxfn, extname='MTLIDX', header=True)
+    state = _mtl_ledger_state(filename)
+    if any(key not in hdr or hdr[key] != state[key] for key in state):
+        log.warning("Ignoring out-of-date index {}".format(idxfn))
+        return None
+
+    return index
+
+
+def _read_ecsv_header(filename):
+    """Parse the YAML header of an ECSV file without reading the data.
+    """
+    hdrlines = []
+    with open(filename) as f:
+        for line in f:
+            if line[0] != '#':
+                break
+            if '%ECSV' not in line:
+                hdrlines.append(line[2:])
+    ecsvhdr = yaml.load("".join(hdrlines), Loader=_yamlloader)
+    # ADM older versions of astropy write meta as an ordered map.
+    ecsvhdr["meta"] = dict(ecsvhdr.get("meta", {}))
+
+    return ecsvhdr
+
+
+def _read_ecsv_rows(rows, dt):
+    """Parse the data rows of an ECSV ledger into a structured array.
+
+    Parameters
+    ----------
+    rows : :class:`file` or :class:`list`
+        An open (text) file positioned at the first data row of an ECSV
+        ledger, or a list of data rows (as strings).
+    dt : :class:`list`
+        The data model of the ledger, with the columns in file order.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        A structured numpy array with data model `dt`.
+
+    Notes
+    -----
+        - Uses numpy's C tokenizer, which reads `rows` in chunks and
+          converts each field straight into the final data model. This
+          is ~1.7x faster than a Table read followed by a column-by-column
+          copy and has a peak memory ~6x lower for large ledgers.
+        - Strings are quoted as for a CSV file, e.g. an empty string is
+          written as "" and a string containing a space as "A B".
+        - Falls back to a Table read for numpy < 1.23, which can't parse
+          quoted strings in :func:`numpy.loadtxt`.
+    """
+    from distutils.version import LooseVersion
+    if LooseVersion(np.__version__) < LooseVersion("1.23"):
+        names = [d[0] for d in dt]
+        prelim = Table.read([" ".join(names)] + list(rows),
+                            format='ascii.basic', guess=False)
+        data = np.zeros(len(prelim), dtype=dt)
+        for col in prelim.columns:
+            # ADM empty strings are read as masked values.
+            if isinstance(prelim[col], MaskedColumn):
+                data[col] = prelim[col].filled(data[col].dtype.type())
+            else:
+                data[col] = prelim[col]
+        return data
+
+    # ADM suppress the warning about reading an empty ledger.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        data = np.loadtxt(rows, dtype=dt, delimiter=" ", quotechar='"',
+                          comments=None, ndmin=1)
+
+    return data
+
+
+def _read_mtl_binary_layout(filename):
+    """Read the header, record format and header size of a binary ledger.
+    """
+    with open(filename, 'rb') as f:
+        first = f.readline().decode('ascii')
+        words = first.split()
+        if len(words) != 2 or words[0] != mtlbinmagic:
+            msg = "{} is not a binary MTL ledger".format(filename)
+            log.error(msg)
+            raise IOError(msg)
+        hdrsize = int(words[1])
+        # ADM strip the padding, which is slow for yaml to parse.
+        hdr = yaml.load(f.read(hdrsize - len(first)).decode('ascii').rstrip(),
+                        Loader=_yamlloader)
+    dt = np.dtype([tuple(d) for d in hdr["DTYPE"]])
+
+    return hdr["META"], dt, hdrsize
+
+
+def read_mtl_binary_header(filename, dtype=False):
+    """Read the header of a binary Merged Target List ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        A binary ledger, as made by :func:`write_mtl_binary`.
+    dtype : :class:`bool`, optional, defaults to ``False``
+        If ``True``, also return the data model (dtype) of the ledger.
+
+    Returns
+    -------
+    :class:`dict`
+        The header keywords and values.
+    :class:`~numpy.dtype`
+        The dtype of the records in the ledger. Only returned if `dtype`
+        is ``True``.
+    """
+    hdr, dt, _ = _read_mtl_binary_layout(filename)
+
+    if dtype:
+        return hdr, dt
+    return hdr
+
+
+def read_mtl_binary(filename, header=False):
+    """Memory map a binary Merged Target List ledger.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        A binary ledger, as made by :func:`write_mtl_binary`.
+    header : :class:`bool`, optional, defaults to ``False``
+        If ``True`` then also return the header of the ledger.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        A read-only memory map of every row in the ledger.
+    :class:`dict`
+        The header of the ledger. Only returned if `header` is ``True``.
+
+    Notes
+    -----
+        - Any trailing partial row is ignored.
+    """
+    hdr, dt, hdrsize = _read_mtl_binary_layout(filename)
+
+    nrows = (os.path.getsize(filename) - hdrsize) // dt.itemsize
+    if nrows == 0:
+        mtl = np.zeros(0, dtype=dt)
     else:
-        return mtl
+        mtl = np.memmap(filename, dtype=dt, mode='r', offset=hdrsize,
+                        shape=(nrows,))
+
+    if header:
+        return mtl, hdr
+    return mtl
 
 
 def read_target_files(filename, columns=None, rows=None, header=False,
@@ -2261,7 +3154,8 @@ def read_target_files(filename, columns=None, rows=None, header=False,
     targtypes = "TARGETS", "GFA_TARGETS", "SKY_TARGETS", "MASKS", "MTL"
     # ADM read in the FITS extention info.
     f = fitsio.FITS(filename)
-    if len(f) != 2:
+    # ADM a (third) HEALPixel index extension is allowed.
+    if len(f) != 2 and not (len(f) == 3 and "HPXIDX" in f):
         log.info(f)
         msg = "targeting files should only have 2 extensions?!"
         log.error(msg)
@@ -2310,6 +3204,13 @@ def read_keyword_from_mtl_header(hpdirname, keyword):
     :class:`str`
         The value of `keyword` from the header of `hpdirname` if it is a
         file, or the value from the first file encountered in `hpdirname`
+
+    Notes
+    -----
+        - Values from ECSV and binary ledgers are always strings (the
+          YAML headers of these ledgers are typed, but, e.g., DR was
+          always returned as a string for ECSV ledgers). Values from
+          FITS ledgers have the type of the FITS header value.
     """
     # ADM for FITS files, our standard targets header-read will work.
     try:
@@ -2319,19 +3220,26 @@ def read_keyword_from_mtl_header(hpdirname, keyword):
         return kw
     except OSError:
         if os.path.isdir(hpdirname):
-            try:
-                gen = iglob(os.path.join(hpdirname, '*ecsv'))
-                hpdirname = next(gen)
-            except StopIteration:
-                msg = "no FITS or ECSV files in {}...?!".format(hpdirname)
+            for ender in "ecsv", "bin":
+                try:
+                    gen = iglob(os.path.join(hpdirname, '*{}'.format(ender)))
+                    hpdirname = next(gen)
+                    break
+                except StopIteration:
+                    pass
+            else:
+                msg = "no FITS, ECSV or binary files in {}...?!".format(
+                    hpdirname)
                 log.info(msg)
 
+    # ADM binary ledgers have a YAML header that can be read directly.
+    if ".bin" in hpdirname:
+        kw = read_mtl_binary_header(hpdirname)[keyword]
     # ADM this (rapidly) reads a single keyword from an ecsv file.
-    with open(hpdirname) as f:
-        for line in f:
-            if keyword in line and 'name' not in line:
-                break
-        return line.split(": ")[-1].split("}")[0]
+    else:
+        kw = _read_ecsv_header(hpdirname)["meta"][keyword]
+
+    return str(kw).rstrip()
 
 
 def find_mtl_file_format_from_header(hpdirname, returnoc=False):
@@ -2359,14 +3267,26 @@ def find_mtl_file_format_from_header(hpdirname, returnoc=False):
 
     Notes
     -----
-        - Should work for both .ecsv and .fits files.
+        - Should work for .ecsv, .fits and binary (.bin) files.
+        - The file format is that of the ledgers in `hpdirname` (e.g.
+          after :func:`desitarget.mtl.convert_ledger`). The format from
+          $MTL_LEDGER_FORMAT is only used if `hpdirname` has ledgers in
+          that format, or has no ledgers.
     """
     # ADM grab information from the target directory.
     dr = read_keyword_from_mtl_header(hpdirname, "DR")
     surv = read_keyword_from_mtl_header(hpdirname, "SURVEY")
     oc = read_keyword_from_mtl_header(hpdirname, "OBSCON")
-    from desitarget.mtl import get_mtl_ledger_format
+    from desitarget.mtl import get_mtl_ledger_format, ledgerformats
     ender = get_mtl_ledger_format()
+    # ADM use the format of the ledgers that are actually in hpdirname.
+    if os.path.isdir(hpdirname):
+        found = [form for form in ledgerformats if next(
+            iglob(os.path.join(hpdirname, '*.{}'.format(form))), None)]
+        if len(found) > 0 and ender not in found:
+            ender = found[0]
+    elif os.path.splitext(hpdirname)[-1][1:] in ledgerformats:
+        ender = os.path.splitext(hpdirname)[-1][1:]
 
     # ADM construct the full directory path.
     hugefn = find_target_files(hpdirname, flavor="mtl", hp="{}", dr=dr,
@@ -2378,7 +3298,87 @@ def find_mtl_file_format_from_header(hpdirname, returnoc=False):
     return fileform
 
 
-def read_mtl_in_hp(hpdirname, nside, pixlist, unique=True, returnfn=False):
+def _read_files_in_hp(filenames, reader, nside, pixlist, dtype=None,
+                      nrows=None, numproc=1):
+    """Read files (in parallel), restricting each to a set of HEALPixels.
+
+    Parameters
+    ----------
+    filenames : :class:`list`
+        The files to read.
+    reader : :class:`function`
+        Function that reads a filename into a structured array that
+        includes the columns `RA` and `DEC`.
+    nside : :class:`int`
+        The (NESTED) HEALPixel nside.
+    pixlist : :class:`list` or `int` or `~numpy.ndarray`
+        Only retain rows in these HEALPixels at the passed `nside`.
+    dtype : :class:`~numpy.dtype`, optional
+        The data model returned by `reader`. Must be passed if `nrows`
+        is passed.
+    nrows : :class:`list`, optional
+        The (maximum) number of rows returned by `reader` for each of
+        `filenames` (e.g. NAXIS2 from each file's header). If passed,
+        each file is read straight into a preallocated (shared) output
+        array. If not passed, the rows from each file are returned to
+        the main process and concatenated.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of files to read concurrently.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The rows in `pixlist` from each of `filenames`, concatenated in
+        the order of `filenames`.
+    :class:`list`
+        The files that exist, in the order of `filenames`. Missing files
+        are skipped.
+    """
+    # ADM preallocate the output if the number of rows is known.
+    if nrows is not None:
+        starts = np.append(0, np.cumsum(nrows, dtype="int64"))
+        if numproc > 1:
+            done = sharedmem.empty(starts[-1], dtype=dtype)
+        else:
+            done = np.empty(starts[-1], dtype=dtype)
+
+    # ADM the common function that is actually parallelized across.
+    def _read_file_in_hp(i):
+        """read filenames[i] and restrict it to the pixels in pixlist"""
+        try:
+            data = reader(filenames[i])
+        except FileNotFoundError:
+            return i, None
+        # ADM applying the pixel cut per-file limits memory usage.
+        data = data[is_in_hp(data, nside, pixlist)]
+        if nrows is None:
+            return i, data
+        done[starts[i]:starts[i]+len(data)] = data
+        return i, len(data)
+
+    if numproc > 1:
+        pool = sharedmem.MapReduce(np=numproc)
+        with pool:
+            results = pool.map(_read_file_in_hp, np.arange(len(filenames)),
+                               reduce=lambda i, data: (i, data))
+    else:
+        results = [_read_file_in_hp(i) for i in range(len(filenames))]
+
+    results = sorted([r for r in results if r[1] is not None],
+                     key=lambda r: r[0])
+    fns = [filenames[i] for i, _ in results]
+    if nrows is None:
+        return np.concatenate([data for _, data in results]), fns
+
+    # ADM gather the rows that were retained from each file.
+    ii = np.concatenate([np.arange(starts[i], starts[i]+nkept)
+                         for i, nkept in results] + [np.zeros(0, dtype=int)])
+
+    return done[ii], fns
+
+
+def read_mtl_in_hp(hpdirname, nside, pixlist, unique=True, returnfn=False,
+                   numproc=1):
     """Read Merged Target List ledgers in a set of HEALPixels.
 
     Parameters
@@ -2399,6 +3399,8 @@ def read_mtl_in_hp(hpdirname, nside, pixlist, unique=True, returnfn=False):
     returnfn : :class:`bool`, optional, defaults to ``False``
         If ``True`` then also return a dictionary of the filename
         that had to be read in each pixel to retrieve the MTL(s).
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of ledgers to read concurrently.
 
     Returns
     -------
@@ -2426,35 +3428,29 @@ def read_mtl_in_hp(hpdirname, nside, pixlist, unique=True, returnfn=False):
         filepixlist = nside2nside(nside, filenside, pixlist)
 
         # ADM read in the files and concatenate the resulting targets.
-        mtls = []
-        outfns = {}
-        for pix in filepixlist:
-            fn = fileform.format(pix)
-            try:
-                targs = read_mtl_ledger(fn, unique=unique)
-                mtls.append(targs)
-                outfns[pix] = fn
-            except FileNotFoundError:
-                pass
+        fns = [fileform.format(pix) for pix in filepixlist]
+        mtl, readfns = _read_files_in_hp(
+            fns, lambda fn: read_mtl_ledger(fn, unique=unique),
+            nside, pixlist, numproc=numproc)
+        outfns = {pix: fn for pix, fn in zip(filepixlist, fns)
+                  if fn in readfns}
 
         # ADM if no mtls, look up the data model, return an empty array.
-        if len(mtls) == 0:
-            fns = iglob(os.path.join(hpdirname, '*.{}'.format(ender)))
+        if len(readfns) == 0:
+            ender = os.path.splitext(fileform)[-1]
+            fns = iglob(os.path.join(hpdirname, '*{}'.format(ender)))
             fn = next(fns)
             mtl = read_mtl_ledger(fn)
             outly = np.zeros(0, dtype=mtl.dtype)
             if returnfn:
                 return outly, outfns
             return outly
-
-        mtl = np.concatenate(mtls)
-    # ADM ...if a directory wasn't passed, just read in the targets.
+    # ADM ...if a directory wasn't passed, just read in the targets...
     else:
         mtl = read_mtl_ledger(hpdirname, unique=unique)
-
-    # ADM restrict the targets to the actual requested HEALPixels...
-    ii = is_in_hp(mtl, nside, pixlist)
-    mtl = mtl[ii]
+        # ADM ...and restrict them to the requested HEALPixels.
+        ii = is_in_hp(mtl, nside, pixlist)
+        mtl = mtl[ii]
 
     if returnfn:
         return mtl, outfns
@@ -2463,7 +3459,7 @@ def read_mtl_in_hp(hpdirname, nside, pixlist, unique=True, returnfn=False):
 
 def read_targets_in_hp(hpdirname, nside, pixlist, columns=None,
                        header=False, downsample=None, verbose=False,
-                       mtl=False, unique=True):
+                       mtl=False, unique=True, numproc=1):
     """Read in targets in a set of HEALPixels.
 
     Parameters
@@ -2495,6 +3491,8 @@ def read_targets_in_hp(hpdirname, nside, pixlist, columns=None,
     unique : :class:`bool`, optional, defaults to ``True``
         If ``True`` then only read targets with unique `TARGETID` from
         MTL ledgers. Only used if `mtl` is ``True``.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of files to read concurrently.
 
     Returns
     -------
@@ -2511,7 +3509,8 @@ def read_targets_in_hp(hpdirname, nside, pixlist, columns=None,
           read_mtl_in_hp().
     """
     if mtl:
-        return read_mtl_in_hp(hpdirname, nside, pixlist, unique=unique)
+        return read_mtl_in_hp(hpdirname, nside, pixlist, unique=unique,
+                              numproc=numproc)
 
     # ADM allow an integer instead of a list to be passed.
     if isinstance(pixlist, int):
@@ -2548,31 +3547,48 @@ def read_targets_in_hp(hpdirname, nside, pixlist, columns=None,
         filepixlist = filepixlist[isindict]
 
         # ADM make sure each file is only read once.
-        infiles = set([filedict[pix] for pix in filepixlist])
+        infiles = sorted(set([filedict[pix] for pix in filepixlist]))
 
-        # ADM read in the files and concatenate the resulting targets.
-        targets = []
-        for infile in infiles:
-            targs, hdr = read_target_files(
-                infile, columns=columnscopy, header=True,
-                downsample=downsample, verbose=verbose)
-            targets.append(targs)
-        # ADM if targets is empty, return no targets.
-        if len(targets) == 0:
+        # ADM if there are no files, return no targets.
+        if len(infiles) == 0:
             if header:
                 return notargs, nohdr
             else:
                 return notargs
-        targets = np.concatenate(targets)
-    # ADM ...otherwise just read in the targets.
+
+        # ADM the headers give the (maximum) number of rows in each
+        # ADM file, so that the files can be read into one array. If a
+        # ADM file has a HEALPixel index, only read the needed rows.
+        nrows, rowdict = [], {}
+        for infile in infiles:
+            with fitsio.FITS(infile) as fx:
+                hdr = fx[1].read_header()
+                rowdict[infile] = None
+                if "HPXIDX" in fx and downsample is None:
+                    rowdict[infile] = hpx_index_rows(
+                        fx["HPXIDX"].read(),
+                        fx["HPXIDX"].read_header()["HPXNSIDE"], nside, pixlist)
+            nrows.append(hdr["NAXIS2"] if rowdict[infile] is None
+                         else len(rowdict[infile]))
+        # ADM no need to open files that don't contain any needed rows.
+        infiles = [fn for fn, n in zip(infiles, nrows) if n > 0]
+        nrows = [n for n in nrows if n > 0]
+
+        # ADM read in the files, restricted to the requested pixels.
+        targets, _ = _read_files_in_hp(
+            infiles, lambda fn: read_target_files(
+                fn, columns=columnscopy, rows=rowdict[fn],
+                downsample=downsample, verbose=verbose),
+            nside, pixlist, dtype=notargs.dtype, nrows=nrows,
+            numproc=numproc)
+    # ADM ...otherwise just read in the targets...
     else:
         targets, hdr = read_target_files(
             hpdirname, columns=columnscopy, header=True,
             downsample=downsample, verbose=verbose)
-
-    # ADM restrict the targets to the actual requested HEALPixels...
-    ii = is_in_hp(targets, nside, pixlist)
-    targets = targets[ii]
+        # ADM ...and restrict them to the requested HEALPixels.
+        ii = is_in_hp(targets, nside, pixlist)
+        targets = targets[ii]
 
     # ADM ...and remove RA/Dec columns if we added them.
     if len(addedcols) > 0:
@@ -2584,7 +3600,7 @@ def read_targets_in_hp(hpdirname, nside, pixlist, columns=None,
 
 
 def read_targets_in_tiles(hpdirname, tiles=None, columns=None,
-                          header=False, mtl=False, unique=True):
+                          header=False, mtl=False, unique=True, numproc=1):
     """
     Parameters
     ----------
@@ -2608,6 +3624,8 @@ def read_targets_in_tiles(hpdirname, tiles=None, columns=None,
     unique : :class:`bool`, optional, defaults to ``True``
         If ``True`` then only read targets with unique `TARGETID` from
         MTL ledgers. Only used if `mtl` is ``True``.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of files to read concurrently.
 
     Returns
     -------
@@ -2654,7 +3672,7 @@ def read_targets_in_tiles(hpdirname, tiles=None, columns=None,
         # ADM read in targets in these HEALPixels.
         targets = read_targets_in_hp(hpdirname, nside, pixlist,
                                      columns=columnscopy, header=header,
-                                     mtl=mtl, unique=unique)
+                                     mtl=mtl, unique=unique, numproc=numproc)
     # ADM ...otherwise just read in the targets.
     else:
         targets = read_target_files(hpdirname, columns=columnscopy,
@@ -2680,7 +3698,7 @@ def read_targets_in_tiles(hpdirname, tiles=None, columns=None,
 
 def read_targets_in_box(hpdirname, radecbox=[0., 360., -90., 90.],
                         columns=None, header=False, downsample=None,
-                        mtl=False, unique=True):
+                        mtl=False, unique=True, numproc=1):
     """Read in targets in an RA/Dec box.
 
     Parameters
@@ -2709,6 +3727,8 @@ def read_targets_in_box(hpdirname, radecbox=[0., 360., -90., 90.],
     unique : :class:`bool`, optional, defaults to ``True``
         If ``True`` then only read targets with unique `TARGETID` from
         MTL ledgers. Only used if `mtl` is ``True``.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of files to read concurrently.
 
     Returns
     -------
@@ -2740,7 +3760,8 @@ def read_targets_in_box(hpdirname, radecbox=[0., 360., -90., 90.],
         # ADM read in targets in these HEALPixels.
         targets = read_targets_in_hp(hpdirname, nside, pixlist, mtl=mtl,
                                      columns=columnscopy, header=header,
-                                     downsample=downsample, unique=unique)
+                                     downsample=downsample, unique=unique,
+                                     numproc=numproc)
     # ADM ...otherwise just read in the targets.
     else:
         targets = read_target_files(hpdirname, columns=columnscopy,
@@ -2764,7 +3785,7 @@ def read_targets_in_box(hpdirname, radecbox=[0., 360., -90., 90.],
 
 
 def read_targets_in_cap(hpdirname, radecrad, columns=None,
-                        mtl=False, unique=True):
+                        mtl=False, unique=True, numproc=1):
     """Read in targets in an RA, Dec, radius cap.
 
     Parameters
@@ -2786,6 +3807,8 @@ def read_targets_in_cap(hpdirname, radecrad, columns=None,
     unique : :class:`bool`, optional, defaults to ``True``
         If ``True`` then only read targets with unique `TARGETID` from
         MTL ledgers. Only used if `mtl` is ``True``.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        The number of files to read concurrently.
 
     Returns
     -------
@@ -2813,7 +3836,8 @@ def read_targets_in_cap(hpdirname, radecrad, columns=None,
 
         # ADM read in targets in these HEALPixels.
         targets = read_targets_in_hp(hpdirname, nside, pixlist, mtl=mtl,
-                                     columns=columnscopy, unique=unique)
+                                     columns=columnscopy, unique=unique,
+                                     numproc=numproc)
     # ADM ...otherwise just read in the targets.
     else:
         targets = read_target_files(hpdirname, columns=columnscopy)
@@ -12,6 +12,7 @@ import numpy.lib.recfunctions as rfn
 import sys
 from astropy.table import Table
 from astropy.io import ascii
+from io import StringIO
 import fitsio
 from time import time
 from datetime import datetime
@@ -21,6 +22,7 @@ from desitarget.targetmask import obsmask, obsconditions
 from desitarget.targets import calc_priority, calc_numobs_more
 from desitarget.targets import main_cmx_or_sv, switch_main_cmx_or_sv
 from desitarget.targets import set_obsconditions
+from desitarget.geomask import match_to
 from desitarget.internal import sharedmem
 from desitarget import io
 
@@ -42,6 +44,9 @@ mtldatamodel = np.array([], dtype=[
     ('TIMESTAMP', 'S19'), ('VERSION', 'S14'), ('TARGET_STATE', 'S15')
     ])
 
+# ADM the allowed file formats for MTL ledgers.
+ledgerformats = ["ecsv", "fits", "bin"]
+
 # ADM when using basic or csv ascii writes, specifying the formats of
 # ADM float32 columns can make things easier on the eye.
 mtlformatdict = {"PARALLAX": '%16.8f', 'PMRA': '%16.8f', 'PMDEC': '%16.8f'}
@@ -87,10 +92,21 @@ def get_mtl_ledger_format():
     Returns
     -------
     :class:`str`
-        The file format for MTL ledgers. Should be "ecsv" or "fits".
+        The file format for MTL ledgers. Should be "ecsv", "fits" or
+        "bin" (see :func:`desitarget.io.write_mtl_binary`).
+
+    Notes
+    -----
+        - Defaults to "ecsv" but can be overridden by setting the
+          $MTL_LEDGER_FORMAT environment variable.
     """
     # ff = "fits"
-    ff = "ecsv"
+    ff = os.environ.get('MTL_LEDGER_FORMAT', "ecsv")
+    if ff not in ledgerformats:
+        msg = "$MTL_LEDGER_FORMAT is {} but must be one of {}".format(
+            ff, ledgerformats)
+        log.critical(msg)
+        raise ValueError(msg)
 
     return ff
 
@@ -176,24 +192,21 @@ def make_mtl(targets, obscon, zcat=None, scnd=None,
         is_scnd[-nrows:] = True
         log.info('Done with padding...t={:.1f}s'.format(time()-start))
 
-    # Trim targets from zcat that aren't in original targets table.
+    # ADM if a redshift catalog was passed, look up the index of the
+    # ADM input target that matches each zcat entry on 'TARGETID'.
     if zcat is not None:
-        ok = np.in1d(zcat['TARGETID'], targets['TARGETID'])
+        zmatcher = match_to(targets["TARGETID"], zcat["TARGETID"])
+        # Trim targets from zcat that aren't in original targets table.
+        ok = zmatcher >= 0
         num_extra = np.count_nonzero(~ok)
         if num_extra > 0:
             log.warning("Ignoring {} zcat entries that aren't "
                         "in the input target list".format(num_extra))
             zcat = zcat[ok]
+            zmatcher = zmatcher[ok]
 
     n = len(targets)
-    # ADM if a redshift catalog was passed, order it to match the input targets
-    # ADM catalog on 'TARGETID'.
     if zcat is not None:
-        # ADM there might be a quicker way to do this?
-        # ADM set up a dictionary of the indexes of each target id.
-        d = dict(tuple(zip(targets["TARGETID"], np.arange(n))))
-        # ADM loop through the zcat and look-up the index in the dictionary.
-        zmatcher = np.array([d[tid] for tid in zcat["TARGETID"]])
         ztargets = zcat
         if ztargets.masked:
             unobs = ztargets['NUMOBS'].mask
@@ -343,12 +356,17 @@ def make_ledger_in_hp(targets, outdirname, nside, pixlist,
 
     # ADM write the MTLs.
     _, _, survey = main_cmx_or_sv(mtl)
+    ender = get_mtl_ledger_format()
     for pix in pixlist:
         inpix = mtlpix == pix
-        ecsv = get_mtl_ledger_format() == "ecsv"
         nt, fn = io.write_mtl(
-            outdirname, mtl[inpix].as_array(), indir=indirname, ecsv=ecsv,
-            survey=survey, obscon=obscon, nsidefile=nside, hpxlist=pix)
+            outdirname, mtl[inpix].as_array(), indir=indirname,
+            ecsv=ender == "ecsv", binary=ender == "bin", survey=survey,
+            obscon=obscon, nsidefile=nside, hpxlist=pix)
+        # ADM write the latest-state index (write_mtl sorts on TARGETID).
+        if nt > 0:
+            io.write_mtl_index(fn, index=io.make_mtl_index(
+                fn, targetid=np.sort(mtl["TARGETID"][inpix])))
         if verbose:
             log.info('{} targets written to {}...t={:.1f}s'.format(
                 nt, fn, time()-t0))
@@ -455,7 +473,83 @@ def make_ledger(hpdirname, outdirname, obscon="DARK", numproc=1):
     return
 
 
-def update_ledger(hpdirname, targets, zcat, obscon="DARK"):
+def _update_ledger_in_hp(fn, mtlpix, ender):
+    """
+    Append updated targets to the ledger file for a single HEALPixel.
+
+    Parameters
+    ----------
+    fn : :class:`str`
+        The ledger file for the HEALPixel.
+    mtlpix : :class:`~numpy.ndarray`
+        Updated MTL entries in the HEALPixel, sorted by ``TARGETID``.
+    ender : :class:`str`
+        The ledger file format, one of "ecsv", "fits" or "bin".
+
+    Returns
+    -------
+    Nothing, but `fn` and its latest-state index are updated.
+
+    Notes
+    -----
+        - Raises an IOError if `fn` doesn't exist, rather than starting
+          a ledger without a header.
+        - Each update is crash-safe. FITS ledgers are rewritten via a
+          temporary file. Partial rows left in appendable (.ecsv/.bin)
+          ledgers by a process that died mid-write are truncated before
+          the next append, and the latest-state index is only trusted if
+          it matches the size, length and modification time of the ledger.
+    """
+    # ADM updates append to a ledger, so the ledger must already exist.
+    if not os.path.exists(fn):
+        msg = "Ledger {} doesn't exist; make it with make_ledger()".format(fn)
+        log.critical(msg)
+        raise IOError(msg)
+
+    # ADM the latest-state index for the ledger (before updating).
+    index = io.read_mtl_index(fn)
+
+    # ADM if we're working with .ecsv, simply append to the ledger.
+    if ender == 'ecsv':
+        # ADM write to a buffer to find the offset of each new row.
+        buf = StringIO()
+        ascii.write(Table(mtlpix), buf, format='no_header',
+                    formats=mtlformatdict)
+        rows = buf.getvalue().encode()
+        newlines = np.flatnonzero(np.frombuffer(rows, dtype='u1') == ord('\n'))
+        with open(fn, "r+b") as f:
+            # ADM truncate any partial (unterminated) final row.
+            nbytes = f.seek(0, os.SEEK_END)
+            f.seek(max(nbytes - 1, 0))
+            if f.read(1) != b'\n':
+                f.seek(0)
+                nbytes = f.read().rfind(b'\n') + 1
+                log.warning("Truncating partial row in {}".format(fn))
+                f.truncate(nbytes)
+                f.seek(nbytes)
+            f.write(rows)
+        offsets = nbytes + np.concatenate([[0], newlines[:-1] + 1])
+    # ADM binary ledgers also only need the new rows to be written.
+    elif ender == 'bin':
+        offsets = io.append_mtl_binary(fn, mtlpix)
+        offsets += np.arange(len(mtlpix))
+    # ADM otherwise, for FITS, we'll have to read in the whole file.
+    else:
+        ledger, hd = fitsio.read(fn, extname="MTL", header=True)
+        done = np.concatenate([ledger, mtlpix])
+        fitsio.write(fn+'.tmp', done, extname='MTL', header=hd, clobber=True)
+        os.rename(fn+'.tmp', fn)
+        offsets = len(ledger) + np.arange(len(mtlpix))
+
+    # ADM update the latest-state index with the new rows (or make
+    # ADM the index from scratch if it was missing or out-of-date).
+    io.write_mtl_index(fn, index=index, targetid=mtlpix["TARGETID"],
+                       offsets=offsets)
+
+    return
+
+
+def update_ledger(hpdirname, targets, zcat, obscon="DARK", numproc=1):
     """
     Update relevant HEALPixel-split ledger files for some targets.
 
@@ -476,10 +570,18 @@ def update_ledger(hpdirname, targets, zcat, obscon="DARK"):
         file (i.e. in `desitarget.targetmask.obsconditions`), e.g. "GRAY"
         Governs how priorities are set using "obsconditions". Basically a
         check on whether the files in `hpdirname` are as expected.
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        Number of processes to parallelize across. This also limits the
+        number of ledger files that are being written at any one time.
 
     Returns
     -------
     Nothing, but relevant ledger files are updated.
+
+    Notes
+    -----
+        - Logs the time taken to update each HEALPixel's ledger (at the
+          DEBUG level) and a summary (including the slowest HEALPixel).
     """
 # ADM in theory, here, fiberassign wouldn't need to carry much around at
 # ADM all. We could, instead, simply read the relevant MTL pixel-ledgers
@@ -489,6 +591,7 @@ def update_ledger(hpdirname, targets, zcat, obscon="DARK"):
 #    mtltargs, fndict = io.read_mtl_in_hp(hpdirname, nside, pixnum,
 #                                         unique=True, returnfn=True)
     # ADM then match between mtltargs and targets on TARGETID, etc.
+    t0 = time()
 
     # ADM find the general format for the ledger files in `hpdirname`.
     # ADM also returning the obsconditions.
@@ -508,36 +611,152 @@ def update_ledger(hpdirname, targets, zcat, obscon="DARK"):
     theta, phi = np.radians(90-mtl["DEC"]), np.radians(mtl["RA"])
     pixnum = hp.ang2pix(nside, theta, phi, nest=True)
 
-    # ADM loop through the pixels and update the ledger, depending
-    # ADM on whether we're working with .fits or .ecsv files.
-    ender = get_mtl_ledger_format()
-    for pix in set(pixnum):
-        # ADM grab the targets in the pixel.
-        ii = pixnum == pix
-        mtlpix = mtl[ii]
-
-        # ADM sorting on TARGETID is important for
-        # ADM io.read_mtl_ledger(unique=True)
-        mtlpix = mtlpix[np.argsort(mtlpix["TARGETID"])]
-
-        # ADM the correct filename for this pixel number.
-        fn = fileform.format(pix)
-
-        # ADM if we're working with .ecsv, simply append to the ledger.
-        if ender == 'ecsv':
-            f = open(fn, "a")
-            ascii.write(mtlpix, f, format='no_header', formats=mtlformatdict)
-            f.close()
-        # ADM otherwise, for FITS, we'll have to read in the whole file.
-        else:
-            ledger, hd = fitsio.read(fn, extname="MTL", header=True)
-            done = np.concatenate([ledger, mtlpix.as_array()])
-            fitsio.write(fn+'.tmp', done, extname='MTL', header=hd, clobber=True)
-            os.rename(fn+'.tmp', fn)
+    # ADM group the targets by HEALPixel in one pass. Sorting on
+    # ADM TARGETID within each pixel is important for
+    # ADM io.read_mtl_ledger(unique=True).
+    ii = np.lexsort((mtl["TARGETID"], pixnum))
+    mtl, pixnum = mtl.as_array()[ii], pixnum[ii]
+    pixels, starts = np.unique(pixnum, return_index=True)
+    ends = np.append(starts[1:], len(pixnum))
+
+    # ADM the file format of the ledger, i.e. .fits, .ecsv or .bin.
+    ender = os.path.splitext(fileform)[-1][1:]
+
+    # ADM the common function that is actually parallelized across.
+    def _update_ledger_in_pixel(i):
+        """update the ledger in the HEALPixel pixels[i]"""
+        start = time()
+        _update_ledger_in_hp(fileform.format(pixels[i]),
+                             mtl[starts[i]:ends[i]], ender)
+        return pixels[i], ends[i] - starts[i], time() - start
+
+    # ADM this is just to count pixels and record per-pixel latency.
+    npix = np.zeros((), dtype='i8')
+    latency = np.zeros(len(pixels), dtype='f8')
+
+    def _update_status(pix, nrows, secs):
+        """wrap key reduction operation on the main parallel process"""
+        log.debug("Updated {} targets in pixel {} in {:.3f}s".format(
+            nrows, pix, secs))
+        latency[npix] = secs
+        npix[...] += 1
+        if npix % 500 == 0:
+            log.info('{}/{} HEALPixels; {:.1f} pixels/sec...t = {:.1f}s'.format(
+                npix, len(pixels), npix/(time()-t0), time()-t0))
+        return pix, nrows, secs
+
+    # ADM Parallel process across HEALPixels.
+    if numproc > 1:
+        pool = sharedmem.MapReduce(np=numproc)
+        with pool:
+            results = pool.map(_update_ledger_in_pixel, np.arange(len(pixels)),
+                               reduce=_update_status)
+    else:
+        results = [_update_status(*_update_ledger_in_pixel(i))
+                   for i in range(len(pixels))]
+
+    if len(results) > 0:
+        slowest = max(results, key=lambda result: result[2])
+        log.info("Updated {} targets in {} HEALPixels; per-pixel latency "
+                 "median {:.3f}s, max {:.3f}s (pixel {})...t = {:.1f}s".format(
+                     len(mtl), len(pixels), np.median(latency), slowest[2],
+                     slowest[0], time()-t0))
 
     return
 
 
+def convert_ledger(hpdirname, outdirname, ender="bin", numproc=1):
+    """
+    Convert HEALPixel-split MTL ledger files to a different file format.
+
+    Parameters
+    ----------
+    hpdirname : :class:`str`
+        Full path to a directory containing an MTL ledger that has been
+        partitioned by HEALPixel (i.e. as made by `make_ledger`).
+    outdirname : :class:`str`
+        Output directory to which to write the converted ledger files.
+        The file names are the same as in `hpdirname` except for the
+        extension.
+    ender : :class:`str`, optional, defaults to "bin"
+        The output file format, one of "ecsv", "fits" or "bin".
+    numproc : :class:`int`, optional, defaults to 1 for serial
+        Number of processes to parallelize across.
+
+    Returns
+    -------
+    :class:`list`
+        The names of the files that were written.
+
+    Notes
+    -----
+        - The full history of each ledger is converted, in order, along
+          with the header keywords.
+        - Any ledger files in `hpdirname` that are already in the format
+          specified by `ender` are skipped.
+        - A latest-state index (see :func:`desitarget.io.write_mtl_index`)
+          is written alongside each converted file.
+    """
+    if ender not in ledgerformats:
+        msg = "ender is {} but must be one of {}".format(ender, ledgerformats)
+        log.critical(msg)
+        raise ValueError(msg)
+
+    # ADM the ledger files to convert.
+    informs = ["." + form for form in ledgerformats if form != ender]
+    infns = [os.path.join(hpdirname, fn) for fn in sorted(os.listdir(hpdirname))
+             if os.path.splitext(fn)[-1] in informs]
+    infns = [fn for fn in infns if os.path.isfile(fn)]
+    if len(infns) == 0:
+        msg = "no ledger files to convert to {} in {}".format(ender, hpdirname)
+        log.critical(msg)
+        raise ValueError(msg)
+
+    os.makedirs(outdirname, exist_ok=True)
+    t0 = time()
+
+    # ADM the common function that is actually parallelized across.
+    def _convert_file(infn):
+        """convert a single ledger file"""
+        mtl, hdr = io.read_mtl_ledger(infn, unique=False, header=True)
+        root = os.path.splitext(os.path.basename(infn))[0]
+        outfn = os.path.join(outdirname, "{}.{}".format(root, ender))
+        if ender == "bin":
+            io.write_mtl_binary(outfn, mtl, header=hdr)
+        else:
+            io.write_with_units(outfn, np.array(mtl), extname='MTL',
+                                header=io._mtl_header_dict(hdr),
+                                ecsv=ender == "ecsv")
+        # ADM also write the latest-state index for the new file.
+        io.write_mtl_index(outfn, index=io.make_mtl_index(
+            outfn, targetid=mtl["TARGETID"]))
+        return outfn
+
+    # ADM this is just to count files in _update_status.
+    nfile = np.ones((), dtype='i8')
+
+    def _update_status(result):
+        """wrap key reduction operation on the main parallel process"""
+        if nfile % 100 == 0 and nfile > 0:
+            log.info('Converted {}/{} files...t = {:.1f} mins'.format(
+                nfile, len(infns), (time()-t0)/60.))
+        nfile[...] += 1
+        return result
+
+    # ADM Parallel process across files.
+    if numproc > 1:
+        pool = sharedmem.MapReduce(np=numproc)
+        with pool:
+            outfns = pool.map(_convert_file, infns, reduce=_update_status)
+    else:
+        outfns = [_update_status(_convert_file(infn)) for infn in infns]
+
+    log.info("Converted {} files to {}...t = {:.1f} mins".format(
+        len(outfns), ender, (time()-t0)/60.))
+
+    return outfns
+
+
 def inflate_ledger(mtl, hpdirname, columns=None, header=False, strictcols=False):
     """Add a fuller set of target columns to an MTL.
 
@@ -598,15 +817,15 @@ def inflate_ledger(mtl, hpdirname, columns=None, header=False, strictcols=False)
     if header:
         targs, hdr = targs
 
-    # ADM match the mtl back to the targets on TARGETID.
-    etargids, smtlids = enumerate(targs["TARGETID"]), set(mtl["TARGETID"])
-    ii = [i for i, tid in etargids if tid in smtlids]
-
-    # ADM reorder targets to match MTL on TARGETID.
+    # ADM match the mtl back to the targets on TARGETID, which
+    # ADM reorders the targets to match the MTL.
+    ii = match_to(targs["TARGETID"], mtl["TARGETID"])
+    if np.any(ii < 0):
+        msg = "{} MTL TARGETIDs are not in the targets in {}".format(
+            np.sum(ii < 0), hpdirname)
+        log.critical(msg)
+        raise ValueError(msg)
     targs = targs[ii]
-    targsort = np.argsort(targs["TARGETID"])
-    mtlsort = np.argsort(mtl["TARGETID"])
-    targs = targs[targsort][mtlsort]
 
     # ADM create an array to contain the fuller set of target columns.
     # ADM start with the data model for the target columns.
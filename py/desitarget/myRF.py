@@ -5,8 +5,15 @@ desitarget.myRF
 This module computes the Random Forest probability
 and it stores the RF with our own persistency.
 """
+import os
 import numpy as np
 import sys
+from multiprocessing import Array
+from time import time
+
+# ADM set up the DESI default logger
+from desiutil.log import get_logger
+log = get_logger()
 
 
 class myRF(object):
@@ -161,3 +168,469 @@ class myRF(object):
 
         np.savez_compressed(forestFileName, forest)
         return
+
+
+def packForest(forest, numberOfTrees=None, version=2):
+    """Pack a myRF-persisted forest into flat, contiguous node arrays.
+
+    Parameters
+    ----------
+    forest : :class:`~numpy.ndarray` or :class:`list`
+        A forest as stored by :meth:`myRF.saveForest` (i.e. the
+        `arr_0` entry of an `rf_model_*.npz` file).
+    numberOfTrees : :class:`int`, optional, defaults to ``None``
+        The number of trees to pack, counting from the first tree.
+        ``None`` means pack every tree in the forest.
+    version : :class:`int`, optional, defaults to 2
+        The myRF persistency version (1 stores per-tree answer arrays
+        and 2 stores the leaf probability in the tree itself).
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        Structured array of every node in the forest with columns
+        `LEFT`, `RIGHT` (global indices of the child nodes, which
+        point back at the node itself for leaves), `FEATURE`,
+        `THRESHOLD` and `VALUE` (the leaf probability, 0 for nodes
+        that are not leaves).
+    :class:`~numpy.ndarray`
+        The index in the node array of the root of each tree. Has
+        length `numberOfTrees` + 1 so that tree `i` occupies the slice
+        `offsets[i]:offsets[i+1]`.
+
+    Notes
+    -----
+    - Leaves pointing back at themselves means objects that have
+      reached a leaf can keep descending harmlessly, so they only need
+      to be retired from the descent every so often.
+    """
+    if version not in [1, 2]:
+        msg = "unsupported version={}".format(version)
+        log.critical(msg)
+        raise ValueError(msg)
+
+    # ADM version 1 forests store an answer array after every tree.
+    if numberOfTrees is None:
+        numberOfTrees = len(forest) if version == 2 else len(forest) // 2
+
+    treeInfos, treeValues = [], []
+    for iTree in range(numberOfTrees):
+        if version == 1:
+            treeInfo = forest[iTree*2]
+            treeAnswer = np.asarray(forest[iTree*2+1])
+        else:
+            treeInfo = forest[iTree]
+        names = treeInfo.dtype.names
+        isLeaf = treeInfo[names[0]] == -1
+        value = np.zeros(len(treeInfo))
+        if version == 1:
+            a0, a1 = treeAnswer[isLeaf, 0, 0], treeAnswer[isLeaf, 0, 1]
+            value[isLeaf] = a1*1./(a0+a1)
+        else:
+            value[isLeaf] = treeInfo[names[4]][isLeaf]
+        treeInfos.append(treeInfo)
+        treeValues.append(value)
+
+    offsets = np.zeros(numberOfTrees+1, dtype='i8')
+    offsets[1:] = np.cumsum([len(treeInfo) for treeInfo in treeInfos])
+    nodes = np.zeros(offsets[-1], dtype=packedRF.nodedtype)
+
+    for iTree, (treeInfo, value) in enumerate(zip(treeInfos, treeValues)):
+        names = treeInfo.dtype.names
+        s = slice(offsets[iTree], offsets[iTree+1])
+        ii = np.arange(offsets[iTree], offsets[iTree+1])
+        # ADM cast to int64 before offsetting, to avoid int16 overflows.
+        left = treeInfo[names[0]].astype('i8')
+        isLeaf = left == -1
+        nodes["LEFT"][s] = np.where(isLeaf, ii, left + offsets[iTree])
+        right = treeInfo[names[1]].astype('i8')
+        nodes["RIGHT"][s] = np.where(isLeaf, ii, right + offsets[iTree])
+        nodes["FEATURE"][s] = np.where(isLeaf, 0, treeInfo[names[2]])
+        nodes["THRESHOLD"][s] = treeInfo[names[3]]
+        nodes["VALUE"][s] = value
+
+    return nodes, offsets
+
+
+class packedRF(object):
+    """Vectorized Random Forest evaluator working on a packed forest.
+
+    Every object is pushed through each tree at once, one tree level
+    at a time, so no recursion is needed. The probabilities are
+    bit-identical to those of :meth:`myRF.predict_proba`.
+
+    Parameters
+    ----------
+    nodes : :class:`~numpy.ndarray`
+        Packed node array, as output by :func:`packForest`. Can be a
+        (read-only) memory-mapped array, see :func:`readPackedForest`.
+    offsets : :class:`~numpy.ndarray`
+        Index of the root of each tree, as output by :func:`packForest`.
+    numberOfTrees : :class:`int`, optional, defaults to ``None``
+        Only evaluate the first `numberOfTrees` trees. ``None`` means
+        evaluate every tree in `nodes`.
+
+    Notes
+    -----
+    - The evaluator only ever uses views of `nodes`, so a memory-mapped
+      forest is never copied into the (private) memory of a process.
+    """
+    # ADM the data model for the packed node array. Every column is
+    # ADM 8 bytes, so the array can also be viewed as a flat int64 array
+    # ADM in which the children of node i are at 5*i and 5*i+1.
+    nodedtype = np.dtype([('LEFT', '<i8'), ('RIGHT', '<i8'),
+                          ('FEATURE', '<i8'), ('THRESHOLD', '<f8'),
+                          ('VALUE', '<f8')])
+
+    def __init__(self, nodes, offsets, numberOfTrees=None):
+        if nodes.dtype != self.nodedtype:
+            msg = "nodes must have dtype {}".format(self.nodedtype)
+            log.critical(msg)
+            raise ValueError(msg)
+        if numberOfTrees is None:
+            numberOfTrees = len(offsets) - 1
+        if numberOfTrees > len(offsets) - 1:
+            msg = "{} trees requested but the forest only has {}".format(
+                numberOfTrees, len(offsets) - 1)
+            log.critical(msg)
+            raise ValueError(msg)
+
+        self.nodes = nodes
+        self.offsets = np.array(offsets[:numberOfTrees+1], dtype=np.intp)
+        self.roots = self.offsets[:-1]
+        self.nTrees = numberOfTrees
+        # ADM views of the columns needed to walk the trees. Thresholds
+        # ADM are stored as float64 (they're float32 in myRF, which are
+        # ADM promoted exactly to compare them to the float64 data).
+        self.left = nodes["LEFT"]
+        self.feature = nodes["FEATURE"]
+        self.threshold = nodes["THRESHOLD"]
+        self.value = nodes["VALUE"]
+        self.flat = nodes.view('<i8')
+        self.ncol = len(self.nodedtype)
+        # ADM nothing needs to write to the forest once it's packed.
+        for arr in [self.offsets, self.left, self.feature, self.threshold,
+                    self.value, self.flat]:
+            arr.flags.writeable = False
+
+    @classmethod
+    def fromForestFile(cls, forestFileName, numberOfTrees=200, version=2):
+        """Load an `rf_model_*.npz` forest file and pack it.
+
+        Parameters
+        ----------
+        forestFileName : :class:`str`
+            Full path to a forest file written by :meth:`myRF.saveForest`.
+        numberOfTrees : :class:`int`, optional, defaults to 200
+            Number of trees to evaluate.
+        version : :class:`int`, optional, defaults to 2
+            The myRF persistency version of the forest.
+
+        Returns
+        -------
+        :class:`packedRF`
+            An evaluator for the packed forest.
+        """
+        t = np.load(forestFileName, encoding='bytes', allow_pickle=True)
+        nodes, offsets = packForest(t['arr_0'], numberOfTrees, version=version)
+
+        return cls(nodes, offsets)
+
+    @classmethod
+    def fromPackedFile(cls, forestFileName, numberOfTrees=None, mmap=True):
+        """Open the memory-mappable files for a forest.
+
+        Parameters
+        ----------
+        forestFileName : :class:`str`
+            Full path to a forest file written by :meth:`myRF.saveForest`
+            that has been converted by :func:`writePackedForest`.
+        numberOfTrees : :class:`int`, optional, defaults to ``None``
+            Number of trees to evaluate. ``None`` means every tree.
+        mmap : :class:`bool`, optional, defaults to ``True``
+            If ``True``, memory-map the forest (read-only), which takes
+            constant time and no private memory. Otherwise, read it.
+
+        Returns
+        -------
+        :class:`packedRF`
+            An evaluator for the packed forest.
+        """
+        nodesFileName, offsetsFileName = packedForestFileNames(forestFileName)
+        nodes = np.load(nodesFileName, mmap_mode='r' if mmap else None)
+        offsets = np.load(offsetsFileName)
+
+        return cls(nodes, offsets, numberOfTrees=numberOfTrees)
+
+    def _descend(self, chunk, featureOffset, root, nChunk):
+        """Push every object in a chunk down one tree, returning leaves.
+        """
+        # ADM the current node of each object that is still descending,
+        # ADM and the index of that object in the chunk.
+        node = np.full(nChunk, root, dtype=np.intp)
+        obj = np.arange(nChunk)
+        leaves = node.copy()
+        while len(obj) > 0:
+            # ADM descend one level. Objects go right if they are above
+            # ADM the threshold (or are NaN), as in myRF.
+            goLeft = chunk[featureOffset[node] + obj] <= self.threshold[node]
+            node = self.flat[self.ncol*node + 1 - goLeft]
+            # ADM leaves point back at themselves, so objects that have
+            # ADM reached a leaf only need to be retired once they make
+            # ADM up a good fraction of those that are still descending.
+            active = self.left[node] != node
+            if np.count_nonzero(active) <= len(node) // 2:
+                leaves[obj] = node
+                node, obj = node[active], obj[active]
+
+        return leaves
+
+    def predict_proba(self, data, chunksize=2**16):
+        """Calculate the forest response (the mean response of the trees).
+
+        Parameters
+        ----------
+        data : :class:`~numpy.ndarray`
+            Array of shape (nObjects, nFeatures) of features to classify.
+        chunksize : :class:`int`, optional, defaults to 2**16
+            Number of objects to push through the forest at once. Peak
+            memory scales as `chunksize` x nFeatures.
+
+        Returns
+        -------
+        :class:`~numpy.ndarray`
+            The (float64) probability for each object.
+        """
+        data = np.atleast_2d(data)
+        nObj = len(data)
+        bdtOutput = np.zeros(nObj)
+
+        for start in range(0, nObj, chunksize):
+            # ADM transpose so that each feature is contiguous in memory.
+            chunk = np.ascontiguousarray(data[start:start+chunksize].T,
+                                         dtype='f8')
+            nChunk = chunk.shape[1]
+            chunk = chunk.ravel()
+            # ADM the offset of each node's feature in the flat chunk.
+            featureOffset = self.feature * nChunk
+            # ADM add trees in order to reproduce myRF.predict_proba.
+            proba = bdtOutput[start:start+nChunk]
+            for root in self.roots:
+                proba += self.value[
+                    self._descend(chunk, featureOffset, root, nChunk)]
+
+        bdtOutput /= self.nTrees
+        return bdtOutput
+
+
+def packedForestFileNames(forestFileName):
+    """Names of the memory-mappable files for a forest.
+
+    Parameters
+    ----------
+    forestFileName : :class:`str`
+        Full path to a forest file written by :meth:`myRF.saveForest`,
+        e.g. `rf_model_dr7.npz`.
+
+    Returns
+    -------
+    :class:`str`
+        The file holding the (uncompressed) packed node array, e.g.
+        `rf_model_dr7-nodes.npy`.
+    :class:`str`
+        The file holding the index of the first node of each tree,
+        e.g. `rf_model_dr7-offsets.npy`.
+    """
+    base = os.path.splitext(forestFileName)[0]
+
+    return base + "-nodes.npy", base + "-offsets.npy"
+
+
+def writePackedForest(forestFileName, version=None):
+    """Convert a forest file to the memory-mappable packed format.
+
+    Parameters
+    ----------
+    forestFileName : :class:`str`
+        Full path to a forest file written by :meth:`myRF.saveForest`.
+    version : :class:`int`, optional, defaults to ``None``
+        The myRF persistency version of the forest. ``None`` means
+        work the version out from the forest itself.
+
+    Returns
+    -------
+    :class:`list`
+        The names of the files that were written, which are in the same
+        directory as `forestFileName`, see :func:`packedForestFileNames`.
+
+    Notes
+    -----
+    - Every tree in the forest is packed. The node array is written
+      as an uncompressed .npy file so that it can be memory-mapped.
+    """
+    forest = np.load(forestFileName, encoding='bytes',
+                     allow_pickle=True)['arr_0']
+    # ADM version 1 forests alternate trees with their answer arrays,
+    # ADM which, unlike trees, are not structured arrays.
+    if version is None:
+        version = 2
+        if len(forest) > 1 and forest[1].dtype.names is None:
+            version = 1
+    nodes, offsets = packForest(forest, version=version)
+
+    # ADM write to temporary files and rename, so that no process ever
+    # ADM memory-maps a partially written forest.
+    outFileNames = packedForestFileNames(forestFileName)
+    for outFileName, arr in zip(outFileNames[::-1], [offsets, nodes]):
+        tmpFileName = outFileName + '.tmp'
+        with open(tmpFileName, 'wb') as f:
+            np.save(f, arr)
+        os.rename(tmpFileName, outFileName)
+
+    return list(outFileNames)
+
+
+# ADM process-wide registry of packed forests, keyed by the full path
+# ADM to the forest file, the number of trees and the myRF version.
+# ADM Forests loaded before a fork are shared (copy-on-write) with the
+# ADM forked processes, e.g. the workers of sharedmem.MapReduce.
+_forestCache = {}
+# ADM counters for the registry: number of hits, number of misses, total
+# ADM time spent loading forests and total loading time saved by hits.
+# ADM Stored in shared memory so every forked process updates the same
+# ADM counters, which can then be reported by the parent process.
+_forestStats = Array('d', 4)
+
+
+def getForest(forestFileName, numberOfTrees=200, version=2):
+    """Retrieve a packed forest, loading it at most once per process.
+
+    Parameters
+    ----------
+    forestFileName : :class:`str`
+        Full path to a forest file written by :meth:`myRF.saveForest`.
+    numberOfTrees : :class:`int`, optional, defaults to 200
+        Number of trees to evaluate.
+    version : :class:`int`, optional, defaults to 2
+        The myRF persistency version of the forest.
+
+    Returns
+    -------
+    :class:`packedRF`
+        An evaluator for the packed (read-only) forest.
+
+    Notes
+    -----
+    - If memory-mappable files written by :func:`writePackedForest`
+      exist, and are no older than `forestFileName`, the forest is
+      memory-mapped from those files rather than unpacked from
+      `forestFileName`.
+    - If the forest file is modified on disk after it has been cached,
+      it is reloaded. Use :func:`clearForestCache` to invalidate forests
+      explicitly.
+    """
+    key = (os.path.realpath(forestFileName), numberOfTrees, version)
+    # ADM prefer the memory-mappable files, if they're up-to-date.
+    packed = False
+    nodesFileName, offsetsFileName = packedForestFileNames(forestFileName)
+    if os.path.exists(nodesFileName) and os.path.exists(offsetsFileName):
+        mtime = os.path.getmtime(nodesFileName)
+        packed = mtime >= os.path.getmtime(forestFileName)
+    if not packed:
+        mtime = os.path.getmtime(forestFileName)
+
+    if key in _forestCache:
+        rf, cachedmtime, loadtime = _forestCache[key]
+        if cachedmtime == mtime:
+            with _forestStats.get_lock():
+                _forestStats[0] += 1
+                _forestStats[3] += loadtime
+            return rf
+
+    t0 = time()
+    if packed:
+        rf = packedRF.fromPackedFile(forestFileName, numberOfTrees=numberOfTrees)
+    else:
+        rf = packedRF.fromForestFile(forestFileName, version=version,
+                                     numberOfTrees=numberOfTrees)
+    loadtime = time() - t0
+    _forestCache[key] = (rf, mtime, loadtime)
+    with _forestStats.get_lock():
+        _forestStats[1] += 1
+        _forestStats[2] += loadtime
+
+    return rf
+
+
+def preloadForests(forests):
+    """Load a set of forests into the process-wide registry.
+
+    Parameters
+    ----------
+    forests : :class:`list`
+        List of (forestFileName, numberOfTrees, version) tuples, as
+        would be passed to :func:`getForest`.
+
+    Returns
+    -------
+    Nothing, but the forests that exist on disk are loaded into the
+    registry used by :func:`getForest`.
+
+    Notes
+    -----
+    - Call before forking parallel processes so that all of them can
+      share a single copy of each forest.
+    """
+    for forestFileName, numberOfTrees, version in forests:
+        if os.path.exists(forestFileName):
+            getForest(forestFileName, numberOfTrees=numberOfTrees,
+                      version=version)
+
+
+def clearForestCache(forestFileName=None):
+    """Invalidate forests in the process-wide registry.
+
+    Parameters
+    ----------
+    forestFileName : :class:`str`, optional, defaults to ``None``
+        Only invalidate forests loaded from this file. If ``None``,
+        invalidate every forest in the registry.
+
+    Returns
+    -------
+    Nothing, but forests are removed from the registry.
+    """
+    if forestFileName is None:
+        _forestCache.clear()
+    else:
+        path = os.path.realpath(forestFileName)
+        for key in [key for key in _forestCache if key[0] == path]:
+            del _forestCache[key]
+
+
+def forestCacheStats(reset=False):
+    """Report the usage of the process-wide registry of forests.
+
+    Parameters
+    ----------
+    reset : :class:`bool`, optional, defaults to ``False``
+        If ``True``, also reset the counters to zero (e.g. at the start
+        of a new run).
+
+    Returns
+    -------
+    :class:`dict`
+        Dictionary with entries `hits` and `misses` (the number of
+        forests retrieved from, and loaded into, the registry),
+        `loadtime` (the total time spent loading forests, in seconds)
+        and `timesaved` (the loading time saved by the registry, in
+        seconds), summed over any forked processes.
+    """
+    with _forestStats.get_lock():
+        stats = dict(zip(["hits", "misses", "loadtime", "timesaved"],
+                         _forestStats[:]))
+        if reset:
+            _forestStats[:] = [0, 0, 0, 0]
+    stats["hits"], stats["misses"] = int(stats["hits"]), int(stats["misses"])
+
+    return stats
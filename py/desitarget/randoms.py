@@ -1247,15 +1247,19 @@ def select_randoms_bricks(brickdict, bricknames, numproc=32, drdir=None,
 
     # - Parallel process input files.
     if numproc > 1:
+        # ADM each process writes its randoms directly to shared memory.
+        # ADM bricks are < 0.25x0.25 sq. deg. but randoms are duplicated
+        # ADM where two PHOTSYS overlap, and have < 256 bytes of columns.
+        capacity = int(nbricks*2*density*0.25*0.25*256)
         pool = sharedmem.MapReduce(np=numproc)
         with pool:
-            qinfo = pool.map(_get_quantities, bricknames, reduce=_update_status)
+            qinfo, _ = pool.gather(_get_quantities, bricknames, capacity,
+                                   reduce=_update_status)
     else:
         qinfo = list()
         for brickname in bricknames:
             qinfo.append(_update_status(_get_quantities(brickname)))
-
-    qinfo = np.concatenate(qinfo)
+        qinfo = np.concatenate(qinfo)
 
     return qinfo
 
@@ -36,6 +36,7 @@ loaded from the text file as the corresponding Boolean.
 """
 import os
 import re
+import hashlib
 import fitsio
 import itertools
 import numpy as np
@@ -43,8 +44,6 @@ import healpy as hp
 
 import numpy.lib.recfunctions as rfn
 
-import astropy.units as u
-from astropy.coordinates import SkyCoord
 from astropy.table import Table, Row
 
 from time import time
@@ -55,6 +54,7 @@ from collections import defaultdict
 
 from desitarget.internal import sharedmem
 from desitarget.geomask import radec_match_to, add_hp_neighbors, is_in_hp
+from desitarget.geomask import match_to, _cache_dir, _cache_tmp_filename
 
 from desitarget.targets import encode_targetid, main_cmx_or_sv
 from desitarget.targets import set_obsconditions, initial_priority_numobs
@@ -69,6 +69,11 @@ bricks = brick.Bricks(bricksize=0.25)
 log = get_logger()
 start = time()
 
+# ADM the version of the format of the cached (read and validated)
+# ADM secondary program files (see read_files). Update this to force
+# ADM the cached files to be remade.
+scndcacheversion = 1
+
 indatamodel = np.array([], dtype=[
     ('RA', '>f8'), ('DEC', '>f8'), ('PMRA', '>f4'), ('PMDEC', '>f4'),
     ('REF_EPOCH', '>f4'), ('OVERRIDE', '?')
@@ -254,7 +259,120 @@ def _check_files(scxdir, scnd_mask):
     return
 
 
-def read_files(scxdir, scnd_mask):
+def _file_checksum(filename):
+    """The sha1 checksum of the contents of a file"""
+    checksum = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(2**24), b""):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
+
+
+def scnd_cache_filename(filename):
+    """The name of the cache of a (read and validated) secondary file.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Full path to a secondary program file in `scxdir`/indata.
+
+    Returns
+    -------
+    :class:`str`
+        The cache file for `filename`, in the directory
+        `$DESITARGET_CACHE`/secondary (if set) or otherwise in
+        `~/.cache/desitarget/secondary`.
+    """
+    realfn = os.path.realpath(filename)
+    pathsum = hashlib.sha1(realfn.encode()).hexdigest()[:16]
+    base = os.path.splitext(os.path.basename(realfn))[0]
+
+    return os.path.join(_cache_dir(), "secondary", "scnd-v{}-{}-{}.npz".format(
+        scndcacheversion, base, pathsum))
+
+
+def _read_scnd_file(filename):
+    """Read and validate one secondary program (.txt or .fits) file"""
+    # ADM if the relevant file is a .txt file, read it in.
+    if os.path.splitext(filename)[1] == '.txt':
+        scxin = np.loadtxt(filename, usecols=[0, 1, 2, 3, 4, 5],
+                           dtype=indatamodel.dtype)
+    # ADM otherwise it's a fits file, read it in.
+    else:
+        scxin = fitsio.read(filename, columns=indatamodel.dtype.names)
+
+    # ADM ensure this is a properly constructed numpy array.
+    scxin = np.atleast_1d(scxin)
+
+    # ADM assert the data model.
+    msg = "Data model doesn't match {} in {}".format(indatamodel.dtype, filename)
+    for col in indatamodel.dtype.names:
+        assert scxin[col].dtype == indatamodel[col].dtype, msg
+
+    # ADM the default is 2015.5 for the REF_EPOCH.
+    ii = scxin["REF_EPOCH"] == 0
+    scxin["REF_EPOCH"][ii] = 2015.5
+
+    return scxin
+
+
+def _read_scnd_file_cached(filename):
+    """Read one secondary program file, via a cache on disk.
+
+    Parameters
+    ----------
+    filename : :class:`str`
+        Full path to a secondary program file in `scxdir`/indata.
+
+    Returns
+    -------
+    :class:`~numpy.ndarray`
+        The (validated) contents of `filename`, as for
+        :func:`_read_scnd_file()`.
+
+    Notes
+    -----
+        - The cache (see :func:`scnd_cache_filename()`) stores the path,
+          modification time, size and checksum of `filename`. If the
+          path, time and size match, the cached data is used. If not,
+          but the checksum of `filename` matches, the cached data is
+          used and the cache is updated. Otherwise `filename` is re-read.
+    """
+    realfn = os.path.realpath(filename)
+    stat = os.stat(realfn)
+    meta = {"PATH": realfn, "MTIME": stat.st_mtime_ns, "SIZE": stat.st_size}
+
+    cachefn = scnd_cache_filename(filename)
+    data, checksum = None, None
+    if os.path.exists(cachefn):
+        with np.load(cachefn) as cached:
+            if all([cached[key] == meta[key] for key in meta]):
+                return cached["DATA"]
+            checksum = _file_checksum(realfn)
+            if str(cached["CHECKSUM"]) == checksum:
+                data = cached["DATA"]
+
+    if data is None:
+        log.info("Reading (and caching) {}".format(filename))
+        data = _read_scnd_file(filename)
+        if checksum is None:
+            checksum = _file_checksum(realfn)
+
+    # ADM (re)write the cache (atomically, as several processes could
+    # ADM be writing).
+    tmpfn = _cache_tmp_filename(cachefn)
+    try:
+        os.makedirs(os.path.dirname(cachefn), exist_ok=True)
+        np.savez(tmpfn, DATA=data, CHECKSUM=checksum, **meta)
+        os.rename(tmpfn, cachefn)
+    except OSError as e:
+        log.warning("Couldn't write {} ({})".format(cachefn, e))
+
+    return data
+
+
+def read_files(scxdir, scnd_mask, numproc=1, cache=True):
     """Read in all secondary files and concatenate them into one array.
 
     Parameters
@@ -265,6 +383,12 @@ def read_files(scxdir, scnd_mask):
         A mask corresponding to a set of secondary targets, e.g, could
         be ``from desitarget.targetmask import scnd_mask`` for the
         main survey mask.
+    numproc : :class:`int`, optional, defaults to 1
+        The number of parallel processes to use to read the files.
+    cache : :class:`bool`, optional, defaults to ``True``
+        If ``True``, read each file via a cache of its validated
+        contents, which is only remade if the file changes (see
+        :func:`_read_scnd_file_cached()`).
 
     Returns
     -------
@@ -275,34 +399,29 @@ def read_files(scxdir, scnd_mask):
     # ADM the full directory name for the input data files.
     fulldir = os.path.join(scxdir, 'indata')
 
-    scxall = []
-    # ADM loop through all of the scx bits.
-    for name in scnd_mask.names():
+    # ADM the full file path for each of the scx bits.
+    names = scnd_mask.names()
+    fns = []
+    for name in names:
         log.debug('SCND target: {}'.format(name))
-        # ADM the full file path without the extension.
         fn = os.path.join(fulldir, scnd_mask[name].filename)
-        log.debug('     path:   {}'.format(fn))
-        # ADM if the relevant file is a .txt file, read it in.
         if os.path.exists(fn+'.txt'):
-            scxin = np.loadtxt(fn+'.txt', usecols=[0, 1, 2, 3, 4, 5],
-                               dtype=indatamodel.dtype)
-        # ADM otherwise it's a fits file, read it in.
+            fn += '.txt'
         else:
-            scxin = fitsio.read(fn+'.fits',
-                                columns=indatamodel.dtype.names)
-
-        # ADM ensure this is a properly constructed numpy array.
-        scxin = np.atleast_1d(scxin)
-
-        # ADM assert the data model.
-        msg = "Data model doesn't match {} in {}".format(indatamodel.dtype, fn)
-        for col in indatamodel.dtype.names:
-            assert scxin[col].dtype == indatamodel[col].dtype, msg
+            fn += '.fits'
+        log.debug('     path:   {}'.format(fn))
+        fns.append(fn)
 
-        # ADM the default is 2015.5 for the REF_EPOCH.
-        ii = scxin["REF_EPOCH"] == 0
-        scxin["REF_EPOCH"][ii] = 2015.5
+    reader = _read_scnd_file_cached if cache else _read_scnd_file
+    if numproc > 1:
+        pool = sharedmem.MapReduce(np=numproc)
+        with pool:
+            scxins = pool.map(reader, fns)
+    else:
+        scxins = [reader(fn) for fn in fns]
 
+    scxall = []
+    for name, scxin in zip(names, scxins):
         # ADM add the other output columns.
         dt = outdatamodel.dtype.descr + suppdatamodel.dtype.descr
         scxout = np.zeros(len(scxin), dtype=dt)
@@ -377,19 +496,13 @@ def add_primary_info(scxtargs, priminfodir):
     primtargs = np.delete(primtargs, alldups)
     primids = np.delete(primids, alldups)
 
-    # ADM we already know that all primaries match a secondary, so,
-    # ADM for speed, we can reduce to the matching set.
-    sprimids = set(primids)
-    scxii = [scxid in sprimids for scxid in scxids]
-    assert len(sprimids) == len(primids)
-    assert set(scxids[scxii]) == sprimids
-
-    # ADM sort-to-match sxcid and primid.
-    primii = np.zeros_like(primids)
-#    ii[np.argsort(origids)] = np.argsort(refids)
-#    assert np.all(refids[ii] == origids)
-    primii[np.argsort(scxids[scxii])] = np.argsort(primids)
-    assert np.all(primids[primii] == scxids[scxii])
+    # ADM look up the primary that matches each secondary (if any).
+    primii = match_to(primids, scxids)
+    scxii = primii >= 0
+    primii = primii[scxii]
+    # ADM we already know that all primaries match a secondary.
+    assert len(np.unique(primids)) == len(primids)
+    assert len(np.unique(primii)) == len(primids)
 
     # ADM now we have the matches, update the secondary targets
     # ADM with the primary TARGETIDs.
@@ -405,7 +518,7 @@ def add_primary_info(scxtargs, priminfodir):
 
 
 def match_secondary(primtargs, scxdir, scndout, sep=1.,
-                    pix=None, nside=None):
+                    pix=None, nside=None, numproc=1, matchnside=64):
     """Match secondary targets to primary targets and update bits.
 
     Parameters
@@ -425,6 +538,14 @@ def match_secondary(primtargs, scxdir, scndout, sep=1.,
         pix at the supplied `nside`, as a speed-up.
     nside : :class:`int`, optional, defaults to `None`
         The (NESTED) HEALPixel nside to be used with `pixlist`.
+    numproc : :class:`int`, optional, defaults to 1
+        The number of processes over which to parallelize reading the
+        secondary files and the matching.
+    matchnside : :class:`int`, optional, defaults to 64
+        The (NESTED) HEALPixel nside at which to partition the primary
+        and secondary targets for matching. Each partition is matched
+        separately (with a halo of neighboring pixels), which bounds
+        the memory used, however large the samples.
 
     Returns
     -------
@@ -446,7 +567,7 @@ def match_secondary(primtargs, scxdir, scndout, sep=1.,
         scxdir = os.path.join(scxdir, surv)
 
     # ADM read in non-OVERRIDE secondary targets.
-    scxtargs = read_files(scxdir, mx[3])
+    scxtargs = read_files(scxdir, mx[3], numproc=numproc)
     scxtargs = scxtargs[~scxtargs["OVERRIDE"]]
 
     # ADM match primary targets to non-OVERRIDE secondary targets.
@@ -466,37 +587,31 @@ def match_secondary(primtargs, scxdir, scndout, sep=1.,
             log.critical(msg)
             raise ValueError(msg)
 
-    # ADM warn the user if the secondary and primary samples are "large".
-    big = 500000
-    if np.sum(inhp) > big and len(primtargs) > big:
-        log.warning('Large secondary (N={}) and primary (N={}) samples'
-                    .format(np.sum(inhp), len(primtargs)))
-        log.warning('The code may run slowly')
-
     # ADM for each secondary target, determine if there is a match
     # ADM with a primary target. Note that sense is important, here
-    # ADM (the primary targets must be passed first).
-    log.info('Matching primary and secondary targets for {} at {}"...t={:.1f}s'
-             .format(scndout, sep, time()-start))
-    mtargs, mscx = radec_match_to(targs, scxtargs[inhp], sep=sep)
+    # ADM (the primary targets must be passed first). The targets are
+    # ADM matched in partitions of HEALPixels at matchnside, to bound
+    # ADM the memory used for large samples.
+    log.info('Matching {} primary and {} secondary targets for {} at {}" '
+             '(in nside={} HEALPixels)...t={:.1f}s'.format(
+                 len(targs), np.sum(inhp), scndout, sep, matchnside,
+                 time()-start))
+    mtargs, mscx = radec_match_to(targs, scxtargs[inhp], sep=sep,
+                                  nside=matchnside, numproc=numproc)
     # ADM recast the indices to the full set of secondary targets,
     # ADM instead of just those that were in the relevant HEALPixels.
     mscx = np.where(inhp)[0][mscx]
 
-    # ADM loop through the matches and update the SCND_TARGET
-    # ADM column in the primary target list. The np.unique is a
-    # ADM speed-up to assign singular matches first.
-    umtargs, inv, cnt = np.unique(mtargs,
-                                  return_inverse=True, return_counts=True)
-    # ADM number of times each primary target was matched, ordered
-    # ADM the same as mtargs, i.e. n(mtargs) for each entry in mtargs.
-    nmtargs = cnt[inv]
-    # ADM assign anything with nmtargs = 1 directly.
-    singular = nmtargs == 1
-    targs["SCND_TARGET"][mtargs[singular]] = scxtargs["SCND_TARGET"][mscx[singular]]
-    # ADM loop through things with nmtargs > 1 and combine the bits.
-    for i in range(len((mtargs[~singular]))):
-        targs["SCND_TARGET"][mtargs[~singular][i]] |= scxtargs["SCND_TARGET"][mscx[~singular][i]]
+    # ADM update the SCND_TARGET column in the primary target list,
+    # ADM combining the bits of every secondary that matches a primary.
+    # ADM sort on the primary index so each primary's matches are
+    # ADM contiguous, and OR together the bits for each primary.
+    srt = np.argsort(mtargs, kind='stable')
+    umtargs, starts = np.unique(mtargs[srt], return_index=True)
+    if len(umtargs) > 0:
+        scnd_target = scxtargs["SCND_TARGET"][mscx[srt]].astype(np.int64)
+        targs["SCND_TARGET"][umtargs] |= np.bitwise_or.reduceat(
+            scnd_target, starts)
     # ADM also assign the SCND_ANY bit to the primary targets.
     desicols, desimasks, _ = main_cmx_or_sv(targs, scnd=True)
     desi_mask = desimasks[0]
@@ -687,10 +802,10 @@ def finalize_secondary(scxtargs, scnd_mask, survey='main', sep=1.,
     if len(w) > 0:
         log.info("Matching secondary targets to themselves...t={:.1f}s"
                  .format(time()-t0))
-        # ADM use astropy for the matching. At NERSC, astropy matches
-        # ADM ~20M objects to themselves in about 10 minutes.
-        c = SkyCoord(scxtargs["RA"][w]*u.deg, scxtargs["DEC"][w]*u.deg)
-        m1, m2, _, _ = c.search_around_sky(c, sep*u.arcsec)
+        # ADM m1 (m2) are indexes of the first (second) of each pair.
+        radec = [scxtargs["RA"][w], scxtargs["DEC"][w]]
+        m2, m1 = radec_match_to(radec, radec, sep=sep, radec=True,
+                                allmatches=True)
         log.info("Done with matching...t={:.1f}s".format(time()-t0))
         # ADM restrict only to unique matches (and exclude self-matches).
         uniq = m1 > m2
@@ -776,7 +891,8 @@ def finalize_secondary(scxtargs, scnd_mask, survey='main', sep=1.,
     return done
 
 
-def select_secondary(priminfodir, sep=1., scxdir=None, darkbright=False):
+def select_secondary(priminfodir, sep=1., scxdir=None, darkbright=False,
+                     numproc=1):
     """Process secondary targets and update relevant bits.
 
     Parameters
@@ -796,6 +912,9 @@ def select_secondary(priminfodir, sep=1., scxdir=None, darkbright=False):
         `NUMOBS_INIT_DARK`, `NUMOBS_INIT_BRIGHT`, `PRIORITY_INIT_DARK`
         and `PRIORITY_INIT_BRIGHT` and calculate values appropriate
         to "BRIGHT" and "DARK|GRAY" observing conditions.
+    numproc : :class:`int`, optional, defaults to 1
+        The number of parallel processes to use to read the secondary
+        files.
 
     Returns
     -------
@@ -836,8 +955,9 @@ def select_secondary(priminfodir, sep=1., scxdir=None, darkbright=False):
     # ADM retrieve the scxdir, check it's structure and fidelity...
     scxdir = _get_scxdir(scxdir)
     _check_files(scxdir, scnd_mask)
-    # ADM ...and read in all of the secondary targets.
-    scxtargs = read_files(scxdir, scnd_mask)
+    # ADM ...and read in all of the secondary targets (only files that
+    # ADM changed since they were last read are re-read).
+    scxtargs = read_files(scxdir, scnd_mask, numproc=numproc)
 
     # ADM only non-override targets could match a primary.
     scxover = scxtargs[scxtargs["OVERRIDE"]]
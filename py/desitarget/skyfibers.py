@@ -1165,18 +1165,29 @@ def select_skies(survey, numproc=16, nskiespersqdeg=None, bands=['g', 'r', 'z'],
 
     # - Parallel process input files.
     if numproc > 1:
+        # ADM each process writes its skies directly to shared memory,
+        # ADM sized for the number of skies in each brick (as set in
+        # ADM make_skies_for_a_brick), the columns for each aperture
+        # ADM and < 128 bytes of columns added by finalize.
+        nsqdeg = nskiespersqdeg
+        if nsqdeg is None:
+            nsqdeg = density_of_sky_fibers(margin=4)
+        nskies = (int(np.sqrt(0.25*0.25*nsqdeg)) + 1)**2
+        rowsize = skydatamodel.dtype.itemsize*len(apertures_arcsec) + 128
+        capacity = nbricks*nskies*rowsize
         pool = sharedmem.MapReduce(np=numproc)
         with pool:
-            skies = pool.map(_get_skies, bricknames, reduce=_update_status)
+            skies, _ = pool.gather(_get_skies, bricknames, capacity,
+                                   reduce=_update_status)
     else:
         skies = list()
         for brickname in bricknames:
             skies.append(_update_status(_get_skies(brickname)))
 
-    # ADM some missing blobs may have contaminated the array.
-    skies = [sk for sk in skies if sk is not None]
-    # ADM Concatenate the parallelized results into one rec array.
-    skies = np.concatenate(skies)
+        # ADM some missing blobs may have contaminated the array.
+        skies = [sk for sk in skies if sk is not None]
+        # ADM Concatenate the results into one rec array.
+        skies = np.concatenate(skies)
 
     # ADM make_skies_for_a_brick is pixel-based, so the locations can
     # ADM extend beyond the "true" geometric brick boundaries. Use the
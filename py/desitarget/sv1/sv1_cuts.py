@@ -580,6 +580,15 @@ def isQSO_color_high_z(gflux=None, rflux=None, zflux=None,
     return qso_hz
 
 
+# ADM the Random Forests used by isQSO_randomforest() and
+# ADM isQSO_highz_faint(), as (file name, number of trees, myRF version)
+# ADM tuples. Loaded before forking so they're shared by all processes.
+qso_rf_forests = [
+    (resource_filename('desitarget', 'data/rf_model_dr7.npz'), 500, 2),
+    (resource_filename('desitarget', 'data/rf_model_dr7_HighZ.npz'), 500, 2)
+]
+
+
 def isQSO_randomforest(gflux=None, rflux=None, zflux=None, w1flux=None,
                        w2flux=None, objtype=None, release=None, dchisq=None,
                        maskbits=None, gnobs=None, rnobs=None, znobs=None,
@@ -648,7 +657,7 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, w1flux=None,
 
     if np.any(preSelection):
 
-        from desitarget.myRF import myRF
+        from desitarget.myRF import getForest
 
         # Data reduction to preselected objects
         colorsReduced = colors[preSelection]
@@ -662,15 +671,12 @@ def isQSO_randomforest(gflux=None, rflux=None, zflux=None, w1flux=None,
         rf_fileName = pathToRF + '/rf_model_dr7.npz'
         rf_HighZ_fileName = pathToRF + '/rf_model_dr7_HighZ.npz'
 
-        # rf initialization - colors data duplicated within "myRF"
-        rf = myRF(colorsReduced, pathToRF, numberOfTrees=500, version=2)
-        rf_HighZ = myRF(colorsReduced, pathToRF, numberOfTrees=500, version=2)
         # rf loading
-        rf.loadForest(rf_fileName)
-        rf_HighZ.loadForest(rf_HighZ_fileName)
+        rf = getForest(rf_fileName, numberOfTrees=500, version=2)
+        rf_HighZ = getForest(rf_HighZ_fileName, numberOfTrees=500, version=2)
         # Compute rf probabilities
-        tmp_rf_proba = rf.predict_proba()
-        tmp_rf_HighZ_proba = rf_HighZ.predict_proba()
+        tmp_rf_proba = rf.predict_proba(colorsReduced)
+        tmp_rf_HighZ_proba = rf_HighZ.predict_proba(colorsReduced)
         # Compute optimized proba cut (all different for SV)
         # ADM the probabilities are different for the north and the south.
         if south:
@@ -767,7 +773,7 @@ def isQSO_highz_faint(gflux=None, rflux=None, zflux=None, w1flux=None,
 
     if np.any(preSelection):
 
-        from desitarget.myRF import myRF
+        from desitarget.myRF import getForest
 
         # Data reduction to preselected objects.
         colorsReduced = colors[preSelection]
@@ -781,14 +787,11 @@ def isQSO_highz_faint(gflux=None, rflux=None, zflux=None, w1flux=None,
         # Use RF trained over DR7.
         rf_fileName = pathToRF + '/rf_model_dr7.npz'
 
-        # rf initialization - colors data duplicated within "myRF".
-        rf = myRF(colorsReduced, pathToRF, numberOfTrees=500, version=2)
-
         # rf loading.
-        rf.loadForest(rf_fileName)
+        rf = getForest(rf_fileName, numberOfTrees=500, version=2)
 
         # Compute rf probabilities.
-        tmp_rf_proba = rf.predict_proba()
+        tmp_rf_proba = rf.predict_proba(colorsReduced)
 
         # Compute optimized proba cut (all different for SV).
         # The probabilities may be different for the north and the south.
@@ -1436,6 +1439,38 @@ def isMWS_WD(primary=None, gaia=None, galb=None, astrometricexcessnoise=None,
     return mws
 
 
+# ADM the quantities passed to the selection functions (isLRG() etc.)
+# ADM for each target class by set_target_bits(). These are translated
+# ADM to input columns by desitarget.cuts.tcnames_columns().
+tcnames_inputs = {
+    "LRG": ["gflux", "rflux", "zflux", "w1flux", "zfiberflux",
+            "gnobs", "rnobs", "znobs", "rsnr", "zsnr", "w1snr", "maskbits"],
+    "ELG": ["gflux", "rflux", "zflux", "gfiberflux", "gsnr", "rsnr", "zsnr",
+            "gnobs", "rnobs", "znobs", "maskbits"],
+    "QSO": ["gflux", "rflux", "zflux", "w1flux", "w2flux", "dchisq",
+            "gnobs", "rnobs", "znobs", "gsnr", "rsnr", "zsnr", "w1snr",
+            "w2snr", "maskbits", "objtype"],
+    "BGS": ["gflux", "rflux", "zflux", "w1flux", "w2flux", "rfiberflux",
+            "gnobs", "rnobs", "znobs", "gfracmasked", "rfracmasked",
+            "zfracmasked", "gfracflux", "rfracflux", "zfracflux",
+            "gfracin", "rfracin", "zfracin", "gfluxivar", "rfluxivar",
+            "zfluxivar", "maskbits", "Grr", "w1snr", "gaiagmag", "objtype"],
+    "MWS": ["gaia", "gaiagmag", "gaiabmag", "gaiarmag", "gaiaaen",
+            "gaiadupsource", "gaiabprpfactor", "gaiasigma5dmax",
+            "gflux", "rflux", "obs_rflux", "objtype", "gnobs", "rnobs",
+            "gfracmasked", "rfracmasked", "pmra", "pmdec", "parallax",
+            "parallaxerr", "parallaxovererror", "galb"],
+    "STD": ["gflux", "rflux", "zflux", "gfracflux", "rfracflux",
+            "zfracflux", "gfracmasked", "rfracmasked", "zfracmasked",
+            "objtype", "gnobs", "rnobs", "znobs", "gfluxivar", "rfluxivar",
+            "zfluxivar", "gaia", "gaiaaen", "gaiaparamssolved", "pmra",
+            "pmdec", "parallax", "gaiadupsource", "gaiagmag", "gaiabmag",
+            "gaiarmag", "galb", "parallaxovererror", "gaiabprpfactor",
+            "gaiasigma5dmax"],
+    "ALL": ["photsys_north", "release", "galb"]
+}
+
+
 def set_target_bits(photsys_north, photsys_south, obs_rflux,
                     gflux, rflux, zflux, w1flux, w2flux,
                     gfiberflux, rfiberflux, zfiberflux,
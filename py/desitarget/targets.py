@@ -520,6 +520,122 @@ def calc_numobs_more(targets, zcat, obscon):
     return numobs_more
 
 
+# ADM the (mutually exclusive) observational classes of targets used to
+# ADM look up priorities, and, for each observational state in the yaml
+# ADM file, the classes to which it applies, in the order of precedence.
+_OBSCLASSES = ["UNOBS", "DONE", "MORE_ZGOOD_HIZ", "MORE_ZGOOD_LOWZ", "MORE_ZWARN"]
+_PRIORITY_RULES = [("UNOBS", [0]), ("DONE", [1]), ("MORE_ZGOOD", [2, 3]),
+                   ("MORE_ZWARN", [4])]
+# ADM QSOs could be Lyman-alpha or Tracers, so low-z QSOs are DONE.
+_QSO_PRIORITY_RULES = [("UNOBS", [0]), ("DONE", [1]), ("MORE_ZGOOD", [2]),
+                       ("DONE", [0, 1, 3, 4]), ("MORE_ZWARN", [4])]
+# ADM tables built by _priority_table(), keyed by (survey, obscon, columns).
+_priority_tables = {}
+
+
+def _priority_table(survey, obscon, colnames, masks, present):
+    """Look-up table of priorities and states for :func:`calc_priority`.
+
+    Parameters
+    ----------
+    survey : :class:`str`
+        The survey, e.g. "main" or "sv1" (but not "cmx").
+    obscon : :class:`str`
+        The observing conditions, as passed to :func:`calc_priority`.
+    colnames : :class:`list`
+        The names of the DESI, BGS, MWS and secondary target columns, as
+        returned by :func:`main_cmx_or_sv` (with `scnd` = ``True``).
+    masks : :class:`list`
+        The corresponding masks, as returned by :func:`main_cmx_or_sv`.
+    present : :class:`tuple`
+        Whether each of `colnames` is in the targets.
+
+    Returns
+    -------
+    :class:`dict`
+        With keys "rules" (a list of (column, bit, keys) for each bit
+        that is processed, where keys is an array with an integer key
+        for each of `_OBSCLASSES`), "nkey" (priority = key // nkey),
+        "rulestates" (state code = rulestates[key % nkey]), "states"
+        (the state string for each state code) and "calib" (the
+        bits that denote calibration targets).
+
+    Notes
+    -----
+        - A key is larger for a higher priority and, for the same
+          priority, for a rule that has precedence (i.e. a bit that was
+          processed first). A key of zero means "not updated".
+        - Tables are built once for each survey, obscon and set of
+          columns, and then cached.
+    """
+    cachekey = (survey, obscon, tuple(colnames), tuple(present))
+    if cachekey in _priority_tables:
+        return _priority_tables[cachekey]
+
+    desi_target, bgs_target, mws_target, scnd_target = colnames
+    desi_mask, bgs_mask, mws_mask, scnd_mask = masks
+
+    # ADM the bits (and the labels for the states) in order of precedence.
+    # ADM 'LRG' is the guiding column in SV and the main survey
+    # ADM (once, it was 'LRG_1PASS' and 'LRG_2PASS' in the MS).
+    blocks = [(desi_target, desi_mask, ('ELG', 'LRG', 'QSO'), None),
+              (bgs_target, bgs_mask, bgs_mask.names(), "BGS"),
+              (mws_target, mws_mask, mws_mask.names(), "MWS"),
+              (scnd_target, scnd_mask, scnd_mask.names(), "SCND")]
+    present = dict(zip(colnames, present))
+
+    obsmask = obsconditions.mask(obscon)
+    states = ["", "CALIB", "IN_BRIGHT_OBJECT"]
+    order, rules, rulestates = 0, [], [0]
+    for col, mask, names, label in blocks:
+        if not present[col]:
+            continue
+        for name in names:
+            # ADM only update priorities for passed observing conditions.
+            if (obsmask & obsconditions.mask(mask[name].obsconditions)) == 0:
+                continue
+            subrules = _PRIORITY_RULES
+            if col == desi_target and name == 'QSO':
+                subrules = _QSO_PRIORITY_RULES
+            # ADM the (priority, order) of the rule that sets the priority
+            # ADM for each class; the first highest priority wins.
+            best = [(0, 0)] * len(_OBSCLASSES)
+            for sname, classes in subrules:
+                order += 1
+                Mxp = mask[name].priorities[sname]
+                ts = "{}|{}".format(label or name, sname)
+                if ts not in states:
+                    states.append(ts)
+                rulestates.append(states.index(ts))
+                for c in classes:
+                    if Mxp > best[c][0]:
+                        best[c] = (Mxp, order)
+            rules.append((col, int(mask[name]), best))
+
+    # ADM convert (priority, order) to keys, where the key modulo nkey is
+    # ADM larger for earlier rules (key % nkey = nkey - order).
+    nkey = order + 1
+    rules = [(col, bit, np.array([p*nkey + nkey - o if p > 0 else 0
+                                  for p, o in best], dtype='i8'))
+             for col, bit, best in rules]
+    rulestates = np.array([0] + rulestates[1:][::-1], dtype='i2')
+
+    # ADM potential calibration targets have an initial state of CALIB.
+    calib = 0
+    if present[desi_target]:
+        for name in ('SKY', 'BAD_SKY', 'SUPP_SKY',
+                     'STD_FAINT', 'STD_WD', 'STD_BRIGHT'):
+            # ADM only update states for passed observing conditions.
+            if (obsmask & obsconditions.mask(desi_mask[name].obsconditions)) != 0:
+                calib |= int(desi_mask[name])
+
+    table = {"rules": rules, "nkey": nkey, "rulestates": rulestates,
+             "states": states, "calib": calib}
+    _priority_tables[cachekey] = table
+
+    return table
+
+
 def calc_priority(targets, zcat, obscon, state=False):
     """
     Calculate target priorities from masks, observation/redshift status.
@@ -604,110 +720,27 @@ def calc_priority(targets, zcat, obscon, state=False):
     assert not np.any(zwarn & done)
     assert np.all(unobs | done | zgood | zwarn)
 
-    # DESI dark time targets.
+    # ADM look up the priority and state for each bit and observational
+    # ADM state in a table built from the yaml file, and find the highest
+    # ADM priority over the bits that are set for each target.
     if survey != 'cmx':
-        if desi_target in targets.dtype.names:
-            # ADM set initialstate of CALIB for potential calibration targets.
-            names = ('SKY', 'BAD_SKY', 'SUPP_SKY',
-                     'STD_FAINT', 'STD_WD', 'STD_BRIGHT')
-            for name in names:
-                # ADM only update states for passed observing conditions.
-                pricon = obsconditions.mask(desi_mask[name].obsconditions)
-                if (obsconditions.mask(obscon) & pricon) != 0:
-                    ii = (targets[desi_target] & desi_mask[name]) != 0
-                    target_state[ii] = "CALIB"
-
-            # ADM 'LRG' is the guiding column in SV and the main survey
-            # ADM (once, it was 'LRG_1PASS' and 'LRG_2PASS' in the MS).
-            # names = ('ELG', 'LRG_1PASS', 'LRG_2PASS')
-            # if survey[0:2] == 'sv':
-            names = ('ELG', 'LRG')
-            for name in names:
-                # ADM only update priorities for passed observing conditions.
-                pricon = obsconditions.mask(desi_mask[name].obsconditions)
-                if (obsconditions.mask(obscon) & pricon) != 0:
-                    ii = (targets[desi_target] & desi_mask[name]) != 0
-                    for sbool, sname in zip(
-                        [unobs, done, zgood, zwarn],
-                        ["UNOBS", "DONE", "MORE_ZGOOD", "MORE_ZWARN"]
-                    ):
-                        # ADM update priorities and target states.
-                        Mxp = desi_mask[name].priorities[sname]
-                        # ADM update states BEFORE changing priorities.
-                        ts = "{}|{}".format(name, sname)
-                        target_state[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, ts, target_state[ii & sbool])
-                        priority[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, Mxp, priority[ii & sbool])
-
-            # QSO could be Lyman-alpha or Tracer.
-            name = 'QSO'
-            # ADM only update priorities for passed observing conditions.
-            pricon = obsconditions.mask(desi_mask[name].obsconditions)
-            if (obsconditions.mask(obscon) & pricon) != 0:
-                ii = (targets[desi_target] & desi_mask[name]) != 0
-                # ADM all redshifts require more observations in SV.
-                # ADM (zcut is defined at the top of this module).
-                good_hiz = zgood & (zcat['Z'] >= zcut) & (zcat['ZWARN'] == 0)
-                if survey[:2] == 'sv':
-                    good_hiz = zgood & (zcat['ZWARN'] == 0)
-                for sbool, sname in zip(
-                        [unobs, done, good_hiz, ~good_hiz, zwarn],
-                        ["UNOBS", "DONE", "MORE_ZGOOD", "DONE", "MORE_ZWARN"]
-                ):
-                    # ADM update priorities and target states.
-                    Mxp = desi_mask[name].priorities[sname]
-                    # ADM update states BEFORE changing priorities.
-                    ts = "{}|{}".format(name, sname)
-                    target_state[ii & sbool] = np.where(
-                        priority[ii & sbool] < Mxp, ts, target_state[ii & sbool])
-                    priority[ii & sbool] = np.where(
-                        priority[ii & sbool] < Mxp, Mxp, priority[ii & sbool])
-
-        # BGS targets.
-        if bgs_target in targets.dtype.names:
-            for name in bgs_mask.names():
-                # ADM only update priorities for passed observing conditions.
-                pricon = obsconditions.mask(bgs_mask[name].obsconditions)
-                if (obsconditions.mask(obscon) & pricon) != 0:
-                    ii = (targets[bgs_target] & bgs_mask[name]) != 0
-                    for sbool, sname in zip(
-                            [unobs, done, zgood, zwarn],
-                            ["UNOBS", "DONE", "MORE_ZGOOD", "MORE_ZWARN"]
-                    ):
-                        # ADM update priorities and target states.
-                        Mxp = bgs_mask[name].priorities[sname]
-                        # ADM update states BEFORE changing priorities.
-                        ts = "{}|{}".format("BGS", sname)
-                        target_state[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, ts, target_state[ii & sbool])
-                        priority[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, Mxp, priority[ii & sbool])
-
-        # MWS targets.
-        if mws_target in targets.dtype.names:
-            for name in mws_mask.names():
-                # ADM only update priorities for passed observing conditions.
-                pricon = obsconditions.mask(mws_mask[name].obsconditions)
-                if (obsconditions.mask(obscon) & pricon) != 0:
-                    ii = (targets[mws_target] & mws_mask[name]) != 0
-                    for sbool, sname in zip(
-                            [unobs, done, zgood, zwarn],
-                            ["UNOBS", "DONE", "MORE_ZGOOD", "MORE_ZWARN"]
-                    ):
-                        # ADM update priorities and target states.
-                        Mxp = mws_mask[name].priorities[sname]
-                        # ADM update states BEFORE changing priorities.
-                        ts = "{}|{}".format("MWS", sname)
-                        target_state[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, ts, target_state[ii & sbool])
-                        priority[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, Mxp, priority[ii & sbool])
-
-        # ADM Secondary targets.
+        present = tuple(col in targets.dtype.names for col in colnames)
+        table = _priority_table(survey, obscon, colnames, masks, present)
+
+        # ADM the observational class of each target (see _OBSCLASSES).
+        good_hiz = zgood & (zcat['Z'] >= zcut) & (zcat['ZWARN'] == 0)
+        # ADM all redshifts require more observations in SV.
+        # ADM (zcut is defined at the top of this module).
+        if survey[:2] == 'sv':
+            good_hiz = zgood & (zcat['ZWARN'] == 0)
+        obsclass = np.select([unobs, done, good_hiz, zgood, zwarn],
+                             np.arange(len(_OBSCLASSES)))
+
+        # ADM only primaries with certain bits can be updated by secondaries.
+        # APC Secondary target bits only drive updates to targets with specific DESI_TARGET bits
+        # APC See https://github.com/desihub/desitarget/pull/530
+        scnd_update = None
         if scnd_target in targets.dtype.names:
-            # APC Secondary target bits only drive updates to targets with specific DESI_TARGET bits
-            # APC See https://github.com/desihub/desitarget/pull/530
             scnd_update = (targets[desi_target] & desi_mask['SCND_ANY']) != 0
             if np.any(scnd_update):
                 # APC Allow changes to primaries if the DESI_TARGET bitmask has any of the
@@ -719,29 +752,33 @@ def calc_priority(targets, zcat, obscon, state=False):
                 scnd_update &= ((targets[desi_target] & ~update_from_scnd_bits) == 0)
                 log.info('{} scnd targets to be updated'.format(scnd_update.sum()))
 
-            for name in scnd_mask.names():
-                # ADM only update priorities for passed observing conditions.
-                pricon = obsconditions.mask(scnd_mask[name].obsconditions)
-                if (obsconditions.mask(obscon) & pricon) != 0:
-                    ii = (targets[scnd_target] & scnd_mask[name]) != 0
-                    ii &= scnd_update
-                    for sbool, sname in zip(
-                            [unobs, done, zgood, zwarn],
-                            ["UNOBS", "DONE", "MORE_ZGOOD", "MORE_ZWARN"]
-                    ):
-                        # ADM update priorities and target states.
-                        Mxp = scnd_mask[name].priorities[sname]
-                        # ADM update states BEFORE changing priorities.
-                        ts = "{}|{}".format("SCND", sname)
-                        target_state[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, ts, target_state[ii & sbool])
-                        priority[ii & sbool] = np.where(
-                            priority[ii & sbool] < Mxp, Mxp, priority[ii & sbool])
+        # ADM the highest (priority, rule) key over every set bit.
+        best = np.zeros(len(targets), dtype='i8')
+        for col, bit, keys in table["rules"]:
+            ii = (targets[col] & bit) != 0
+            if col == scnd_target:
+                ii &= scnd_update
+            best = np.maximum(best, np.where(ii, keys[obsclass], 0))
+
+        # ADM decode the priority and state from the key. Targets with
+        # ADM no rule with a priority > 0 retain a priority of 0 and
+        # ADM an initial state of CALIB (if a calibration target) or "".
+        nkey = table["nkey"]
+        priority = best // nkey
+        statecode = table["rulestates"][best % nkey]
+        if desi_target in targets.dtype.names:
+            calib = (targets[desi_target] & table["calib"]) != 0
+            statecode[calib & (best == 0)] = table["states"].index("CALIB")
 
         # Special case: IN_BRIGHT_OBJECT means priority=-1 no matter what.
         ii = (targets[desi_target] & desi_mask.IN_BRIGHT_OBJECT) != 0
         priority[ii] = -1
-        target_state[ii] = "IN_BRIGHT_OBJECT"
+        statecode[ii] = table["states"].index("IN_BRIGHT_OBJECT")
+
+        # ADM states are only decoded to strings on output.
+        if state:
+            target_state = np.array(
+                table["states"], dtype=target_state.dtype)[statecode]
 
     # ADM Special case: SV-like commissioning targets.
     if 'CMX_TARGET' in targets.dtype.names:
@@ -0,0 +1,152 @@
+# ADM Benchmark brightmask.is_in_bright_mask against the original
+# ADM implementation (which matched every target to every mask at the
+# ADM largest NEAR_RADIUS of any mask with SkyCoord.search_around_sky
+# ADM and then looped over the elliptical masks in Python).
+# ADM Run as: python benchmark_bright_mask.py [nside] [density]
+# ADM targets are placed at random over one nside=`nside` HEALPixel
+# ADM (default 8, ~54 sq. deg.) at `density` per sq. deg. (default
+# ADM 5000, the combined density of targets and skies). Masks are placed
+# ADM at a density of ~25 per sq. deg. for stars (G < 13) with radii
+# ADM that grow quickly with brightness (up to ~10'), plus ~5 per sq.
+# ADM deg. elliptical masks for galaxies.
+
+
+def is_in_bright_mask_legacy(targs, sourcemask, inonly=False):
+    """The original implementation of
+    :func:`desitarget.brightmask.is_in_bright_mask`.
+    """
+    import numpy as np
+    from astropy.coordinates import SkyCoord
+    from astropy import units as u
+    from desitarget.brightmask import _rexlike, _psflike
+    from desitarget.geomask import is_in_ellipse
+
+    in_mask = np.zeros(len(targs), dtype=bool)
+    near_mask = np.zeros(len(targs), dtype=bool)
+    used_in_mask = np.zeros(len(sourcemask), dtype=bool)
+    used_near_mask = np.zeros(len(sourcemask), dtype=bool)
+
+    ctargs = SkyCoord(targs["RA"]*u.degree, targs["DEC"]*u.degree)
+    cmask = SkyCoord(sourcemask["RA"]*u.degree, sourcemask["DEC"]*u.degree)
+
+    maxrad = max(sourcemask["IN_RADIUS"])*u.arcsec
+    if not inonly:
+        maxrad = max(sourcemask["NEAR_RADIUS"])*u.arcsec
+
+    idtargs, idmask, d2d, d3d = cmask.search_around_sky(ctargs, maxrad)
+
+    rex_or_psf = _rexlike(sourcemask[idmask]["TYPE"]) | _psflike(
+        sourcemask[idmask]["TYPE"])
+    w_ellipse = np.where(~rex_or_psf)
+
+    if len(w_ellipse[0]) > 0:
+        idelltargs = idtargs[w_ellipse]
+        idellmask = idmask[w_ellipse]
+        targidineachmask = {}
+        for maskid in set(idellmask):
+            targidineachmask[maskid] = []
+        for index, targid in enumerate(idelltargs):
+            targidineachmask[idellmask[index]].append(targid)
+        for maskid in targidineachmask:
+            targids = targidineachmask[maskid]
+            ellras, elldecs = targs[targids]["RA"], targs[targids]["DEC"]
+            mask = sourcemask[maskid]
+            in_ell = is_in_ellipse(
+                ellras, elldecs, mask["RA"], mask["DEC"],
+                mask["IN_RADIUS"], mask["E1"], mask["E2"])
+            in_mask[targids] |= in_ell
+            used_in_mask[maskid] |= np.any(in_ell)
+            if not inonly:
+                in_ell = is_in_ellipse(ellras, elldecs,
+                                       mask["RA"], mask["DEC"],
+                                       mask["NEAR_RADIUS"],
+                                       mask["E1"], mask["E2"])
+                near_mask[targids] |= in_ell
+                used_near_mask[maskid] |= np.any(in_ell)
+
+    w_in = (d2d.arcsec < sourcemask[idmask]["IN_RADIUS"]) & (rex_or_psf)
+    in_mask[idtargs[w_in]] = True
+    used_in_mask[idmask[w_in]] = True
+
+    if not inonly:
+        w_near = (d2d.arcsec < sourcemask[idmask]["NEAR_RADIUS"]) & (rex_or_psf)
+        near_mask[idtargs[w_near]] = True
+        used_near_mask[idmask[w_near]] = True
+        return [in_mask, near_mask], [used_in_mask, used_near_mask]
+
+    return [in_mask], [used_in_mask]
+
+
+def random_in_hp(nside, pixnum, num, rng):
+    """`num` random RA/Dec locations in a (nested) HEALPixel."""
+    import numpy as np
+    import healpy as hp
+    # ADM sample an nside=8192 sub-pixel uniformly, and then uniformly
+    # ADM within a box around the sub-pixel center.
+    fac = (8192//nside)**2
+    sub = pixnum*fac + rng.randint(0, fac, num)
+    ras, decs = hp.pix2ang(8192, sub, nest=True, lonlat=True)
+    halfwidth = hp.nside2resol(8192, arcmin=True)/60./2.
+    decs = np.clip(decs + rng.uniform(-halfwidth, halfwidth, num), -90, 90)
+    ras = (ras + rng.uniform(-halfwidth, halfwidth, num) /
+           np.cos(np.radians(decs))) % 360
+
+    return ras, decs
+
+
+def make_fake_data(nside, density, rng):
+    """Targets and bright masks in HEALPixel 0 at `nside`."""
+    import numpy as np
+    import healpy as hp
+    from desitarget.brightmask import maskdatamodel
+    area = hp.nside2pixarea(nside, degrees=True)
+    pixnum = hp.ang2pix(nside, 150., 30., nest=True, lonlat=True)
+
+    targs = np.zeros(int(density*area), dtype=[("RA", ">f8"), ("DEC", ">f8")])
+    targs["RA"], targs["DEC"] = random_in_hp(nside, pixnum, len(targs), rng)
+
+    # ADM star counts that grow as 10**(0.35*G), normalized to 25
+    # ADM per sq. deg. brighter than G=13 (and 0.02 brighter than G=4).
+    nstar, ngal = int(25*area), int(5*area)
+    mask = np.zeros(nstar+ngal, dtype=maskdatamodel.dtype)
+    mask["RA"], mask["DEC"] = random_in_hp(nside, pixnum, len(mask), rng)
+    gmag = 13 + np.log10(rng.uniform(1e-3, 1, nstar))/0.35
+    mask["REF_MAG"][:nstar] = gmag
+    mask["IN_RADIUS"][:nstar] = np.minimum(1630.*1.396**(-gmag), 600.)
+    mask["TYPE"][:nstar] = 'PSF'
+    # ADM galaxies with radii of 5-60" and random ellipticities.
+    mask["IN_RADIUS"][nstar:] = 10**rng.uniform(np.log10(5), np.log10(60), ngal)
+    mask["E1"][nstar:] = rng.uniform(-0.5, 0.5, ngal)
+    mask["E2"][nstar:] = rng.uniform(-0.5, 0.5, ngal)
+    mask["TYPE"][nstar:] = rng.choice(['DEV', 'EXP', 'SER'], ngal)
+    mask["NEAR_RADIUS"] = 2*mask["IN_RADIUS"]
+
+    return targs, mask
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import sys
+    from time import time
+    import numpy as np
+    from desitarget.brightmask import is_in_bright_mask
+
+    nside = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    density = float(sys.argv[2]) if len(sys.argv) > 2 else 5000.
+    rng = np.random.RandomState(616)
+    targs, mask = make_fake_data(nside, density, rng)
+    print("{} targets and {} masks ({} elliptical) in an nside={} pixel".format(
+        len(targs), len(mask), np.sum(mask["E1"] != 0), nside))
+
+    print("inonly    legacy   is_in_bright_mask   speed-up")
+    for inonly in False, True:
+        start = time()
+        legacy = is_in_bright_mask_legacy(targs, mask, inonly=inonly)
+        tlegacy = time() - start
+        start = time()
+        new = is_in_bright_mask(targs, mask, inonly=inonly)
+        tnew = time() - start
+        for old, nu in zip(legacy[0] + legacy[1], new[0] + new[1]):
+            assert np.all(old == nu)
+        print("{:6s} {:8.2f}s {:18.2f}s {:9.1f}x".format(
+            str(inonly), tlegacy, tnew, tlegacy / tnew))
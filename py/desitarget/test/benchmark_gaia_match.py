@@ -0,0 +1,151 @@
+# ADM Benchmark gaiamatch.match_gaia_to_primary against the original
+# ADM implementation (which built a SkyCoord for, and ran
+# ADM search_around_sky on, each Gaia file in turn, and found Gaia
+# ADM objects to retain with a set difference for each file).
+# ADM Run as: python benchmark_gaia_match.py [nobjs] [gaiadensity]
+# ADM the objects (default 1500000, as for a full 10x5 degree sweep
+# ADM file) are placed at random in a sweeps-like box, with 20% of them
+# ADM offset from a Gaia source by up to 1". Gaia sources are placed at
+# ADM `gaiadensity` per sq. deg. (default 8000) in (nside=32) Gaia
+# ADM HEALPixel files in a temporary $GAIA_DIR.
+
+
+def match_gaia_to_primary_legacy(objs, matchrad=1., retaingaia=False,
+                                 gaiabounds=[0., 360., -90., 90.]):
+    """The original implementation of
+    :func:`desitarget.gaiamatch.match_gaia_to_primary`.
+    """
+    import numpy as np
+    from astropy.coordinates import SkyCoord
+    from astropy import units as u
+    from desitarget.gaiamatch import gaiadatamodel, read_gaia_file
+    from desitarget.gaiamatch import find_gaia_files, find_gaia_files_box
+
+    if retaingaia:
+        ramin, ramax, decmin, decmax = gaiabounds
+    cobjs = SkyCoord(objs["RA"]*u.degree, objs["DEC"]*u.degree)
+    nobjs = cobjs.size
+    gaiainfo = np.zeros(nobjs, dtype=gaiadatamodel.dtype)
+    suppgaiainfo = np.zeros(0, dtype=gaiadatamodel.dtype)
+    gaiainfo['REF_ID'] = -1
+    if retaingaia:
+        gaiafiles = find_gaia_files_box(gaiabounds)
+    else:
+        gaiafiles = find_gaia_files(objs)
+    for file in gaiafiles:
+        gaia = read_gaia_file(file)
+        cgaia = SkyCoord(gaia["GAIA_RA"]*u.degree, gaia["GAIA_DEC"]*u.degree)
+        idobjs, idgaia, _, _ = cgaia.search_around_sky(cobjs, matchrad*u.arcsec)
+        gaiainfo[idobjs] = gaia[idgaia]
+        if retaingaia:
+            nomatch = set(np.arange(len(gaia)))-set(idgaia)
+            noidgaia = np.array(list(nomatch))
+            if len(noidgaia) > 0:
+                suppg = gaia[noidgaia]
+                winbounds = np.where(
+                    (suppg["GAIA_RA"] >= ramin) & (suppg["GAIA_RA"] < ramax)
+                    & (suppg["GAIA_DEC"] >= decmin) & (suppg["GAIA_DEC"] < decmax)
+                )[0]
+                if len(winbounds) > 0:
+                    suppgaiainfo = np.hstack([suppgaiainfo, suppg[winbounds]])
+    if retaingaia:
+        gaiainfo = np.hstack([gaiainfo, suppgaiainfo])
+
+    return gaiainfo
+
+
+def write_fake_gaia_dir(gaiadir, bounds, density, rng):
+    """Write (nside=32) Gaia HEALPixel files covering `bounds` (plus a
+    5 degree margin) at `density` sources per sq. deg. to `gaiadir`.
+    """
+    import os
+    import numpy as np
+    import fitsio
+    import healpy as hp
+    from desitarget.io import hpx_filename
+    from desitarget.geomask import box_area
+    from desitarget.gaiamatch import ingaiadatamodel
+
+    ramin, ramax, decmin, decmax = bounds
+    box = [ramin-5, ramax+5, decmin-5, decmax+5]
+    ngaia = int(density*box_area(box))
+    gaia = np.zeros(ngaia, dtype=ingaiadatamodel.dtype)
+    gaia["RA"] = rng.uniform(box[0], box[1], ngaia)
+    # ADM uniform on the sphere.
+    sindec = rng.uniform(np.sin(np.radians(box[2])),
+                         np.sin(np.radians(box[3])), ngaia)
+    gaia["DEC"] = np.degrees(np.arcsin(sindec))
+    gaia["SOURCE_ID"] = np.arange(ngaia)
+    gaia["REF_CAT"] = 'G2'
+    for col in gaia.dtype.names[4:]:
+        if gaia[col].dtype.kind == 'f':
+            gaia[col] = rng.uniform(0.1, 20, ngaia)
+    pixnum = hp.ang2pix(32, gaia["RA"], gaia["DEC"], nest=True, lonlat=True)
+    hpxdir = os.path.join(gaiadir, "healpix")
+    os.makedirs(hpxdir, exist_ok=True)
+    for pix in np.unique(pixnum):
+        fitsio.write(os.path.join(hpxdir, hpx_filename(pix)),
+                     gaia[pixnum == pix], extname="GAIAHPX",
+                     header={"HPXNSIDE": 32, "HPXNEST": True})
+
+    return gaia
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import os
+    import sys
+    import shutil
+    import tempfile
+    from time import time
+    import numpy as np
+
+    nobjs = int(sys.argv[1]) if len(sys.argv) > 1 else 1500000
+    density = float(sys.argv[2]) if len(sys.argv) > 2 else 8000.
+    rng = np.random.RandomState(616)
+    bounds = [150., 160., 25., 30.]
+
+    gaiadir = tempfile.mkdtemp()
+    os.environ["GAIA_DIR"] = gaiadir
+    from desitarget.gaiamatch import match_gaia_to_primary
+    from desitarget.geomask import match_within_radii
+    try:
+        start = time()
+        gaia = write_fake_gaia_dir(gaiadir, bounds, density, rng)
+        print("Wrote {} Gaia sources to {}...t = {:.1f}s".format(
+            len(gaia), gaiadir, time()-start))
+        objs = np.zeros(nobjs, dtype=[("RA", ">f8"), ("DEC", ">f8")])
+        objs["RA"] = rng.uniform(bounds[0], bounds[1], nobjs)
+        objs["DEC"] = rng.uniform(bounds[2], bounds[3], nobjs)
+        ingaia = np.where((gaia["RA"] >= bounds[0]) & (gaia["RA"] < bounds[1]) &
+                          (gaia["DEC"] >= bounds[2]) & (gaia["DEC"] < bounds[3]))[0]
+        ii = rng.choice(ingaia, nobjs//5, replace=False)
+        objs["RA"][:nobjs//5] = gaia["RA"][ii] + rng.uniform(-1, 1, nobjs//5)/3600.
+        objs["DEC"][:nobjs//5] = gaia["DEC"][ii] + rng.uniform(-1, 1, nobjs//5)/3600.
+
+        for retaingaia in False, True:
+            start = time()
+            legacy = match_gaia_to_primary_legacy(
+                objs, retaingaia=retaingaia, gaiabounds=bounds)
+            tlegacy = time() - start
+            start = time()
+            new = match_gaia_to_primary(
+                objs, retaingaia=retaingaia, gaiabounds=bounds)
+            tnew = time() - start
+            # ADM the matches are the same, except where an object has
+            # ADM more than one Gaia source within 1" (when the legacy
+            # ADM code retained an arbitrary match).
+            idobjs, _, _ = match_within_radii(objs["RA"], objs["DEC"],
+                                              gaia["RA"], gaia["DEC"], 1.)
+            multi = np.bincount(idobjs, minlength=nobjs) > 1
+            same = np.all(legacy[:nobjs][~multi] == new[:nobjs][~multi])
+            # ADM the retained Gaia sources are the same (in any order).
+            retained = np.all(np.sort(legacy[nobjs:], order="REF_ID") ==
+                              np.sort(new[nobjs:], order="REF_ID"))
+            print("retaingaia={}: {} matched, {} ambiguous, {} retained; "
+                  "identical={}; legacy {:.1f}s, new {:.1f}s ({:.1f}x)".format(
+                      retaingaia, np.sum(new["REF_ID"][:nobjs] >= 0),
+                      np.sum(multi), len(new) - nobjs, same and retained,
+                      tlegacy, tnew, tlegacy/tnew))
+    finally:
+        shutil.rmtree(gaiadir)
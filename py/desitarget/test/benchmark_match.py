@@ -0,0 +1,57 @@
+# ADM Benchmark joining a zcat to a set of targets on TARGETID, using
+# ADM the dictionary look-up that mtl.make_mtl() originally used, as
+# ADM compared to desitarget.geomask.match_to().
+# ADM Run as: python benchmark_match.py [log10(ntargets) ...]
+# ADM the default is to run for 10^6, 10^7 and 10^8 targets, with a
+# ADM zcat of 10% of the targets (plus some TARGETIDs with no match).
+# ADM the dictionary look-up is skipped for more than 10^7 targets as
+# ADM it needs ~10 GB of memory for 10^8 targets.
+
+
+def match_dict(targetids, ztargetids):
+    """The original approach of :func:`desitarget.mtl.make_mtl`.
+    """
+    import numpy as np
+    ok = np.in1d(ztargetids, targetids)
+    ztargetids = ztargetids[ok]
+    d = dict(tuple(zip(targetids, np.arange(len(targetids)))))
+    return np.array([d[tid] for tid in ztargetids])
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import sys
+    from time import time
+    import numpy as np
+    from desitarget.geomask import match_to
+
+    lognums = [int(arg) for arg in sys.argv[1:]] or [6, 7, 8]
+    rng = np.random.RandomState(616)
+    print("ntargets   nzcat      dict+in1d   match_to   speed-up")
+    for lognum in lognums:
+        ntarg = 10**lognum
+        # ADM unique TARGETIDs spread over the full range of bits.
+        targetids = np.unique(rng.randint(0, 2**62, ntarg, dtype=np.int64))
+        rng.shuffle(targetids)
+        nz = ntarg // 10
+        ztargetids = np.concatenate([rng.choice(targetids, nz - nz//100),
+                                     rng.randint(0, 2**62, nz//100)])
+
+        start = time()
+        idx = match_to(targetids, ztargetids)
+        tmatch = time() - start
+        assert np.all(targetids[idx[idx >= 0]] == ztargetids[idx >= 0])
+
+        tdict = np.nan
+        if lognum <= 7:
+            start = time()
+            dictidx = match_dict(targetids, ztargetids)
+            tdict = time() - start
+            assert np.all(dictidx == idx[idx >= 0])
+
+        if np.isnan(tdict):
+            print("{:<10.0e} {:<10.0e} {:>10s} {:9.2f}s {:>10s}".format(
+                len(targetids), nz, "-", tmatch, "-"))
+        else:
+            print("{:<10.0e} {:<10.0e} {:9.2f}s {:9.2f}s {:9.1f}x".format(
+                len(targetids), nz, tdict, tmatch, tdict / tmatch))
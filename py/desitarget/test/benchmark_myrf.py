@@ -0,0 +1,38 @@
+# ADM Benchmark the packed Random Forest evaluator (myRF.packedRF)
+# ADM against the original recursive evaluator (myRF.myRF).
+# ADM Run as: python benchmark_myrf.py [nrows] [ntrees]
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import sys
+    import numpy as np
+    from time import time
+    from pkg_resources import resource_filename
+    from desitarget.myRF import myRF, packedRF
+
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    ntrees = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    forestfile = resource_filename('desitarget', 'data/rf_model_dr7_HighZ.npz')
+
+    # ADM fake "colors" that roughly span the QSO RF preselection.
+    rng = np.random.RandomState(616)
+    data = rng.normal(0, 1.5, (nrows, 11))
+    data[:, 10] = rng.uniform(17.5, 22.7, nrows)
+
+    start = time()
+    rf = myRF(data, "", numberOfTrees=ntrees, version=2)
+    rf.loadForest(forestfile)
+    proba = rf.predict_proba()
+    trecursive = time() - start
+    print("myRF:     {} rows, {} trees...t = {:.1f}s".format(
+        nrows, ntrees, trecursive))
+
+    start = time()
+    prf = packedRF.fromForestFile(forestfile, numberOfTrees=ntrees)
+    pproba = prf.predict_proba(data)
+    tpacked = time() - start
+    print("packedRF: {} rows, {} trees...t = {:.1f}s".format(
+        nrows, ntrees, tpacked))
+
+    print("speed-up: {:.2f}x; bit-identical: {}".format(
+        trecursive/tpacked, np.array_equal(proba, pproba)))
@@ -0,0 +1,90 @@
+# ADM Benchmark geomask.radec_match_to against the original
+# ADM implementation (which used astropy's SkyCoord.match_to_catalog_sky).
+# ADM Run as: python benchmark_radec_match.py [maxpower] [legacymaxpower]
+# ADM for each N = 10**5, 10**6, ..., 10**`maxpower` (default 7), N
+# ADM objects are matched at 1" to a catalog of N sources spread over
+# ADM the sphere (with half of the objects offset from a source by up
+# ADM to 1"). The catalog is matched to twice (the second time using
+# ADM the cached KD-tree) and once in nside=16 HEALPixel chunks. The
+# ADM legacy code is only run for N <= 10**`legacymaxpower` (default 7),
+# ADM as it needs far too much memory for larger N. N=10**8 needs
+# ADM more than ~10 GB of memory just for the coordinates and trees.
+
+
+def radec_match_to_legacy(matchto, objs, sep=1., radec=False,
+                          return_sep=False):
+    """The original implementation of
+    :func:`desitarget.geomask.radec_match_to`.
+    """
+    import numpy as np
+    from astropy.coordinates import SkyCoord
+    from astropy import units as u
+
+    if radec:
+        ram, decm = matchto
+        ra, dec = objs
+    else:
+        ram, decm = matchto["RA"], matchto["DEC"]
+        ra, dec = objs["RA"], objs["DEC"]
+
+    cmatchto = SkyCoord(ram*u.degree, decm*u.degree)
+    cobjs = SkyCoord(ra*u.degree, dec*u.degree)
+
+    idmatchto, d2d, _ = cobjs.match_to_catalog_sky(cmatchto)
+    idobjs = np.arange(len(cobjs))
+
+    ii = d2d < sep*u.arcsec
+
+    if return_sep:
+        return idmatchto[ii], idobjs[ii], d2d[ii].arcsec
+
+    return idmatchto[ii], idobjs[ii]
+
+
+def make_fake_data(nobjs, rng):
+    """`nobjs` sources over the sphere, and `nobjs` objects, half of
+    which are within 1" of a source."""
+    import numpy as np
+    ram = rng.uniform(0, 360, nobjs)
+    decm = np.degrees(np.arcsin(rng.uniform(-1, 1, nobjs)))
+    ra = rng.uniform(0, 360, nobjs)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, nobjs)))
+    ii = rng.randint(0, nobjs, nobjs//2)
+    dec[:nobjs//2] = np.clip(decm[ii] + rng.uniform(-0.7, 0.7, nobjs//2)/3600.,
+                             -90, 90)
+    ra[:nobjs//2] = (ram[ii] + rng.uniform(-0.7, 0.7, nobjs//2)/3600. /
+                     np.cos(np.radians(dec[:nobjs//2]))) % 360
+
+    return ram, decm, ra, dec
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import sys
+    from time import time
+    import numpy as np
+    from desitarget.geomask import radec_match_to
+
+    maxpower = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    legacymaxpower = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    rng = np.random.RandomState(616)
+
+    print("        N    legacy       new    cached   chunked   speed-up  identical")
+    for power in range(5, maxpower+1):
+        ram, decm, ra, dec = make_fake_data(10**power, rng)
+        times = []
+        for kwargs in {"cache": True}, {"cache": True}, {"nside": 16}:
+            start = time()
+            new = radec_match_to([ram, decm], [ra, dec], radec=True,
+                                 return_sep=True, **kwargs)
+            times.append(time() - start)
+        tlegacy, same = np.nan, "-"
+        if power <= legacymaxpower:
+            start = time()
+            legacy = radec_match_to_legacy([ram, decm], [ra, dec], radec=True,
+                                           return_sep=True)
+            tlegacy = time() - start
+            same = all([np.all(old == nu) for old, nu in zip(legacy, new)])
+        print("{:9d} {:8.2f}s {:8.2f}s {:8.2f}s {:8.2f}s {:9.1f}x  {}".format(
+            10**power, tlegacy, times[0], times[1], times[2],
+            tlegacy/times[0], same))
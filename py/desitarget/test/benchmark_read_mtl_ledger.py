@@ -0,0 +1,122 @@
+# ADM Benchmark the wall time and peak memory of io.read_mtl_ledger for
+# ADM ECSV ledgers against the original implementation (which read the
+# ADM ledger with Table.read and then copied it column-by-column into a
+# ADM second array with the final dtype).
+# ADM Run as: python benchmark_read_mtl_ledger.py [ledger or nrows]
+# ADM if nrows is passed (the default is 2000000) an ECSV ledger of that
+# ADM many rows, including quoted strings, is written to a temporary
+# ADM directory.
+
+
+def read_mtl_ledger_legacy(filename):
+    """The original implementation of :func:`desitarget.io.read_mtl_ledger`
+    for ECSV ledgers with `unique` ``False``.
+    """
+    import numpy as np
+    from astropy.table import Table
+    from desitarget.io import _read_ecsv_header
+    from desitarget.mtl import mtldatamodel as mtldm
+
+    ecsvhdr = _read_ecsv_header(filename)
+    dt = []
+    for col in ecsvhdr["datatype"]:
+        form = col["datatype"]
+        if 'string' in form:
+            form = mtldm[col["name"]].dtype.str
+        dt.append((col["name"], form))
+    prelim = Table.read(filename, comment='#', format='ascii.basic',
+                        guess=False)
+    mtl = np.zeros(len(prelim), dtype=dt)
+    for col in prelim.columns:
+        mtl[col] = prelim[col]
+
+    return mtl
+
+
+def write_fake_ledger(filename, nrows):
+    """Write an ECSV ledger with the MTL data model, where TARGET_STATE
+    includes empty strings and strings that contain spaces.
+    """
+    import numpy as np
+    from astropy.io import ascii
+    from astropy.table import Table
+    from desitarget.io import write_with_units
+    from desitarget.mtl import mtldatamodel, mtlformatdict
+
+    rng = np.random.RandomState(616)
+    data = np.zeros(nrows, dtype=mtldatamodel.dtype)
+    for col in data.dtype.names:
+        if data[col].dtype.kind in 'fi':
+            data[col] = rng.uniform(0, 360, nrows)
+    data["TARGETID"] = rng.randint(0, 2**60, nrows)
+    data["TIMESTAMP"] = b'2020-10-27T12:34:56'
+    data["VERSION"] = b'0.43.0.dev4234'
+    data["TARGET_STATE"] = rng.choice(
+        [b'ELG|UNOBS', b'QSO|MORE_ZGOOD', b'CALIB', b'', b'A B'], nrows)
+    # ADM write the header and first row, then append the rest of the
+    # ADM rows as for update_ledger (which is much quicker).
+    write_with_units(filename, data[:1], extname='MTL',
+                     header={"OBSCON": "DARK"}, ecsv=True)
+    with open(filename, "a") as f:
+        ascii.write(Table(data[1:]), f, format='no_header',
+                    formats=mtlformatdict)
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import os
+    import sys
+    import json
+    import resource
+    import subprocess
+    import tempfile
+    from time import time
+
+    # ADM each reader is run in a fresh process so that its peak memory
+    # ADM can be measured in isolation.
+    if sys.argv[1] == "--reader":
+        reader, filename = sys.argv[2:]
+        from desitarget import io
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time()
+        if reader == "legacy":
+            read_mtl_ledger_legacy(filename)
+        else:
+            io.read_mtl_ledger(filename, unique=False)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps([time() - start, (rss - rss0) / 1024.]))
+        sys.exit(0)
+    if sys.argv[1] == "--write":
+        write_fake_ledger(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    arg = sys.argv[1] if len(sys.argv) > 1 else "2000000"
+    tmpdir = None
+    if os.path.exists(arg):
+        filename = arg
+    else:
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, "mtl-dark-hp-0.ecsv")
+        start = time()
+        # ADM write in a separate process, as the readers would otherwise
+        # ADM inherit its peak memory.
+        subprocess.check_call(
+            [sys.executable, __file__, "--write", filename, arg])
+        print("Wrote {} rows to {}...t = {:.1f}s".format(
+            arg, filename, time() - start))
+
+    try:
+        results = {}
+        for reader in "legacy", "read_mtl_ledger":
+            out = subprocess.check_output(
+                [sys.executable, __file__, "--reader", reader, filename])
+            results[reader] = json.loads(out.decode().split("\n")[-2])
+            print("{:15s}: t = {:.1f}s; peak RSS = {:.0f} MB".format(
+                reader, *results[reader]))
+        print("speed-up: {:.2f}x; peak memory reduced by {:.2f}x".format(
+            results["legacy"][0] / results["read_mtl_ledger"][0],
+            results["legacy"][1] / results["read_mtl_ledger"][1]))
+    finally:
+        if tmpdir is not None:
+            os.remove(filename)
+            os.rmdir(tmpdir)
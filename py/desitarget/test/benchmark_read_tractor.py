@@ -0,0 +1,124 @@
+# ADM Benchmark the wall time and peak memory of io.read_tractor against
+# ADM the original implementation (which read every column with fitsio
+# ADM and then copied them into a second array with the final dtype).
+# ADM Run as: python benchmark_read_tractor.py [sweepfile or nrows]
+# ADM if nrows is passed (the default is 1000000) a DR9-like sweep file
+# ADM of that many rows is written to a temporary directory.
+
+
+def read_tractor_legacy(filename, columns=None):
+    """The original implementation of :func:`desitarget.io.read_tractor`.
+    """
+    import numpy as np
+    import fitsio
+    from desitarget.io import tractor_datamodel, release_to_photsys
+
+    indata = fitsio.read(filename, upper=True, columns=columns)
+    dt = [d for d in tractor_datamodel(indata.dtype.names)
+          if d[0] != "PHOTSYS"]
+    if columns is not None:
+        dt = [d for d in dt if d[0] in columns]
+    data = np.zeros(len(indata), dtype=dt)
+    if "REF_ID" in data.dtype.names:
+        data['REF_ID'] = -1
+    for col in set(indata.dtype.names).intersection(set(data.dtype.names)):
+        data[col] = indata[col]
+    for colname in data.dtype.names:
+        kind = data[colname].dtype.kind
+        if kind == 'U' or kind == 'S':
+            data[colname] = np.char.rstrip(data[colname])
+    # ADM the original add_photsys() also made a copy of the data.
+    outdata = np.empty(len(data), dtype=data.dtype.descr+[('PHOTSYS', 'U1')])
+    for col in data.dtype.names:
+        outdata[col] = data[col]
+    outdata['PHOTSYS'] = release_to_photsys(data["RELEASE"])
+
+    return outdata
+
+
+def write_fake_sweep(filename, nrows):
+    """Write a sweep file with the DR9 data model (plus a few columns
+    that aren't in the desitarget data model).
+    """
+    import numpy as np
+    import fitsio
+    from desitarget.io import tractor_datamodel
+
+    dt = [d for d in tractor_datamodel([]) if d[0] != "PHOTSYS"]
+    dt += [(col, '>f4') for col in ['PSFSIZE_G', 'PSFSIZE_R', 'PSFSIZE_Z',
+                                    'NEA_G', 'NEA_R', 'NEA_Z']]
+    rng = np.random.RandomState(616)
+    data = np.zeros(nrows, dtype=dt)
+    for col in data.dtype.names:
+        if data[col].dtype.kind in 'fiu':
+            data[col] = rng.uniform(0, 10, data[col].shape)
+    data["RELEASE"] = rng.choice([9010, 9011], nrows)
+    data["TYPE"] = rng.choice([b'PSF ', b'REX ', b'DEV ', b'EXP ', b'SER '],
+                              nrows)
+    data["BRICKNAME"] = b'3145m032'
+    data["REF_CAT"] = rng.choice([b'G2', b'  '], nrows)
+    fitsio.write(filename, data, extname='SWEEP', clobber=True)
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import os
+    import sys
+    import json
+    import resource
+    import subprocess
+    import tempfile
+    from time import time
+
+    # ADM a read of a subset of columns, as for a run for, e.g., LRGs.
+    lrgcols = ['RELEASE', 'TYPE', 'FLUX_G', 'FLUX_R', 'FLUX_Z', 'FLUX_W1',
+               'FLUX_IVAR_R', 'FLUX_IVAR_Z', 'FLUX_IVAR_W1', 'FIBERFLUX_Z',
+               'MW_TRANSMISSION_G', 'MW_TRANSMISSION_R', 'MW_TRANSMISSION_Z',
+               'MW_TRANSMISSION_W1', 'NOBS_G', 'NOBS_R', 'NOBS_Z', 'MASKBITS',
+               'GAIA_PHOT_G_MEAN_MAG', 'GAIA_ASTROMETRIC_EXCESS_NOISE']
+
+    # ADM each reader is run in a fresh process so that its peak memory
+    # ADM can be measured in isolation.
+    if sys.argv[1] == "--reader":
+        reader, filename, columns = sys.argv[2:]
+        columns = None if columns == "all" else lrgcols
+        from desitarget import io
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time()
+        if reader == "legacy":
+            read_tractor_legacy(filename, columns=columns)
+        else:
+            io.read_tractor(filename, columns=columns)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps([time() - start, (rss - rss0) / 1024.]))
+        sys.exit(0)
+
+    arg = sys.argv[1] if len(sys.argv) > 1 else "1000000"
+    tmpdir = None
+    if os.path.exists(arg):
+        filename = arg
+    else:
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, "sweep-000m000-010p010.fits")
+        start = time()
+        write_fake_sweep(filename, int(arg))
+        print("Wrote {} rows to {}...t = {:.1f}s".format(
+            arg, filename, time() - start))
+
+    try:
+        for columns in "all", "LRG":
+            results = {}
+            for reader in "legacy", "read_tractor":
+                out = subprocess.check_output(
+                    [sys.executable, __file__, "--reader", reader,
+                     filename, columns])
+                results[reader] = json.loads(out.decode().split("\n")[-2])
+                print("{:12s} {:3s} columns: t = {:.1f}s; peak RSS = {:.0f} MB"
+                      .format(reader, columns, *results[reader]))
+            print("speed-up: {:.2f}x; peak memory reduced by {:.2f}x".format(
+                results["legacy"][0] / results["read_tractor"][0],
+                results["legacy"][1] / results["read_tractor"][1]))
+    finally:
+        if tmpdir is not None:
+            os.remove(filename)
+            os.rmdir(tmpdir)
@@ -0,0 +1,61 @@
+# ADM Estimate how long select_targets takes to process a list of sweep
+# ADM files ("the makespan") when files are sent to processes in list
+# ADM order, as compared to sending the most expensive files first.
+# ADM sharedmem.MapReduce passes each file to the next free process, so
+# ADM the makespan can be simulated from the cost of each file.
+# ADM Run as: python benchmark_schedule.py [sweepdir] [timingfile]
+# ADM if sweepdir is passed, costs are estimated from the headers of
+# ADM the sweep files (and any timingfile from an earlier run of
+# ADM select_targets). Otherwise, costs are simulated for DR9-like
+# ADM sweeps, for which the number of rows is dominated by stars near
+# ADM the Galactic plane.
+
+
+def makespan(costs, numproc):
+    """Time to process `costs`, in order, each by the next free process.
+    """
+    import heapq
+    free = [0.] * numproc
+    for cost in costs:
+        heapq.heappush(free, heapq.heappop(free) + cost)
+    return max(free)
+
+
+def fake_sweep_costs():
+    """Number of rows in DR9-like sweep files, in file name order.
+    """
+    import numpy as np
+    from astropy.coordinates import SkyCoord
+    import astropy.units as u
+    ras, decs = np.meshgrid(np.arange(5, 360, 10), np.arange(-67.5, 90, 5))
+    ii = np.argsort(ras.ravel(), kind='stable')
+    ras, decs = ras.ravel()[ii], decs.ravel()[ii]
+    b = SkyCoord(ras*u.deg, decs*u.deg).galactic.b.deg
+    rng = np.random.RandomState(616)
+    # ADM ~5 million stars in a 50 sq. deg. sweep at b=0, plus galaxies.
+    nrows = 1e5*(1 + 50*np.exp(-np.abs(b)/8.))*rng.lognormal(0, 0.3, len(b))
+    return nrows
+
+
+# ADM prevent import from running this code.
+if __name__ == "__main__":
+    import sys
+    import numpy as np
+
+    if len(sys.argv) > 1:
+        from desitarget import io
+        infiles = io.list_sweepfiles(sys.argv[1])
+        timingfile = sys.argv[2] if len(sys.argv) > 2 else None
+        costs = io.sweep_file_costs(infiles, timingfile=timingfile)
+        print("{} sweep files in {}".format(len(costs), sys.argv[1]))
+    else:
+        costs = fake_sweep_costs()
+        print("{} simulated DR9-like sweep files".format(len(costs)))
+
+    print("numproc  list-order  largest-first  lower-bound  improvement")
+    for numproc in 4, 16, 32, 64:
+        inorder = makespan(costs, numproc)
+        sortd = makespan(np.sort(costs)[::-1], numproc)
+        bound = max(costs.sum() / numproc, costs.max())
+        print("{:7d}  {:10.3g}  {:13.3g}  {:11.3g}  {:10.1f}%".format(
+            numproc, inorder, sortd, bound, 100*(inorder-sortd)/inorder))
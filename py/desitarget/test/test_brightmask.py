@@ -15,7 +15,7 @@ import healpy as hp
 import tempfile
 import shutil
 
-from desitarget import brightmask, io
+from desitarget import brightmask, io, geomask, gaiamatch
 from desitarget.targetmask import desi_mask, targetid_mask
 
 from desiutil import brick
@@ -105,6 +105,23 @@ class TestBRIGHTMASK(unittest.TestCase):
         self.assertTrue(len(set(mx["REF_ID"]) - set(self.allmx["REF_ID"])) == 0)
         self.assertTrue(len(set(self.allmx["REF_ID"]) - set(mx["REF_ID"])) > 0)
 
+        # ADM Gaia files that are already cached give the same mask.
+        gaiamatch.set_gaia_cache(maxbytes=2*1024**3)
+        try:
+            gaiadir = os.path.join(os.environ["GAIA_DIR"], "healpix")
+            gaiafns = glob(os.path.join(gaiadir, "*fits"))
+            for fn in gaiafns:
+                gaiamatch.read_gaia_file(fn, cache=True)
+            gaiamatch.gaia_cache_stats(reset=True)
+            cmx = brightmask.make_bright_star_mask_in_hp(
+                self.nside, self.pixnum[0],
+                maglim=self.maglim, maskepoch=self.maskepoch)
+            self.assertTrue(np.all(cmx == mx))
+            self.assertTrue(gaiamatch.gaia_cache_stats()["hits"] > 0)
+        finally:
+            gaiamatch.set_gaia_cache(maxbytes=0)
+            gaiamatch.clear_gaia_cache()
+
     def test_make_bright_star_mask_parallel(self):
         """Check running the mask-making code in parallel.
         """
@@ -194,6 +211,56 @@ class TestBRIGHTMASK(unittest.TestCase):
         # ADM none of the targets should be in a mask.
         self.assertTrue(np.all(mxtargs["DESI_TARGET"] == 0))
 
+    def test_is_in_bright_mask(self):
+        """Test targets in circular and elliptical masks at all radii.
+        """
+        rng = np.random.RandomState(616)
+        targs = np.zeros(3000, dtype=[("RA", ">f8"), ("DEC", ">f8")])
+        targs["RA"] = rng.uniform(359.5, 360.5, len(targs)) % 360
+        targs["DEC"] = rng.uniform(29.5, 30.5, len(targs))
+        mask = np.zeros(60, dtype=brightmask.maskdatamodel.dtype)
+        mask["RA"] = rng.uniform(359.6, 360.4, len(mask)) % 360
+        mask["DEC"] = rng.uniform(29.6, 30.4, len(mask))
+        # ADM radii from 1" to 10', some of which are zero.
+        mask["IN_RADIUS"] = 10**rng.uniform(0, 2.8, len(mask))
+        mask["IN_RADIUS"][::10] = 0
+        mask["NEAR_RADIUS"] = 2*mask["IN_RADIUS"]
+        mask["E1"] = rng.uniform(-0.5, 0.5, len(mask))
+        mask["E2"] = rng.uniform(-0.5, 0.5, len(mask))
+        mask["TYPE"] = rng.choice([b'PSF', b'REX', b'DEV', b'EXP'], len(mask))
+        # ADM ellipses near RA=0 aren't sensible in the small angle
+        # ADM approximation, so only place the ellipses at RA > 0.
+        isell = ~np.isin(mask["TYPE"], [b'PSF', b'REX'])
+        mask["RA"][isell] = rng.uniform(0.05, 0.4, np.sum(isell))
+
+        # ADM the answer for every pair of targets and masks.
+        ctargs = SkyCoord(targs["RA"]*u.deg, targs["DEC"]*u.deg)
+        isin = {}
+        for rad in "IN_RADIUS", "NEAR_RADIUS":
+            isin[rad] = np.zeros((len(mask), len(targs)), dtype=bool)
+            for i, mx in enumerate(mask):
+                if mx["TYPE"] in [b'PSF', b'REX']:
+                    sep = SkyCoord(mx["RA"]*u.deg, mx["DEC"]*u.deg).separation(
+                        ctargs).arcsec
+                    isin[rad][i] = sep < mx[rad]
+                elif mx[rad] > 0:
+                    isin[rad][i] = geomask.is_in_ellipse(
+                        targs["RA"], targs["DEC"], mx["RA"], mx["DEC"],
+                        mx[rad], mx["E1"], mx["E2"])
+
+        intargs, inmasks = brightmask.is_in_bright_mask(targs, mask)
+        for i, rad in enumerate(["IN_RADIUS", "NEAR_RADIUS"]):
+            self.assertTrue(np.all(intargs[i] == np.any(isin[rad], axis=0)))
+            self.assertTrue(np.all(inmasks[i] == np.any(isin[rad], axis=1)))
+        intargs, inmasks = brightmask.is_in_bright_mask(targs, mask,
+                                                        inonly=True)
+        self.assertEqual(len(intargs), 1)
+        self.assertTrue(np.all(intargs[0] == np.any(isin["IN_RADIUS"], axis=0)))
+        self.assertTrue(np.all(inmasks[0] == np.any(isin["IN_RADIUS"], axis=1)))
+        # ADM sanity check that the test covers all types of masking.
+        self.assertTrue(0 < np.sum(intargs[0]) < len(targs))
+        self.assertTrue(0 < np.sum(inmasks[0] & isell) < np.sum(isell))
+
     def test_safe_locations(self):
         """Test SAFE/BADSKY locations are equidistant from mask centers.
         """
@@ -5,6 +5,8 @@
 import unittest
 from pkg_resources import resource_filename
 import os.path
+import shutil
+import tempfile
 from uuid import uuid4
 import numbers
 import warnings
@@ -42,11 +44,23 @@ class TestCMX(unittest.TestCase):
         cls.gaiadir_orig = os.getenv("GAIA_DIR")
         os.environ["GAIA_DIR"] = resource_filename('desitarget.test', 't4')
 
+        # ADM write the sweep-footprint cache to a scratch directory
+        # ADM rather than to ~/.cache/desitarget.
+        cls.cachedir = tempfile.mkdtemp()
+        cls.cacheorig = os.getenv("DESITARGET_CACHE")
+        os.environ["DESITARGET_CACHE"] = cls.cachedir
+
     @classmethod
     def tearDownClass(cls):
         # ADM reset GAIA_DIR environment variable.
         if cls.gaiadir_orig is not None:
             os.environ["GAIA_DIR"] = cls.gaiadir_orig
+        # ADM reset DESITARGET_CACHE and remove the scratch cache.
+        if cls.cacheorig is None:
+            os.environ.pop("DESITARGET_CACHE", None)
+        else:
+            os.environ["DESITARGET_CACHE"] = cls.cacheorig
+        shutil.rmtree(cls.cachedir)
 
     def setUp(self):
         # Treat a specific warning as an error (could turn off if this
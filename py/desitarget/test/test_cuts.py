@@ -5,6 +5,8 @@
 import unittest
 from pkg_resources import resource_filename
 import os.path
+import shutil
+import tempfile
 from uuid import uuid4
 import numbers
 import warnings
@@ -42,11 +44,23 @@ class TestCuts(unittest.TestCase):
         cls.gaiadir_orig = os.getenv("GAIA_DIR")
         os.environ["GAIA_DIR"] = resource_filename('desitarget.test', 't4')
 
+        # ADM write the sweep-footprint cache to a scratch directory
+        # ADM rather than to ~/.cache/desitarget.
+        cls.cachedir = tempfile.mkdtemp()
+        cls.cacheorig = os.getenv("DESITARGET_CACHE")
+        os.environ["DESITARGET_CACHE"] = cls.cachedir
+
     @classmethod
     def tearDownClass(cls):
         # ADM reset GAIA_DIR environment variable.
         if cls.gaiadir_orig is not None:
             os.environ["GAIA_DIR"] = cls.gaiadir_orig
+        # ADM reset DESITARGET_CACHE and remove the scratch cache.
+        if cls.cacheorig is None:
+            os.environ.pop("DESITARGET_CACHE", None)
+        else:
+            os.environ["DESITARGET_CACHE"] = cls.cacheorig
+        shutil.rmtree(cls.cachedir)
 
     def setUp(self):
         # treat some specific warnings as errors so we can find and fix
@@ -297,6 +311,99 @@ class TestCuts(unittest.TestCase):
 
                 self.assertTrue(np.all(t1[col][notNaN] == t2[col][notNaN]))
 
+    def test_select_targets_parallel(self):
+        """Test selecting targets in parallel gives the same targets
+        """
+        tc = ["LRG", "ELG"]
+        filelist = self.tractorfiles + self.sweepfiles
+        targets = cuts.select_targets(filelist, numproc=1, tcnames=tc,
+                                      backup=False)
+        testdir = 'test-{}'.format(uuid4().hex)
+        os.makedirs(testdir)
+        timingfile = os.path.join(testdir, 'timings.yaml')
+        try:
+            # ADM the second run uses the timings from the first run.
+            for run in range(2):
+                ptargets = cuts.select_targets(
+                    filelist, numproc=2, tcnames=tc, backup=False,
+                    timingfile=timingfile)
+                self.assertTrue(np.all(targets == ptargets))
+                timings = io.read_file_timings(timingfile)
+                self.assertEqual(set(timings), set(filelist))
+        finally:
+            shutil.rmtree(testdir, ignore_errors=True)
+
+    def test_select_targets_chunks(self):
+        """Test selecting targets in chunks of rows matches whole files
+        """
+        # ADM BGS includes the (random) choice of BGS_FAINT_HIP targets.
+        tc = ["LRG", "ELG", "BGS"]
+        for filelist in [self.tractorfiles, self.sweepfiles]:
+            targets = cuts.select_targets(filelist, numproc=1, tcnames=tc,
+                                          backup=False)
+            # ADM include chunks that are smaller than, and larger
+            # ADM than, the number of rows in each file.
+            for chunksize in [7, 100000]:
+                tchunks = cuts.select_targets(
+                    filelist, numproc=1, tcnames=tc, backup=False,
+                    chunksize=chunksize)
+                self.assertEqual(targets.dtype, tchunks.dtype)
+                self.assertTrue(np.all(
+                    targets["TARGETID"] == tchunks["TARGETID"]))
+                for col in ["DESI_TARGET", "BGS_TARGET", "MWS_TARGET"]:
+                    self.assertTrue(np.all(targets[col] == tchunks[col]))
+
+        # ADM the chunks should cover the file.
+        fn = self.sweepfiles[0]
+        nrows = io.read_tractor_nrows(fn)
+        self.assertEqual(nrows, len(io.read_tractor(fn)))
+        chunks = list(cuts.apply_cuts_chunks(fn, chunksize=7, tcnames=tc))
+        self.assertEqual(len(chunks), (nrows + 6) // 7)
+        desi_target, _, _ = cuts.apply_cuts(fn, tcnames=tc)
+        self.assertTrue(np.all(np.concatenate([c[1] for c in chunks]) ==
+                               desi_target[desi_target != 0]))
+
+    def test_bgs_faint_hip(self):
+        """Test the BGS_FAINT_HIP draw only depends on each object
+        """
+        rng = np.random.RandomState(616)
+        rflux = rng.uniform(0.1, 100, 100000).astype('f4')
+        zflux = rng.uniform(0.1, 100, 100000).astype('f4')
+        u = cuts._flux_uniform(rflux, zflux)
+        # ADM ~10% of objects are chosen.
+        self.assertTrue(0.098 < np.mean(u < 0.1) < 0.102)
+        # ADM the same objects are chosen for any subset of rows...
+        self.assertTrue(np.all(cuts._flux_uniform(rflux[7::13], zflux[7::13])
+                               == u[7::13]))
+        # ADM ...for 64-bit fluxes and for a single row.
+        self.assertTrue(np.all(cuts._flux_uniform(
+            rflux.astype('f8'), zflux.astype('f8')) == u))
+        self.assertEqual(cuts._flux_uniform(rflux[3], zflux[3])[0], u[3])
+
+    def test_tcnames_columns(self):
+        """Test selecting targets using only the columns they need
+        """
+        tcnames = ["ELG", "QSO", "LRG", "MWS", "BGS", "STD"]
+        for survey in ["main", "sv1"]:
+            for tc in tcnames:
+                columns = cuts.tcnames_columns([tc], survey=survey)
+                self.assertTrue(set(columns) < set(
+                    cuts.tcnames_columns(tcnames, survey=survey)))
+                for fn in self.sweepfiles + self.tractorfiles:
+                    objects = io.read_tractor(fn)
+                    subset = io.read_tractor(fn, columns=columns)
+                    self.assertTrue(len(subset.dtype) < len(objects.dtype))
+                    # ADM the target bits should be identical.
+                    bits = cuts.apply_cuts(objects, tcnames=[tc],
+                                           survey=survey)
+                    subbits = cuts.apply_cuts(subset, tcnames=[tc],
+                                              survey=survey)
+                    for b, sb in zip(bits, subbits):
+                        self.assertTrue(np.all(b == sb))
+
+        with self.assertRaises(ValueError):
+            cuts.inputs_to_columns(["gflux", "blatfoo"])
+
     def test_qso_selection_options(self):
         """Test the QSO selection options are passed correctly
         """
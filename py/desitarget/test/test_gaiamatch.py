@@ -0,0 +1,198 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+"""Test desitarget.gaiamatch.
+"""
+import unittest
+from pkg_resources import resource_filename
+import os
+import shutil
+import tempfile
+from glob import glob
+import fitsio
+import healpy as hp
+import numpy as np
+
+from desitarget import gaiamatch
+
+
+class TestGAIAMATCH(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # ADM the Gaia HEALPixel files in the test directory.
+        gaiadir = resource_filename('desitarget.test', 't4')
+        cls.gaiafiles = sorted(glob(os.path.join(gaiadir, 'healpix', '*fits')))
+        cls.shmdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.shmdir):
+            shutil.rmtree(cls.shmdir)
+
+    def setUp(self):
+        # ADM the cache is off by default, so give it some space.
+        gaiamatch.set_gaia_cache(maxbytes=2*1024**3)
+        gaiamatch.clear_gaia_cache()
+        gaiamatch.gaia_cache_stats(reset=True)
+
+    def tearDown(self):
+        # ADM reset the cache to its defaults.
+        gaiamatch.set_gaia_cache(maxbytes=0, shmdir=False)
+        gaiamatch.clear_gaia_cache()
+        for fn in glob(os.path.join(self.shmdir, "*")):
+            os.remove(fn)
+
+    def test_gaia_cache(self):
+        """Test cached reads of Gaia files are the same as direct reads.
+        """
+        fns = self.gaiafiles[:3]
+        direct = [gaiamatch.read_gaia_file(fn, header=True) for fn in fns]
+        for i in range(2):
+            for fn, (data, hdr) in zip(fns, direct):
+                cached, cachedhdr = gaiamatch.read_gaia_file(
+                    fn, header=True, cache=True)
+                self.assertTrue(np.all(cached == data))
+                self.assertEqual(cached.dtype, data.dtype)
+                self.assertEqual(cachedhdr["HPXNSIDE"], hdr["HPXNSIDE"])
+                # ADM the cached data can't be changed by the caller...
+                self.assertFalse(cached.flags.writeable)
+                # ADM ...even by renaming columns.
+                cached[:1].dtype.names = ["X"] + list(data.dtype.names[1:])
+                withobjid = gaiamatch.read_gaia_file(fn, addobjid=True,
+                                                     cache=True)
+                self.assertTrue(np.all(withobjid["GAIA_OBJID"] ==
+                                       np.arange(len(data))))
+        stats = gaiamatch.gaia_cache_stats()
+        self.assertEqual(stats["misses"], len(fns))
+        self.assertEqual(stats["hits"], 3*len(fns))
+        self.assertEqual(stats["bytesread"], sum(d.nbytes for d, _ in direct))
+        self.assertEqual(stats["nbytes"], stats["bytesread"])
+
+        # ADM shrinking the cache evicts least-recently used files.
+        gaiamatch.set_gaia_cache(maxbytes=direct[2][0].nbytes)
+        self.assertEqual(gaiamatch.gaia_cache_stats()["nbytes"],
+                         direct[2][0].nbytes)
+        gaiamatch.read_gaia_file(fns[2], cache=True)
+        self.assertEqual(gaiamatch.gaia_cache_stats()["hits"], 3*len(fns)+1)
+
+    def test_gaia_cache_off(self):
+        """Test the Gaia cache holds no data unless it's given space.
+        """
+        gaiamatch.set_gaia_cache(maxbytes=0)
+        fn = self.gaiafiles[0]
+        data = gaiamatch.read_gaia_file(fn)
+        for i in range(2):
+            cached = gaiamatch.read_gaia_file(fn, cache=True)
+            self.assertTrue(np.all(cached == data))
+        stats = gaiamatch.gaia_cache_stats()
+        self.assertEqual((stats["misses"], stats["hits"]), (2, 0))
+        self.assertEqual(stats["nbytes"], 0)
+        self.assertFalse(gaiamatch._gaia_file_is_cached(fn))
+
+    def test_gaia_cache_shm(self):
+        """Test the cross-process (shared-memory directory) cache.
+        """
+        fn = self.gaiafiles[0]
+        data = gaiamatch.read_gaia_file(fn)
+        gaiamatch.set_gaia_cache(shmdir=self.shmdir)
+        gaiamatch.read_gaia_file(fn, cache=True)
+        self.assertEqual(len(glob(os.path.join(self.shmdir, "*.npy"))), 1)
+        # ADM as for a new process, which will find the shared file.
+        gaiamatch.clear_gaia_cache()
+        cached, hdr = gaiamatch.read_gaia_file(fn, header=True, cache=True)
+        self.assertTrue(np.all(cached == data))
+        self.assertTrue(hdr is not None)
+        stats = gaiamatch.gaia_cache_stats()
+        self.assertEqual((stats["misses"], stats["shmhits"]), (1, 1))
+
+    def test_gaia_cache_forked(self):
+        """Test forked processes don't each fill their own cache.
+        """
+        from desitarget.internal import sharedmem
+
+        def _cached_nbytes(fn):
+            gaiamatch.read_gaia_file(fn, cache=True)
+            return gaiamatch.gaia_cache_stats()["nbytes"]
+
+        fns = self.gaiafiles[:2]
+        for shmdir, cached in (False, False), (self.shmdir, True):
+            gaiamatch.set_gaia_cache(shmdir=shmdir)
+            gaiamatch.clear_gaia_cache()
+            pool = sharedmem.MapReduce(np=2)
+            with pool:
+                nbytes = pool.map(_cached_nbytes, fns)
+            # ADM only files shared through shmdir are cached after a fork.
+            self.assertEqual(np.all(np.array(nbytes) > 0), cached)
+            self.assertEqual(gaiamatch.gaia_cache_stats()["nbytes"], 0)
+        # ADM the process that owns the cache still caches files.
+        self.assertTrue(_cached_nbytes(fns[0]) > 0)
+
+    def test_match_gaia_to_primary(self):
+        """Test objects match the closest Gaia source, and unmatched
+        Gaia sources are retained.
+        """
+        from astropy.coordinates import SkyCoord
+        from astropy import units as u
+        from desitarget.io import hpx_filename
+        rng = np.random.RandomState(616)
+        # ADM fake (nside=32) Gaia files covering a 1x1 degree box.
+        bounds = [150., 151., 25., 26.]
+        gaiadir = tempfile.mkdtemp()
+        gaiadirorig = os.environ.get("GAIA_DIR")
+        try:
+            os.environ["GAIA_DIR"] = gaiadir
+            os.makedirs(os.path.join(gaiadir, "healpix"))
+            gaia = np.zeros(40000, dtype=gaiamatch.ingaiadatamodel.dtype)
+            gaia["RA"] = rng.uniform(bounds[0]-4, bounds[1]+4, len(gaia))
+            gaia["DEC"] = rng.uniform(bounds[2]-4, bounds[3]+4, len(gaia))
+            gaia["SOURCE_ID"] = np.arange(len(gaia))
+            pixnum = hp.ang2pix(32, gaia["RA"], gaia["DEC"],
+                                nest=True, lonlat=True)
+            for pix in np.unique(pixnum):
+                fitsio.write(os.path.join(gaiadir, "healpix", hpx_filename(pix)),
+                             gaia[pixnum == pix], extname="GAIAHPX")
+            # ADM objects, a quarter of which are within 2" of a Gaia source.
+            objs = np.zeros(2000, dtype=[("RA", ">f8"), ("DEC", ">f8")])
+            objs["RA"] = rng.uniform(bounds[0], bounds[1], len(objs))
+            objs["DEC"] = rng.uniform(bounds[2], bounds[3], len(objs))
+            ii = np.where((gaia["RA"] >= bounds[0]) & (gaia["RA"] < bounds[1]) &
+                          (gaia["DEC"] >= bounds[2]) & (gaia["DEC"] < bounds[3]))[0]
+            objs["RA"][:500] = gaia["RA"][ii[:500]] + rng.uniform(-1, 1, 500)/1800
+            objs["DEC"][:500] = gaia["DEC"][ii[:500]] + rng.uniform(-1, 1, 500)/1800
+            # ADM the closest Gaia source to each object.
+            cobjs = SkyCoord(objs["RA"]*u.deg, objs["DEC"]*u.deg)
+            cgaia = SkyCoord(gaia["RA"]*u.deg, gaia["DEC"]*u.deg)
+            idx, sep, _ = cobjs.match_to_catalog_sky(cgaia)
+            refid = np.where(sep.arcsec < 1, gaia["SOURCE_ID"][idx], -1)
+            # ADM Gaia sources in the box that aren't within 1" of an object.
+            _, sep, _ = cgaia[ii].match_to_catalog_sky(cobjs)
+            retained = np.sort(gaia["SOURCE_ID"][ii][sep.arcsec >= 1])
+
+            gaiainfo = gaiamatch.match_gaia_to_primary(objs)
+            self.assertTrue(np.all(gaiainfo["REF_ID"] == refid))
+            self.assertTrue(0 < np.sum(refid >= 0) < len(objs))
+            ok = refid >= 0
+            self.assertTrue(np.all(gaiainfo["GAIA_RA"][ok] == gaia["RA"][refid[ok]]))
+            gaiainfo = gaiamatch.match_gaia_to_primary(
+                objs, retaingaia=True, gaiabounds=bounds)
+            self.assertTrue(np.all(gaiainfo["REF_ID"][:len(objs)] == refid))
+            self.assertTrue(np.all(np.sort(gaiainfo["REF_ID"][len(objs):]) ==
+                                   retained))
+        finally:
+            if gaiadirorig is None:
+                os.environ.pop("GAIA_DIR", None)
+            else:
+                os.environ["GAIA_DIR"] = gaiadirorig
+            shutil.rmtree(gaiadir)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def test_suite():
+    """Allows testing of only this module with the command:
+
+        python setup.py test -m desitarget.test.test_gaiamatch
+    """
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -5,6 +5,7 @@
 import unittest
 from pkg_resources import resource_filename
 import numpy as np
+import healpy as hp
 import os
 
 from desitarget import geomask
@@ -30,6 +31,216 @@ class TestGEOMASK(unittest.TestCase):
                                     surveydirs=[self.surveydir, self.surveydir2])
         self.assertTrue(foo is None)
 
+    def test_match_to(self):
+        """
+        Test match_to is equivalent to a dictionary look-up
+        """
+        rng = np.random.RandomState(616)
+        # ADM non-unique values in both A and B, not all of which match.
+        A = rng.randint(0, 1000, 2000)
+        B = rng.randint(0, 1200, 3000)
+        d = dict(zip(A, np.arange(len(A))))
+        idx = geomask.match_to(A, B)
+        self.assertTrue(np.all(idx == [d.get(b, -1) for b in B]))
+        self.assertTrue(np.all(A[idx[idx >= 0]] == B[idx >= 0]))
+        # ADM passing the sorted indexes gives the same answer.
+        sorter = np.argsort(A, kind="stable")
+        self.assertTrue(np.all(geomask.match_to(A, B, sorter=sorter) == idx))
+        # ADM edge cases of nothing to match.
+        self.assertEqual(len(geomask.match_to(A, [])), 0)
+        self.assertTrue(np.all(geomask.match_to([], B) == -1))
+
+    def test_match(self):
+        """
+        Test match returns every pair of matches
+        """
+        rng = np.random.RandomState(616)
+        A = rng.randint(0, 100, 200)
+        B = rng.randint(0, 120, 300)
+        iA, iB = geomask.match(A, B)
+        self.assertTrue(np.all(A[iA] == B[iB]))
+        pairs = [(i, j) for j, b in enumerate(B) for i in np.where(A == b)[0]]
+        self.assertEqual(list(zip(iA, iB)), pairs)
+
+    def test_is_in_ellipse_pairs(self):
+        """
+        Test the batched ellipse tests match testing one ellipse at a time
+        """
+        rng = np.random.RandomState(616)
+        ras, decs = rng.uniform(10, 11, 1000), rng.uniform(59, 60, 1000)
+        RAcens, DECcens = rng.uniform(10, 11, 30), rng.uniform(59, 60, 30)
+        r = 10**rng.uniform(1, 3.5, 30)
+        e1, e2 = rng.uniform(-1, 1, 30), rng.uniform(-1, 1, 30)
+        # ADM every pair of points and ellipses (in a random order).
+        idras, idcens = [ii.ravel() for ii in np.meshgrid(
+            np.arange(len(ras)), np.arange(len(RAcens)))]
+        srt = rng.permutation(len(idras))
+        idras, idcens = idras[srt], idcens[srt]
+        G = geomask.ellipse_matrix(r, e1, e2)
+        isin = np.zeros((len(RAcens), len(ras)), dtype=bool)
+        for i in range(len(RAcens)):
+            isin[i] = geomask.is_in_ellipse(
+                ras, decs, RAcens[i], DECcens[i], r[i], e1[i], e2[i])
+            self.assertTrue(np.all(isin[i] == geomask.is_in_ellipse_matrix(
+                ras, decs, RAcens[i], DECcens[i], G[..., i])))
+        self.assertTrue(0 < np.sum(isin) < isin.size)
+        want = isin[idcens, idras]
+        for chunksize in 2**20, 999:
+            self.assertTrue(np.all(want == geomask.is_in_ellipse_pairs(
+                ras, decs, RAcens, DECcens, r, e1, e2, idras, idcens,
+                chunksize=chunksize)))
+            self.assertTrue(np.all(want == geomask.is_in_ellipse_matrix_pairs(
+                ras, decs, RAcens, DECcens, G, idras, idcens,
+                chunksize=chunksize)))
+        # ADM ellipses that aren't tested can have a zero radius.
+        r[0] = 0
+        ii = idcens != 0
+        self.assertTrue(np.all(want[ii] == geomask.is_in_ellipse_pairs(
+            ras, decs, RAcens, DECcens, r, e1, e2, idras[ii], idcens[ii])))
+        self.assertEqual(len(geomask.is_in_ellipse_pairs(
+            ras, decs, RAcens, DECcens, r, e1, e2, [], [])), 0)
+
+        # ADM the boundaries of many ellipses match one at a time.
+        nloc = rng.randint(0, 5, len(RAcens))
+        ras, decs = geomask.ellipse_boundaries(RAcens, DECcens, r, e1, e2, nloc)
+        ellras, elldecs = np.hstack([geomask.ellipse_boundary(*args) for
+                                     args in zip(RAcens, DECcens, r, e1, e2,
+                                                 nloc)])
+        self.assertEqual(len(ras), np.sum(nloc))
+        self.assertTrue(np.allclose(ras, ellras, rtol=0, atol=1e-12))
+        self.assertTrue(np.allclose(decs, elldecs, rtol=0, atol=1e-12))
+
+    def test_match_within_radii(self):
+        """
+        Test match_within_radii finds every point in every circle
+        """
+        from astropy.coordinates import SkyCoord
+        from astropy import units as u
+        rng = np.random.RandomState(616)
+        # ADM points near the pole and RA=0, and circles of very
+        # ADM different radii (some of which are zero).
+        ras, decs = rng.uniform(0, 360, 2000), rng.uniform(85, 90, 2000)
+        RAcens, DECcens = rng.uniform(0, 360, 50), rng.uniform(86, 90, 50)
+        r = 10**rng.uniform(0, 4, 50)
+        r[::10] = 0
+        idtargs, idcens, sep = geomask.match_within_radii(
+            ras, decs, RAcens, DECcens, r)
+        allsep = SkyCoord(RAcens[:, None]*u.deg, DECcens[:, None]*u.deg
+                          ).separation(SkyCoord(ras*u.deg, decs*u.deg)).arcsec
+        jj, ii = np.where((allsep < r[:, None]).T)
+        self.assertTrue(len(ii) > 0)
+        self.assertTrue(np.all(idtargs == jj))
+        self.assertTrue(np.all(idcens == ii))
+        self.assertTrue(np.allclose(sep, allsep[ii, jj], rtol=0, atol=1e-6))
+        # ADM is_in_circle is consistent.
+        self.assertTrue(np.all(
+            geomask.is_in_circle(ras, decs, RAcens, DECcens, r) ==
+            np.isin(np.arange(len(ras)), jj)))
+        # ADM edge cases of nothing to match.
+        for args in [([], [], RAcens, DECcens, r), (ras, decs, [], [], []),
+                     (ras, decs, RAcens, DECcens, 0)]:
+            self.assertEqual(len(geomask.match_within_radii(*args)[0]), 0)
+
+    def test_radec_match_to(self):
+        """
+        Test radec_match_to gives the same matches as astropy
+        """
+        from astropy.coordinates import SkyCoord
+        from astropy import units as u
+        rng = np.random.RandomState(616)
+        ram, decm = rng.uniform(150, 151, 5000), rng.uniform(25, 26, 5000)
+        ra, dec = rng.uniform(150, 151, 3000), rng.uniform(25, 26, 3000)
+        ii = rng.randint(0, len(ram), 1000)
+        ra[:1000] = ram[ii] + rng.uniform(-1, 1, 1000)/3600.
+        dec[:1000] = decm[ii] + rng.uniform(-1, 1, 1000)/3600.
+        cm, co = SkyCoord(ram*u.deg, decm*u.deg), SkyCoord(ra*u.deg, dec*u.deg)
+
+        # ADM closest matches.
+        idm, d2d, _ = co.match_to_catalog_sky(cm)
+        ok = d2d.arcsec < 1
+        geomask._radecTreeCache.clear()
+        for nside, numproc, cache in ((None, 1, False), (None, 1, True),
+                                      (None, 1, True), (64, 1, False),
+                                      (64, 2, False)):
+            idmatchto, idobjs, sep = geomask.radec_match_to(
+                [ram, decm], [ra, dec], radec=True, return_sep=True,
+                nside=nside, numproc=numproc, cache=cache)
+            self.assertTrue(np.all(idobjs == np.where(ok)[0]))
+            self.assertTrue(np.all(idmatchto == idm[ok]))
+            self.assertTrue(np.all(sep == d2d.arcsec[ok]))
+        # ADM the tree for the catalog was only cached once.
+        self.assertEqual(len(geomask._radecTreeCache), 1)
+
+        # ADM all matches.
+        i1, i2, d2d, _ = cm.search_around_sky(co, 10*u.arcsec)
+        srt = np.lexsort((i2, i1))
+        for nside in None, 64:
+            idmatchto, idobjs, sep = geomask.radec_match_to(
+                [ram, decm], [ra, dec], sep=10., radec=True, return_sep=True,
+                allmatches=True, nside=nside)
+            self.assertTrue(np.all(idobjs == i1[srt]))
+            self.assertTrue(np.all(idmatchto == i2[srt]))
+            self.assertTrue(np.allclose(sep, d2d.arcsec[srt], rtol=0, atol=1e-9))
+        self.assertTrue(np.any(np.bincount(idobjs) > 1))
+
+        # ADM chunks must be large enough to contain every match.
+        with self.assertRaises(ValueError):
+            geomask.radec_match_to([ram, decm], [ra, dec], sep=3600.,
+                                   radec=True, nside=64)
+
+    def test_sweep_files_touch_hp(self):
+        """
+        Test the cache of sweep file footprints gives the same answer
+        """
+        import shutil
+        import tempfile
+        from desitarget.io import decode_sweep_name
+        infiles = ['/a/sweep-{:03d}{}005-{:03d}{}010.fits'.format(
+            ra, pm, ra+10, pm) for ra in range(0, 100, 10) for pm in 'mp']
+        tmpdir = tempfile.mkdtemp()
+        oldcache = os.environ.get("DESITARGET_CACHE")
+        try:
+            os.environ["DESITARGET_CACHE"] = tmpdir
+            # ADM no cache, building the cache, reading the cache, and
+            # ADM updating the cache with a new file.
+            for cache, fns in [(False, infiles[1:]), (True, infiles[1:]),
+                               (True, infiles[1:]), (True, infiles)]:
+                filesperpixel, pixlist, pixnum = geomask.sweep_files_touch_hp(
+                    8, [0, 4, 500], fns, cache=cache)
+                self.assertEqual(os.path.exists(
+                    geomask.sweep_footprint_cache_filename(8)), cache)
+                pixels = [decode_sweep_name(fn, nside=8) for fn in fns]
+                self.assertTrue(np.all(pixnum == np.hstack(pixels)))
+                self.assertTrue(np.all(pixlist == [0, 4]))
+                for pix in range(768):
+                    self.assertEqual(filesperpixel[pix], [
+                        fn for fn, pixs in zip(fns, pixels) if pix in pixs])
+        finally:
+            if oldcache is None:
+                os.environ.pop("DESITARGET_CACHE", None)
+            else:
+                os.environ["DESITARGET_CACHE"] = oldcache
+            shutil.rmtree(tmpdir)
+
+    def test_brick_names_touch_hp(self):
+        """
+        Test the bricks that touch each HEALPixel
+        """
+        from desiutil import brick
+        # ADM large bricks, so that this is quick.
+        bricktable = brick.Bricks(bricksize=10).to_table()
+        for numproc in 1, 2:
+            bricksperpixel = geomask.brick_names_touch_hp(
+                8, numproc=numproc, fact=4, bricksize=10)
+            self.assertEqual(len(bricksperpixel), hp.nside2npix(8))
+            # ADM each brick is in the list for each pixel it touches.
+            for bt in bricktable:
+                pixels = geomask.hp_in_box(
+                    8, [bt["RA1"], bt["RA2"], bt["DEC1"], bt["DEC2"]], fact=4)
+                inlist = [pix for pix in range(len(bricksperpixel))
+                          if bt["BRICKNAME"] in bricksperpixel[pix]]
+                self.assertEqual(sorted(pixels), inlist)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -93,6 +93,40 @@ class TestIO(unittest.TestCase):
         data = io.read_tractor(tractorfile, columns=tuple(columns))
         self.assertEqual(set(data.dtype.names), set(columns))
 
+    def test_tractor_projection(self):
+        """Test reading a subset of columns, in chunks, is consistent.
+        """
+        import numpy.lib.recfunctions as rfn
+        sweepfile = io.list_sweepfiles(self.datadir)[0]
+        data = io.read_tractor(sweepfile)
+        # ADM chunks of rows shouldn't change the output.
+        for chunksize in [1, 4]:
+            chunked = io.read_tractor(sweepfile, chunksize=chunksize)
+            self.assertEqual(data.tobytes(), chunked.tobytes())
+        # ADM reading a subset of columns should give the same values.
+        columns = ['RELEASE', 'TYPE', 'FLUX_G', 'MASKBITS', 'REF_CAT']
+        sub = io.read_tractor(sweepfile, columns=columns)
+        self.assertEqual(list(sub.dtype.names), columns + ['PHOTSYS'])
+        self.assertTrue(np.all(sub == data[list(sub.dtype.names)]))
+        # ADM whitespace should be stripped from string columns.
+        self.assertFalse(np.any(np.char.endswith(data['TYPE'], b' ')))
+        # ADM requesting columns that aren't in the file should fail.
+        with self.assertRaises(ValueError):
+            io.read_tractor(sweepfile, columns=['RA', 'BLAT'])
+
+        # ADM MASKBITS used to be BRIGHTSTARINBLOB.
+        os.makedirs(self.testdir)
+        fn = os.path.join(self.testdir, os.path.basename(sweepfile))
+        indata = fitsio.read(sweepfile)
+        bsib = indata['MASKBITS'] & 2 != 0
+        indata = rfn.drop_fields(indata, 'MASKBITS', usemask=False)
+        indata = rfn.append_fields(indata, 'BRIGHTSTARINBLOB', bsib,
+                                   usemask=False)
+        fitsio.write(fn, indata)
+        for cols in None, columns:
+            olddata = io.read_tractor(fn, columns=cols)
+            self.assertTrue(np.all(olddata['MASKBITS'] == bsib << 1))
+
     def test_readwrite_tractor(self):
         tractorfile = io.list_tractorfiles(self.datadir)[0]
         sweepfile = io.list_sweepfiles(self.datadir)[0]
@@ -108,6 +142,9 @@ class TestIO(unittest.TestCase):
         # ADM use fits read wrapper in io to correctly handle whitespace.
         d2, h2 = io.whitespace_fits_read(filename, header=True)
         self.assertEqual(list(data.dtype.names), list(d2.dtype.names))
+        # ADM the header records how BGS_FAINT_HIP targets were chosen.
+        from desiutil import depend
+        self.assertEqual(depend.getdep(h2, 'bgs-faint-hip'), 'flux-hash')
 
         # ADM check HPXPIXEL got added writing targets with NSIDE request.
         _, filename = io.write_targets(self.testdir, data, nside=64,
@@ -124,11 +161,109 @@ class TestIO(unittest.TestCase):
             else:
                 self.assertTrue(np.all(data[column] == d2[column]))
 
+    def test_sweep_file_costs(self):
+        """Test estimating the cost of processing files.
+        """
+        os.makedirs(self.testdir)
+        sweepfile = io.list_sweepfiles(self.datadir)[0]
+        data = io.read_tractor(sweepfile)
+        # ADM write files of different lengths.
+        fns = []
+        for nrows in [2, 6, 4]:
+            fns.append(os.path.join(self.testdir, 'sweep{}.fits'.format(nrows)))
+            fitsio.write(fns[-1], data[:nrows])
+        self.assertTrue(np.all(io.sweep_file_costs(fns) == [2, 6, 4]))
+
+        # ADM timings are recorded, and merged with earlier timings.
+        timingfile = os.path.join(self.testdir, 'timings.yaml')
+        self.assertEqual(io.read_file_timings(timingfile), {})
+        io.write_file_timings(timingfile, {fns[0]: 3.})
+        io.write_file_timings(timingfile, {fns[2]: 1.})
+        self.assertEqual(io.read_file_timings(timingfile),
+                         {fns[0]: 3., fns[2]: 1.})
+
+        # ADM recorded timings are used, other files are scaled by the
+        # ADM median time-per-row of the recorded files (here 0.875s).
+        costs = io.sweep_file_costs(fns, timingfile=timingfile)
+        self.assertTrue(np.allclose(costs, [3., 5.25, 1.]))
+
     def test_brickname(self):
         self.assertEqual(io.brickname_from_filename('tractor-3301m002.fits'), '3301m002')
         self.assertEqual(io.brickname_from_filename('tractor-3301p002.fits'), '3301p002')
         self.assertEqual(io.brickname_from_filename('/a/b/tractor-3301p002.fits'), '3301p002')
 
+    def write_hp_targets(self, hpxidx=False):
+        """Write targets spread across the sky, split into nside=2 files.
+        """
+        import healpy as hp
+        os.makedirs(self.testdir)
+        rng = np.random.RandomState(616)
+        targets = np.zeros(5000, dtype=[('TARGETID', '>i8'), ('RA', '>f8'),
+                                         ('DEC', '>f8')])
+        targets["TARGETID"] = np.arange(len(targets))
+        targets["RA"] = rng.uniform(0, 360, len(targets))
+        targets["DEC"] = np.degrees(np.arcsin(rng.uniform(-1, 1, len(targets))))
+        theta, phi = np.radians(90-targets["DEC"]), np.radians(targets["RA"])
+        filepix = hp.ang2pix(2, theta, phi, nest=True)
+        for pix in range(48):
+            hdr = {"FILENSID": 2, "FILEHPX": pix}
+            fn = os.path.join(self.testdir, "targets-hp-{}.fits".format(pix))
+            io.write_with_units(fn, targets[filepix == pix], extname="TARGETS",
+                                header=hdr, hpxidx=hpxidx)
+
+        return targets
+
+    def test_read_targets_in_hp_parallel(self):
+        """Test reading HEALPixel-split target files in parallel.
+        """
+        import healpy as hp
+        targets = self.write_hp_targets()
+        # ADM the (nside=4) pixels to read, which touch 3 of the files.
+        pixlist = [0, 1, 4, 5, 6, 20, 47]
+        theta, phi = np.radians(90-targets["DEC"]), np.radians(targets["RA"])
+        pix = hp.ang2pix(4, theta, phi, nest=True)
+        truth = targets[np.isin(pix, pixlist)]
+        for numproc in 1, 2:
+            targs = io.read_targets_in_hp(self.testdir, 4, pixlist,
+                                          numproc=numproc)
+            self.assertEqual(targs.dtype, targets.dtype)
+            self.assertTrue(np.all(np.sort(targs) == np.sort(truth)))
+            targs = io.read_targets_in_hp(self.testdir, 4, pixlist,
+                                          columns=["TARGETID"],
+                                          numproc=numproc)
+            self.assertEqual(targs.dtype.names, ("TARGETID",))
+            self.assertTrue(np.all(np.sort(targs["TARGETID"]) ==
+                                   truth["TARGETID"]))
+
+    def test_hpx_index(self):
+        """Test target files are sorted and read by HEALPixel index.
+        """
+        import healpy as hp
+        targets = self.write_hp_targets(hpxidx=True)
+        theta, phi = np.radians(90-targets["DEC"]), np.radians(targets["RA"])
+        fn = os.path.join(self.testdir, "targets-hp-7.fits")
+        # ADM the file should still be readable as a target file...
+        targs = io.read_target_files(fn)
+        # ADM ...and be sorted by HEALPixel, consistent with the index.
+        index = fitsio.read(fn, "HPXIDX")
+        tpix = hp.ang2pix(256, np.radians(90-targs["DEC"]),
+                          np.radians(targs["RA"]), nest=True)
+        self.assertTrue(np.all(np.diff(tpix) >= 0))
+        self.assertTrue(np.all(np.repeat(index["HPXPIXEL"], index["NROWS"])
+                               == tpix))
+        # ADM reads at nsides coarser and finer than the index.
+        for nside, pixlist in (2, [0, 7]), (64, [7*1024+3, 9]), (512, [9]):
+            pix = hp.ang2pix(nside, theta, phi, nest=True)
+            truth = targets[np.isin(pix, pixlist)]
+            targs = io.read_targets_in_hp(self.testdir, nside, pixlist)
+            self.assertTrue(np.all(np.sort(targs) == np.sort(truth)))
+            # ADM the index lists exactly the rows in the file in pixlist
+            # ADM (or, for nside > 256, in the parents of pixlist).
+            rows = io.hpx_index_rows(index, 256, nside, pixlist)
+            inpix = np.isin(tpix // (256 // min(nside, 256))**2,
+                            np.array(pixlist) // (max(nside, 256) // 256)**2)
+            self.assertTrue(np.all(rows == np.flatnonzero(inpix)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,13 +3,19 @@
 """Test desitarget.mtl.
 """
 import os
+import shutil
+import tempfile
 import unittest
+import fitsio
 import numpy as np
+import healpy as hp
 from astropy.table import Table, join
 
 from desitarget.targetmask import desi_mask as Mx
 from desitarget.targetmask import bgs_mask, obsconditions
-from desitarget.mtl import make_mtl, mtldatamodel
+from desitarget.mtl import make_mtl, mtldatamodel, make_ledger_in_hp
+from desitarget.mtl import update_ledger, convert_ledger, _update_ledger_in_hp
+from desitarget import io
 from desitarget.targets import initial_priority_numobs, main_cmx_or_sv
 from desitarget.targets import switch_main_cmx_or_sv
 
@@ -174,6 +180,214 @@ class TestMTL(unittest.TestCase):
         # ADM all BGS targets should always have NUMOBS_MORE=1.
         self.assertTrue(np.all(bgszcat["NUMOBS_MORE"] == 1))
 
+    def make_ledger(self, tmpdir, form):
+        """Make and update a ledger of format `form` in `tmpdir`"""
+        # ADM the (nested, nside=32) HEALPixel that contains the targets.
+        pix = hp.ang2pix(32, np.pi/2, 0, nest=True)
+        os.environ["MTL_LEDGER_FORMAT"] = form
+        hpdirname = os.path.join(tmpdir, form)
+        make_ledger_in_hp(self.targets, hpdirname, 32, pix,
+                          obscon="DARK", verbose=False)
+        hpdirname = os.path.dirname(
+            io.find_target_files(hpdirname, dr=0, flavor="mtl",
+                                 obscon="DARK", hp=pix, ender=form))
+        update_ledger(hpdirname, self.targets, self.zcat, obscon="DARK")
+
+        return hpdirname, io.find_mtl_file_format_from_header(
+            hpdirname).format(pix)
+
+    def test_binary_ledger(self):
+        """Test binary ledgers are appended to, read and converted correctly.
+        """
+        tmpdir = tempfile.mkdtemp()
+        oldform = os.environ.get("MTL_LEDGER_FORMAT")
+        try:
+            mtls = {}
+            for form in "ecsv", "bin":
+                hpdirname, fn = self.make_ledger(tmpdir, form)
+                mtls[form] = io.read_mtl_ledger(fn, unique=False)
+                # ADM the header should be available for all formats.
+                self.assertEqual(
+                    io.read_keyword_from_mtl_header(hpdirname, "OBSCON"),
+                    "DARK")
+            # ADM initial ledger entries plus the zcat updates.
+            nrows = len(self.targets) + len(self.zcat)
+            self.assertEqual(len(mtls["bin"]), nrows)
+            # ADM the ledgers can be written in different seconds.
+            for col in set(mtldatamodel.dtype.names) - set(["TIMESTAMP"]):
+                self.assertTrue(np.all(mtls["bin"][col] == mtls["ecsv"][col]))
+
+            # ADM check the round-trip conversion between formats.
+            fn = convert_ledger(os.path.dirname(fn), tmpdir, ender="ecsv")[0]
+            fn = convert_ledger(tmpdir, os.path.join(tmpdir, "x"))[0]
+            mtl = io.read_mtl_ledger(fn, unique=False)
+            self.assertTrue(np.all(mtl == mtls["bin"]))
+        finally:
+            if oldform is None:
+                os.environ.pop("MTL_LEDGER_FORMAT", None)
+            else:
+                os.environ["MTL_LEDGER_FORMAT"] = oldform
+            shutil.rmtree(tmpdir)
+
+    def test_converted_ledger_format(self):
+        """Test the ledger format is found from the files on disk.
+        """
+        tmpdir = tempfile.mkdtemp()
+        oldform = os.environ.get("MTL_LEDGER_FORMAT")
+        try:
+            pix = hp.ang2pix(32, np.pi/2, 0, nest=True)
+            hpdirname, fn = self.make_ledger(tmpdir, "ecsv")
+            mtl = io.read_mtl_in_hp(hpdirname, 32, pix)
+            # ADM convert to binary, with $MTL_LEDGER_FORMAT unset.
+            bindirname = os.path.join(tmpdir, "x")
+            convert_ledger(hpdirname, bindirname)
+            os.environ.pop("MTL_LEDGER_FORMAT")
+            fileform = io.find_mtl_file_format_from_header(bindirname)
+            self.assertEqual(os.path.splitext(fileform)[-1], ".bin")
+            self.assertTrue(np.all(
+                io.read_mtl_in_hp(bindirname, 32, pix) == mtl))
+            # ADM header values are strings, for every format.
+            for dirname in hpdirname, bindirname:
+                self.assertEqual(
+                    io.read_keyword_from_mtl_header(dirname, "FILENSID"),
+                    "32")
+            # ADM updates are appended in the format of the ledger.
+            update_ledger(bindirname, self.targets, self.zcat, obscon="DARK")
+            self.assertEqual(len(io.read_mtl_ledger(fileform.format(pix),
+                                                    unique=False)),
+                             len(self.targets) + 2*len(self.zcat))
+        finally:
+            if oldform is None:
+                os.environ.pop("MTL_LEDGER_FORMAT", None)
+            else:
+                os.environ["MTL_LEDGER_FORMAT"] = oldform
+            shutil.rmtree(tmpdir)
+
+    def test_ledger_index(self):
+        """Test unique reads via the latest-state index match full reads.
+        """
+        tmpdir = tempfile.mkdtemp()
+        oldform = os.environ.get("MTL_LEDGER_FORMAT")
+        try:
+            for form in "ecsv", "fits", "bin":
+                hpdirname, fn = self.make_ledger(tmpdir, form)
+                # ADM the zcat updated the state of some targets.
+                index = io.read_mtl_index(fn)
+                self.assertEqual(len(index), len(self.targets))
+                mtl = io.read_mtl_ledger(fn)
+                os.remove(io.mtl_index_filename(fn))
+                self.assertTrue(io.read_mtl_index(fn) is None)
+                self.assertTrue(np.all(mtl == io.read_mtl_ledger(fn)))
+                # ADM an index that is out-of-date should be ignored.
+                io.write_mtl_index(fn, index=index[:1])
+                with open(fn, "ab") as f:
+                    f.write(b"\n")
+                self.assertTrue(io.read_mtl_index(fn) is None)
+
+            # ADM appending a row to a FITS ledger needn't change its size
+            # ADM (FITS files are padded to 2880-byte blocks).
+            hpdirname, fn = self.make_ledger(tmpdir, "fits")
+            self.assertFalse(io.read_mtl_index(fn) is None)
+            mtl = io.read_mtl_ledger(fn, unique=False)
+            size = os.path.getsize(fn)
+            with fitsio.FITS(fn, "rw") as fx:
+                fx["MTL"].append(mtl[-1:])
+            self.assertEqual(os.path.getsize(fn), size)
+            self.assertTrue(io.read_mtl_index(fn) is None)
+            # ADM as can rewriting a ledger with the same number of rows.
+            io.write_mtl_index(fn)
+            mtl = io.read_mtl_ledger(fn, unique=False)
+            mtl["PRIORITY"][-1] += 1
+            fitsio.write(fn, mtl, extname="MTL", clobber=True)
+            mtime = os.stat(io.mtl_index_filename(fn)).st_mtime_ns
+            os.utime(fn, ns=(mtime, mtime + 10**9))
+            self.assertTrue(io.read_mtl_index(fn) is None)
+        finally:
+            if oldform is None:
+                os.environ.pop("MTL_LEDGER_FORMAT", None)
+            else:
+                os.environ["MTL_LEDGER_FORMAT"] = oldform
+            shutil.rmtree(tmpdir)
+
+    def test_ecsv_quoted_strings(self):
+        """Test quoted strings in ECSV ledgers are read correctly.
+        """
+        tmpdir = tempfile.mkdtemp()
+        oldform = os.environ.get("MTL_LEDGER_FORMAT")
+        try:
+            hpdirname, fn = self.make_ledger(tmpdir, "ecsv")
+            mtl = io.read_mtl_ledger(fn, unique=False)
+            # ADM ECSV quotes empty strings and strings with spaces.
+            states = ["", "A B", 'C "D"', "CALIB"]
+            mtl["TARGET_STATE"][:len(states)] = states
+            fn = os.path.join(tmpdir, "quoted.ecsv")
+            Table(mtl, meta={"OBSCON": "DARK"}).write(fn, format="ascii.ecsv")
+            for unique in False, True:
+                if unique:
+                    io.write_mtl_index(fn)
+                    # ADM the final entry for each target is retained.
+                    _, ii = np.unique(np.flip(mtl["TARGETID"]),
+                                      return_index=True)
+                    mtl = np.flip(mtl)[ii]
+                got = io.read_mtl_ledger(fn, unique=unique)
+                self.assertEqual(got.dtype, mtl.dtype)
+                self.assertTrue(np.all(got == mtl))
+        finally:
+            if oldform is None:
+                os.environ.pop("MTL_LEDGER_FORMAT", None)
+            else:
+                os.environ["MTL_LEDGER_FORMAT"] = oldform
+            shutil.rmtree(tmpdir)
+
+    def test_update_ledger_parallel(self):
+        """Test updating ledgers in parallel across HEALPixels.
+        """
+        # ADM spread the targets across several HEALPixels.
+        targets = self.targets.copy()
+        targets["RA"] = [0., 90., 180., 270., 45.]
+        theta, phi = np.radians(90-targets["DEC"]), np.radians(targets["RA"])
+        pixels = np.unique(hp.ang2pix(32, theta, phi, nest=True))
+        tmpdir = tempfile.mkdtemp()
+        oldform = os.environ.get("MTL_LEDGER_FORMAT")
+        try:
+            os.environ["MTL_LEDGER_FORMAT"] = "bin"
+            mtls = []
+            for numproc in 1, 2:
+                hpdirname = os.path.join(tmpdir, str(numproc))
+                make_ledger_in_hp(targets, hpdirname, 32, pixels,
+                                  obscon="DARK", verbose=False)
+                hpdirname = os.path.dirname(
+                    io.find_target_files(hpdirname, dr=0, flavor="mtl",
+                                         obscon="DARK", hp=0, ender="bin"))
+                update_ledger(hpdirname, targets, self.zcat, obscon="DARK",
+                              numproc=numproc)
+                mtls.append(io.read_mtl_in_hp(hpdirname, 32, pixels,
+                                              unique=False))
+            self.assertEqual(len(mtls[0]), len(targets) + len(self.zcat))
+            # ADM the ledgers can be written in different seconds.
+            for col in set(mtldatamodel.dtype.names) - set(["TIMESTAMP"]):
+                self.assertTrue(np.all(mtls[0][col] == mtls[1][col]))
+        finally:
+            if oldform is None:
+                os.environ.pop("MTL_LEDGER_FORMAT", None)
+            else:
+                os.environ["MTL_LEDGER_FORMAT"] = oldform
+            shutil.rmtree(tmpdir)
+
+    def test_update_missing_ledger(self):
+        """Test updating a ledger that doesn't exist fails clearly.
+        """
+        mtl = make_mtl(self.targets, "DARK", trimcols=True).as_array()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for ender in "ecsv", "fits", "bin":
+                fn = os.path.join(tmpdir, "mtl-dark-hp-0.{}".format(ender))
+                with self.assertRaises(IOError):
+                    _update_ledger_in_hp(fn, mtl, ender)
+                self.assertFalse(os.path.exists(fn))
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 if __name__ == '__main__':
     unittest.main()
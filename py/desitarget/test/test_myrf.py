@@ -0,0 +1,135 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+"""Test desitarget.myRF.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pkg_resources import resource_filename
+import numpy as np
+
+from desitarget.myRF import myRF, packedRF, packForest
+from desitarget.myRF import getForest, clearForestCache, forestCacheStats
+from desitarget.myRF import writePackedForest
+
+
+class TestMYRF(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # ADM a forest that ships with desitarget.
+        cls.forestfile = resource_filename('desitarget',
+                                           'data/rf_model_dr7_HighZ.npz')
+        cls.ntrees = 50
+
+        # ADM some fake "colors", including a NaN to check that NaNs
+        # ADM are sent down the right-hand branch, as for myRF.
+        rng = np.random.RandomState(616)
+        cls.data = rng.normal(0, 1.5, (1000, 11))
+        cls.data[:, 10] = rng.uniform(17.5, 22.7, 1000)
+        cls.data[::37, 3] = np.nan
+
+    def test_packed_forest(self):
+        """Test the packed forest is well-formed.
+        """
+        t = np.load(self.forestfile, encoding='bytes', allow_pickle=True)
+        nodes, offsets = packForest(t['arr_0'], self.ntrees)
+        self.assertEqual(len(offsets), self.ntrees + 1)
+        self.assertEqual(offsets[-1], len(nodes))
+        # ADM children are always in the same tree as their parent.
+        tree = np.searchsorted(offsets, np.arange(len(nodes)), side="right")
+        for col in "LEFT", "RIGHT":
+            ctree = np.searchsorted(offsets, nodes[col], side="right")
+            self.assertTrue(np.all(ctree == tree))
+
+    def test_bit_identical(self):
+        """Test packedRF reproduces the myRF probabilities exactly.
+        """
+        rf = myRF(self.data, "", numberOfTrees=self.ntrees, version=2)
+        rf.loadForest(self.forestfile)
+        proba = rf.predict_proba()
+
+        prf = packedRF.fromForestFile(self.forestfile,
+                                      numberOfTrees=self.ntrees, version=2)
+        # ADM check results don't depend on the chunking.
+        for chunksize in [7, 100, 2**16]:
+            pproba = prf.predict_proba(self.data, chunksize=chunksize)
+            self.assertTrue(np.array_equal(proba, pproba))
+
+        # ADM check a single object and no objects.
+        self.assertEqual(prf.predict_proba(self.data[7])[0], proba[7])
+        self.assertEqual(len(prf.predict_proba(self.data[:0])), 0)
+
+    def test_forest_registry(self):
+        """Test forests are loaded once and can be invalidated.
+        """
+        clearForestCache()
+        forestCacheStats(reset=True)
+        rf = getForest(self.forestfile, numberOfTrees=self.ntrees)
+        # ADM the second call should retrieve the cached forest.
+        self.assertTrue(getForest(self.forestfile,
+                                  numberOfTrees=self.ntrees) is rf)
+        # ADM ...but a different number of trees is a different forest.
+        self.assertFalse(getForest(self.forestfile,
+                                   numberOfTrees=self.ntrees+1) is rf)
+        stats = forestCacheStats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertTrue(stats["timesaved"] > 0)
+        # ADM cached forests should be read-only.
+        with self.assertRaises(ValueError):
+            rf.threshold[0] = 0.
+        # ADM explicitly invalidating the cache should force a reload.
+        clearForestCache(self.forestfile)
+        self.assertFalse(getForest(self.forestfile,
+                                   numberOfTrees=self.ntrees) is rf)
+        self.assertEqual(forestCacheStats(reset=True)["misses"], 3)
+        self.assertEqual(forestCacheStats()["misses"], 0)
+
+    def test_packed_forest_file(self):
+        """Test memory-mapped forests match forests read from .npz files.
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fn = os.path.join(tmpdir, os.path.basename(self.forestfile))
+            shutil.copy(self.forestfile, fn)
+            nodesfn, offsetsfn = writePackedForest(fn)
+            self.assertTrue(os.path.exists(nodesfn))
+            self.assertTrue(os.path.exists(offsetsfn))
+            # ADM every tree in the forest should have been packed.
+            self.assertEqual(packedRF.fromPackedFile(fn).nTrees, 500)
+
+            # ADM the forest should be memory-mapped, not copied.
+            prf = packedRF.fromPackedFile(fn, numberOfTrees=self.ntrees)
+            self.assertTrue(isinstance(prf.nodes, np.memmap))
+            self.assertEqual(prf.nTrees, self.ntrees)
+            proba = packedRF.fromForestFile(
+                fn, numberOfTrees=self.ntrees).predict_proba(self.data)
+            self.assertTrue(np.all(prf.predict_proba(self.data) == proba))
+
+            # ADM the registry should prefer the memory-mappable files...
+            clearForestCache()
+            rf = getForest(fn, numberOfTrees=self.ntrees)
+            self.assertTrue(isinstance(rf.nodes, np.memmap))
+            self.assertTrue(np.all(rf.predict_proba(self.data) == proba))
+            # ADM ...unless they're older than the forest file.
+            os.utime(nodesfn, (0, 0))
+            clearForestCache()
+            rf = getForest(fn, numberOfTrees=self.ntrees)
+            self.assertFalse(isinstance(rf.nodes, np.memmap))
+            clearForestCache()
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def test_suite():
+    """Allows testing of only this module with the command:
+
+        python setup.py test -m desitarget.test.test_myrf
+    """
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -168,6 +168,42 @@ class TestPriorities(unittest.TestCase):
         self.assertEqual(p[0], p[1], "NEAR_BRIGHT_OBJECT shouldn't impact priority but {} != {}".format(p[0], p[1]))
         self.assertEqual(p[2], -1, "IN_BRIGHT_OBJECT priority not -1")
 
+    def test_priority_states(self):
+        """Test the target states that accompany priorities.
+        """
+        t = self.targets.copy()
+        z = self.zcat.copy()
+        z['NUMOBS'] = [0, 1, 1]
+        z['NUMOBS_MORE'] = [1, 1, 1]
+        z['Z'] = [0., 3., 1.]
+        # ADM unobserved, a high-z QSO and a low-z QSO.
+        t['DESI_TARGET'] = desi_mask.QSO
+        p, s = calc_priority(t, z, "DARK", state=True)
+        self.assertEqual(list(s.astype(str)),
+                         ["QSO|UNOBS", "QSO|MORE_ZGOOD", "QSO|DONE"])
+        self.assertEqual(list(p), [desi_mask.QSO.priorities[sname]
+                                   for sname in ["UNOBS", "MORE_ZGOOD", "DONE"]])
+
+        # ADM the state is for the highest priority.
+        t['DESI_TARGET'] = desi_mask.ELG | desi_mask.LRG
+        _, s = calc_priority(t, z, "DARK", state=True)
+        self.assertEqual(s.astype(str)[0], "LRG|UNOBS")
+
+        # ADM calibration targets and bright-object targets.
+        t['DESI_TARGET'] = [desi_mask.STD_FAINT,
+                            desi_mask.STD_FAINT | desi_mask.ELG,
+                            desi_mask.ELG | desi_mask.IN_BRIGHT_OBJECT]
+        p, s = calc_priority(t, z, "DARK", state=True)
+        # ADM states are truncated to the length in the MTL data model.
+        self.assertTrue(np.all(s == np.array(
+            ["CALIB", "ELG|MORE_ZGOOD", "IN_BRIGHT_OBJECT"], dtype=s.dtype)))
+        self.assertEqual(list(p), [0, desi_mask.ELG.priorities["MORE_ZGOOD"], -1])
+        self.assertEqual(s.dtype, mtldatamodel["TARGET_STATE"].dtype)
+
+        # ADM the states and priorities are the same once tables are cached.
+        p2, s2 = calc_priority(t, z, "DARK", state=True)
+        self.assertTrue(np.all(p == p2) & np.all(s == s2))
+
     def test_mask_priorities(self):
         for mask in [desi_mask, bgs_mask, mws_mask]:
             for name in mask.names():
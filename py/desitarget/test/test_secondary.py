@@ -0,0 +1,91 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+"""Test desitarget.secondary.
+"""
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+import fitsio
+import numpy as np
+
+from desitarget import secondary
+from desitarget.targetmask import scnd_mask
+
+
+class TestSECONDARY(unittest.TestCase):
+
+    def setUp(self):
+        # ADM a secondary directory with a small file for every program
+        # ADM (alternating .fits and .txt files) and a separate cache.
+        self.scxdir = tempfile.mkdtemp()
+        self.cachedir = tempfile.mkdtemp()
+        self.cacheorig = os.environ.get("DESITARGET_CACHE")
+        os.environ["DESITARGET_CACHE"] = self.cachedir
+        for subdir in "docs", "indata", "outdata":
+            os.makedirs(os.path.join(self.scxdir, subdir))
+        rng = np.random.RandomState(616)
+        self.fns = []
+        for i, name in enumerate(scnd_mask.names()):
+            scx = np.zeros(5, dtype=secondary.indatamodel.dtype)
+            scx["RA"], scx["DEC"] = rng.uniform(0, 360, 5), rng.uniform(-30, 30, 5)
+            scx["OVERRIDE"] = rng.uniform(size=5) < 0.5
+            fn = os.path.join(self.scxdir, "indata", scnd_mask[name].filename)
+            if i % 2 == 0:
+                fn += ".fits"
+                fitsio.write(fn, scx)
+            else:
+                fn += ".txt"
+                np.savetxt(fn, scx, fmt="%.8f %.8f %.2f %.2f %.1f %d")
+            self.fns.append(fn)
+            docfn = os.path.join(self.scxdir, "docs", scnd_mask[name].filename)
+            open(docfn+".txt", "w").close()
+
+    def tearDown(self):
+        if self.cacheorig is None:
+            os.environ.pop("DESITARGET_CACHE", None)
+        else:
+            os.environ["DESITARGET_CACHE"] = self.cacheorig
+        shutil.rmtree(self.scxdir)
+        shutil.rmtree(self.cachedir)
+
+    def test_read_files_cache(self):
+        """Test only changed secondary files are re-read.
+        """
+        secondary._check_files(self.scxdir, scnd_mask)
+        direct = secondary.read_files(self.scxdir, scnd_mask, cache=False)
+        reader = mock.Mock(side_effect=secondary._read_scnd_file)
+        with mock.patch("desitarget.secondary._read_scnd_file", reader):
+            # ADM every file is read, the first time...
+            scxtargs = secondary.read_files(self.scxdir, scnd_mask)
+            self.assertEqual(reader.call_count, len(self.fns))
+            self.assertTrue(np.all(scxtargs == direct))
+            # ADM ...but not the second time, even if it's "touched"...
+            os.utime(self.fns[0], ns=(0, 0))
+            for numproc in 1, 2:
+                scxtargs = secondary.read_files(self.scxdir, scnd_mask,
+                                                numproc=numproc)
+                self.assertTrue(np.all(scxtargs == direct))
+            self.assertEqual(reader.call_count, len(self.fns))
+            # ADM ...unless it changed.
+            scx = fitsio.read(self.fns[0])
+            scx["REF_EPOCH"] = 2000.
+            fitsio.write(self.fns[0], scx, clobber=True)
+            scxtargs = secondary.read_files(self.scxdir, scnd_mask)
+            self.assertEqual(reader.call_count, len(self.fns) + 1)
+        ii = scxtargs["SCND_TARGET"] == scnd_mask[scnd_mask.names()[0]]
+        self.assertTrue(np.all(scxtargs["REF_EPOCH"][ii] == 2000.))
+        self.assertTrue(np.all(scxtargs[~ii] == direct[~ii]))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def test_suite():
+    """Allows testing of only this module with the command:
+
+        python setup.py test -m desitarget.test.test_secondary
+    """
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
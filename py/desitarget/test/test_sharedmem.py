@@ -0,0 +1,108 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+"""Test desitarget.internal.sharedmem.
+"""
+import unittest
+import warnings
+import numpy as np
+
+from desitarget.internal import sharedmem
+
+
+class TestSHAREDMEM(unittest.TestCase):
+
+    def setUp(self):
+        self.dtype = [('ID', '>i8'), ('NAME', 'U3'), ('FLUX', '>f4')]
+
+    def _work(self, i):
+        """Return i rows of ID=i, or None for i=3.
+        """
+        if i == 3:
+            return None, i
+        data = np.zeros(i, dtype=self.dtype)
+        data["ID"] = i
+        data["NAME"] = str(i)
+        return data, i
+
+    def _check(self, results, segments, items, positions=None):
+        """Check the results for each item are where they should be.
+        """
+        self.assertEqual(results.dtype, np.dtype(self.dtype))
+        self.assertEqual(len(segments), len(items))
+        self.assertEqual(len(results), np.sum(segments[:, 1]))
+        for i, (start, count) in zip(items, segments):
+            self.assertEqual(count, 0 if i == 3 else i)
+            self.assertTrue(np.all(results["ID"][start:start+count] == i))
+            self.assertTrue(np.all(results["NAME"][start:start+count] == str(i)))
+        # ADM the results are in the order of the items (or positions).
+        if positions is None:
+            positions = np.arange(len(items))
+        ordered = np.array(items)[np.argsort(positions)]
+        self.assertTrue(np.all(results["ID"] == np.repeat(ordered, ordered*(ordered != 3))))
+
+    def test_gather(self):
+        """Test gathering results in shared memory.
+        """
+        items = list(range(20))
+        for np_ in [0, 3]:
+            reduced = {}
+
+            def _reduce(result, i):
+                reduced[i] = None if result is None else result.copy()
+
+            with sharedmem.MapReduce(np=np_) as pool:
+                results, segments = pool.gather(self._work, items, 10**6,
+                                                reduce=_reduce)
+            self._check(results, segments, items)
+            # ADM reduce is passed each result and any extra returns.
+            self.assertEqual(set(reduced), set(items))
+            self.assertIsNone(reduced[3])
+            self.assertTrue(np.all(reduced[7]["ID"] == 7))
+
+    def test_gather_positions(self):
+        """Test results are returned in the order of the inputs.
+        """
+        items = list(range(20))[::-1]
+        positions = np.random.RandomState(616).permutation(len(items))
+        for np_ in [0, 3]:
+            with sharedmem.MapReduce(np=np_) as pool:
+                results, segments = pool.gather(self._work, items, 10**6)
+            self._check(results, segments, items)
+            with sharedmem.MapReduce(np=np_) as pool:
+                results, segments = pool.gather(self._work, items, 10**6,
+                                                positions=positions)
+            self._check(results, segments, items, positions=positions)
+
+    def test_gather_overflow(self):
+        """Test results that don't fit in the arena are still gathered.
+        """
+        items = list(range(20))
+        # ADM only ~half of the rows fit in this arena.
+        capacity = np.dtype(self.dtype).itemsize * 100
+        with sharedmem.MapReduce(np=3) as pool:
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter("always")
+                results, segments = pool.gather(self._work, items,
+                                                capacity=capacity)
+        self.assertTrue(any("arena" in str(x.message) for x in w))
+        self._check(results, segments, items)
+
+    def test_gather_dtypes(self):
+        """Test results must all have the same dtype.
+        """
+        with sharedmem.MapReduce(np=0) as pool:
+            with self.assertRaises(ValueError):
+                pool.gather(lambda i: np.zeros(2, dtype='f{}'.format(i)),
+                            [4, 8], 10**6)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def test_suite():
+    """Allows testing of only this module with the command:
+
+        python setup.py test -m desitarget.test.test_sharedmem
+    """
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
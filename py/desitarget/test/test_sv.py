@@ -5,6 +5,8 @@
 import unittest
 import fitsio
 import os
+import shutil
+import tempfile
 import numpy as np
 import healpy as hp
 from glob import glob
@@ -36,11 +38,23 @@ class TestSV(unittest.TestCase):
         cls.gaiadir_orig = os.getenv("GAIA_DIR")
         os.environ["GAIA_DIR"] = resource_filename('desitarget.test', 't4')
 
+        # ADM write the sweep-footprint cache to a scratch directory
+        # ADM rather than to ~/.cache/desitarget.
+        cls.cachedir = tempfile.mkdtemp()
+        cls.cacheorig = os.getenv("DESITARGET_CACHE")
+        os.environ["DESITARGET_CACHE"] = cls.cachedir
+
     @classmethod
     def tearDownClass(cls):
         # ADM reset GAIA_DIR environment variable.
         if cls.gaiadir_orig is not None:
             os.environ["GAIA_DIR"] = cls.gaiadir_orig
+        # ADM reset DESITARGET_CACHE and remove the scratch cache.
+        if cls.cacheorig is None:
+            os.environ.pop("DESITARGET_CACHE", None)
+        else:
+            os.environ["DESITARGET_CACHE"] = cls.cacheorig
+        shutil.rmtree(cls.cachedir)
 
     def test_sv_cuts(self):
         """Test SV cuts work.